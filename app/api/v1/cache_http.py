@@ -0,0 +1,128 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import HTTP_CACHE_MAX_ENTRIES
+from app.core.version_datos import version_actual
+
+# Cabeceras de la respuesta original que se conservan en la caché (paginación)
+CABECERAS_CACHEADAS = ("X-Next-Cursor",)
+
+
+class CacheRespuestas:
+    """
+    Caché LRU acotada de respuestas JSON ya serializadas, válida para una única
+    versión de los datos: al llegar una versión nueva se vacía entera, así que nunca
+    se sirve una respuesta anterior a la última escritura.
+    """
+
+    def __init__(self, max_entradas: int):
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.contadores = {"hits": 0, "misses": 0, "not_modified": 0}
+
+    def obtener(self, clave: str, version: int) -> tuple[bytes, dict] | None:
+        with self._lock:
+            entrada = self._entradas.get(clave) if version == self._version else None
+            if entrada is None:
+                self.contadores["misses"] += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.contadores["hits"] += 1
+            return entrada
+
+    def guardar(self, clave: str, version: int, cuerpo: bytes, cabeceras: dict):
+        if self.max_entradas <= 0:
+            return
+        with self._lock:
+            if self._version is None or version > self._version:
+                self._entradas.clear()
+                self._version = version
+            elif version < self._version:
+                return  # Construida con datos ya superados
+            self._entradas[clave] = (cuerpo, cabeceras)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def contar_no_modificada(self):
+        with self._lock:
+            self.contadores["not_modified"] += 1
+
+
+cache_respuestas = CacheRespuestas(HTTP_CACHE_MAX_ENTRIES)
+
+
+def _clave(request: Request) -> str:
+    parametros = sorted(request.query_params.multi_items())
+    return f"{request.url.path}?{parametros}"
+
+
+def _etag(clave: str, version: int) -> str:
+    huella = hashlib.sha1(clave.encode("utf-8")).hexdigest()[:12]
+    return f'"{version}-{huella}"'
+
+
+def _coincide(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        candidato.strip().removeprefix("W/") == etag
+        for candidato in if_none_match.split(",")
+    )
+
+
+async def respuesta_cacheada(
+    request: Request,
+    db: AsyncSession,
+    construir: Callable[[Session, Response], object],
+) -> Response:
+    """
+    Devuelve la respuesta JSON de un endpoint de solo lectura usando la versión de
+    los datos (app.core.version_datos):
+
+    - ETag = versión + ruta y parámetros; si coincide con If-None-Match, 304 sin
+      consultar nada más.
+    - Si no, se sirve la respuesta ya serializada de la caché en memoria o se llama a
+      `construir(sesion, response)` con la sesión síncrona de `db` (run_sync; puede
+      añadir cabeceras a `response`, p. ej. X-Next-Cursor) y se
+      guarda para la versión leída al principio. Los datos leídos después nunca son
+      más antiguos que esa versión, así que la caché no puede quedar por detrás.
+    """
+    version = await db.run_sync(version_actual)
+    clave = _clave(request)
+    etag = _etag(clave, version)
+    cabeceras_cache = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if _coincide(request.headers.get("if-none-match"), etag):
+        cache_respuestas.contar_no_modificada()
+        return Response(status_code=304, headers=cabeceras_cache)
+
+    cacheada = cache_respuestas.obtener(clave, version)
+    if cacheada is None:
+        parcial = Response()
+        datos = await db.run_sync(construir, parcial)
+        cuerpo = JSONResponse(content=datos).body
+        cabeceras = {
+            nombre: parcial.headers[nombre]
+            for nombre in CABECERAS_CACHEADAS
+            if nombre in parcial.headers
+        }
+        cache_respuestas.guardar(clave, version, cuerpo, cabeceras)
+    else:
+        cuerpo, cabeceras = cacheada
+    return Response(
+        content=cuerpo,
+        media_type="application/json",
+        headers={**cabeceras, **cabeceras_cache},
+    )
@@ -1,98 +1,277 @@
-from fastapi import APIRouter, Depends, HTTPException
+import json
+import logging
+
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.core.database import get_db
-from app.models.newsletter import Newsletter, NewsletterDia
-from app.services.ai.resumen_newsletter import summarize_day
+from app.api.v1.cache_http import respuesta_cacheada
+from app.api.v1.paginacion import parsear_cursor
+from app.core.compresion import descomprimir
+from app.core.config import DAYS_PAGE_SIZE
+from app.core.cursores import crear_cursor
+from app.core.database import AsyncSessionLocal, get_async_db
+from app.models.newsletter import (
+    Newsletter,
+    NewsletterBody,
+    NewsletterDia,
+    newsletter_dia_rel,
+)
+from app.services.ai.resumen_newsletter import (
+    generar_stream,
+    summarize_day_async,
+    summarize_day_stream,
+)
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 
-@router.get("/days", response_model=list)
-def get_days(db: Session = Depends(get_db)):
+def _newsletters_por_dia(
+    db: Session,
+    day_ids: list[int],
+    with_body: bool = False,
+    sender_id: int | None = None,
+) -> dict[int, list[dict]]:
     """
-    Obtiene todos los registros diarios (NewsletterDia) ordenados por fecha (descendente),
-    con el resumen general (si existe) y la lista de newsletters (con sus resúmenes) asociadas.
+    Carga en una sola consulta las newsletters de varios días, leyendo solo las
+    columnas necesarias. El cuerpo, guardado comprimido en 'newsletter_bodies', solo se
+    lee y descomprime si `with_body`. Con `sender_id`, solo las de ese remitente.
     """
-    days = db.query(NewsletterDia).order_by(NewsletterDia.fecha.desc()).all()
-    result = []
-    for day in days:
-        newsletters = []
-        for n in day.newsletters:
-            newsletters.append(
-                {
-                    "id": n.id,
-                    "subject": n.subject,
-                    "summary": n.summary,
-                    "received_at": n.received_at.isoformat(),
-                    "author": n.author,
-                }
-            )
-        result.append(
-            {
-                "id": day.id,
-                "fecha": day.fecha.isoformat(),
-                "summary": day.summary,
-                "newsletters": newsletters,
-            }
+    columnas = [
+        newsletter_dia_rel.c.dia_id,
+        Newsletter.id,
+        Newsletter.subject,
+        Newsletter.summary,
+        Newsletter.summary_status,
+        Newsletter.received_at,
+        Newsletter.author,
+    ]
+    if with_body:
+        columnas.append(NewsletterBody.content)
+
+    por_dia = {day_id: [] for day_id in day_ids}
+    if not day_ids:
+        return por_dia
+    rows = (
+        db.query(*columnas)
+        .join(newsletter_dia_rel, newsletter_dia_rel.c.newsletter_id == Newsletter.id)
+        .filter(newsletter_dia_rel.c.dia_id.in_(day_ids))
+        .order_by(Newsletter.received_at)
+    )
+    if with_body:
+        rows = rows.outerjoin(
+            NewsletterBody, NewsletterBody.newsletter_id == Newsletter.id
         )
-    return result
+    if sender_id is not None:
+        rows = rows.filter(Newsletter.sender_id == sender_id)
+    for row in rows:
+        newsletter = {
+            "id": row.id,
+            "subject": row.subject,
+            "summary": row.summary,
+            "summary_status": row.summary_status,
+            "received_at": row.received_at.isoformat(),
+            "author": row.author,
+        }
+        if with_body:
+            newsletter["body"] = descomprimir(row.content)
+        por_dia[row.dia_id].append(newsletter)
+    return por_dia
 
 
-@router.get("/days/{day_id}", response_model=dict)
-def get_day(day_id: int, db: Session = Depends(get_db)):
-    """
-    Obtiene los detalles de un registro diario (NewsletterDia) específico,
-    incluyendo la lista completa de newsletters con sus resúmenes.
-    """
-    day = db.query(NewsletterDia).filter(NewsletterDia.id == day_id).first()
+def _day_to_dict(db: Session, day_id: int, with_body: bool = False) -> dict:
+    day = (
+        db.query(
+            NewsletterDia.id,
+            NewsletterDia.fecha,
+            NewsletterDia.summary,
+            NewsletterDia.summary_dirty,
+        )
+        .filter(NewsletterDia.id == day_id)
+        .first()
+    )
     if not day:
         raise HTTPException(status_code=404, detail="Registro diario no encontrado")
-    newsletters = []
-    for n in day.newsletters:
-        newsletters.append(
-            {
-                "id": n.id,
-                "subject": n.subject,
-                "body": n.body,
-                "summary": n.summary,
-                "received_at": n.received_at.isoformat(),
-                "author": n.author,
-            }
-        )
     return {
         "id": day.id,
         "fecha": day.fecha.isoformat(),
         "summary": day.summary,
-        "newsletters": newsletters,
+        "summary_dirty": day.summary_dirty,
+        "newsletters": _newsletters_por_dia(db, [day.id], with_body)[day.id],
     }
 
 
+def _pagina_de_dias(
+    db: Session,
+    response: Response,
+    cursor: str | None,
+    limit: int,
+    sender_id: int | None,
+) -> list[dict]:
+    query = db.query(
+        NewsletterDia.id,
+        NewsletterDia.fecha,
+        NewsletterDia.summary,
+        NewsletterDia.summary_dirty,
+    ).order_by(NewsletterDia.fecha.desc(), NewsletterDia.id.desc())
+    if sender_id is not None:
+        dias_del_remitente = (
+            select(newsletter_dia_rel.c.dia_id)
+            .join(Newsletter, Newsletter.id == newsletter_dia_rel.c.newsletter_id)
+            .where(Newsletter.sender_id == sender_id)
+        )
+        query = query.filter(NewsletterDia.id.in_(dias_del_remitente))
+    if cursor:
+        fecha, day_id = parsear_cursor(cursor)
+        query = query.filter(
+            or_(
+                NewsletterDia.fecha < fecha,
+                and_(NewsletterDia.fecha == fecha, NewsletterDia.id < day_id),
+            )
+        )
+    days = query.limit(limit + 1).all()
+    if len(days) > limit:
+        days = days[:limit]
+        response.headers["X-Next-Cursor"] = crear_cursor(days[-1].fecha, days[-1].id)
+
+    newsletters = _newsletters_por_dia(
+        db, [day.id for day in days], sender_id=sender_id
+    )
+    return [
+        {
+            "id": day.id,
+            "fecha": day.fecha.isoformat(),
+            "summary": day.summary,
+            "summary_dirty": day.summary_dirty,
+            "newsletters": newsletters[day.id],
+        }
+        for day in days
+    ]
+
+
+@router.get("/days", response_model=list)
+async def get_days(
+    request: Request,
+    cursor: str | None = None,
+    limit: int = Query(DAYS_PAGE_SIZE, ge=1, le=500),
+    sender_id: int | None = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Obtiene los registros diarios (NewsletterDia) ordenados por fecha (descendente),
+    con el resumen general (si existe) y la lista de newsletters (con sus resúmenes) asociadas.
+    `summary_dirty` indica que el día ha recibido newsletters después de resumirse.
+
+    La lista se pagina por cursor sobre (fecha, id): si hay más días, la cabecera
+    X-Next-Cursor contiene el valor a pasar como `cursor` para pedir la siguiente página.
+    Con `sender_id` solo se devuelven los días (y las newsletters) de ese remitente.
+    La respuesta lleva ETag: con If-None-Match y sin cambios en los datos devuelve 304.
+    """
+    return await respuesta_cacheada(
+        request,
+        db,
+        lambda sync_db, response: _pagina_de_dias(
+            sync_db, response, cursor, limit, sender_id
+        ),
+    )
+
+
+@router.get("/days/{day_id}", response_model=dict)
+async def get_day(
+    day_id: int, request: Request, db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Obtiene los detalles de un registro diario (NewsletterDia) específico,
+    incluyendo la lista completa de newsletters con sus resúmenes.
+    La respuesta lleva ETag: con If-None-Match y sin cambios en los datos devuelve 304.
+    """
+    return await respuesta_cacheada(
+        request,
+        db,
+        lambda sync_db, response: _day_to_dict(sync_db, day_id, with_body=True),
+    )
+
+
 @router.post("/days/{day_id}/summarize", response_model=dict)
-def generate_day_summary(day_id: int, db: Session = Depends(get_db)):
+async def generate_day_summary(
+    day_id: int, force: bool = False, db: AsyncSession = Depends(get_async_db)
+):
     """
     Genera (o regenera) el resumen general para un día específico usando la función summarize_day.
     Luego, devuelve el registro diario actualizado con el resumen.
+    Las llamadas al modelo son asíncronas: no ocupan un hilo del servidor mientras tanto.
+    Si las newsletters del día no han cambiado desde el último resumen se reutiliza
+    sin llamar al modelo, y si solo hay newsletters nuevas se añaden al resumen
+    guardado; con `force=true` se regenera desde cero.
     """
-    summary = summarize_day(day_id, db)
+    summary = await summarize_day_async(day_id, db, forzar=force)
     # Reconsultamos el registro diario para devolver la información actualizada.
-    day = db.query(NewsletterDia).filter(NewsletterDia.id == day_id).first()
-    if not day:
+    return await db.run_sync(_day_to_dict, day_id)
+
+
+def get_generador_stream():
+    """
+    Backend de streaming del modelo. Se inyecta como dependencia para poder
+    sustituirlo (app.dependency_overrides) por generador_stream_falso sin red.
+    """
+    return generar_stream
+
+
+def _evento_sse(evento: str, datos: dict) -> str:
+    return f"event: {evento}\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n"
+
+
+@router.post("/days/{day_id}/summarize/stream")
+async def generate_day_summary_stream(
+    day_id: int,
+    force: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+    generar=Depends(get_generador_stream),
+):
+    """
+    Igual que POST /days/{day_id}/summarize, pero devuelve el resumen como
+    Server-Sent Events según lo genera el modelo:
+
+    - `status`: preparando el prompt (resúmenes de las newsletters que falten).
+    - `chunk`: `{"text": ...}` con cada fragmento generado.
+    - `done`: el registro diario actualizado, como en el endpoint no streaming.
+    - `error`: `{"detail": ...}`; el resumen anterior del día se conserva.
+
+    El resumen solo se guarda si el stream termina sin errores. Si el resumen
+    guardado está al día llega en un único `chunk` (ver `force`).
+    """
+    if await db.get(NewsletterDia, day_id) is None:
         raise HTTPException(status_code=404, detail="Registro diario no encontrado")
-    newsletters = []
-    for n in day.newsletters:
-        newsletters.append(
-            {
-                "id": n.id,
-                "subject": n.subject,
-                "summary": n.summary,
-                "received_at": n.received_at.isoformat(),
-                "author": n.author,
-            }
-        )
-    return {
-        "id": day.id,
-        "fecha": day.fecha.isoformat(),
-        "summary": day.summary,
-        "newsletters": newsletters,
-    }
+
+    async def eventos():
+        # La sesión de la dependencia se cierra antes de enviar el cuerpo: el
+        # generador abre la suya propia
+        stream_db = AsyncSessionLocal()
+        try:
+            yield _evento_sse("status", {"detail": "Generando resumen del día"})
+            try:
+                async for fragmento in summarize_day_stream(
+                    day_id, stream_db, generar, forzar=force
+                ):
+                    yield _evento_sse("chunk", {"text": fragmento})
+                dia = await stream_db.run_sync(_day_to_dict, day_id)
+            except Exception as e:
+                logger.error(f"Error en el resumen en streaming del día {day_id}: {e}")
+                yield _evento_sse("error", {"detail": str(e)})
+                return
+            yield _evento_sse("done", dia)
+        finally:
+            # Si el cliente se desconecta la tarea se cancela: el cierre no debe
+            # cancelarse con ella o la conexión no vuelve limpia al pool
+            with anyio.CancelScope(shield=True):
+                await stream_db.close()
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,40 @@
+from datetime import date
+
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+
+from app.api.v1.paginacion import parsear_cursor
+from app.services.correos.exportacion import exportar_newsletters, lineas_ndjson
+
+router = APIRouter()
+
+
+@router.get("/export")
+def export_newsletters(
+    desde: date | None = None,
+    hasta: date | None = None,
+    sender_id: int | None = None,
+    sender: str | None = None,
+    bodies: bool = False,
+    summaries: bool = False,
+    gzip: bool = False,
+    cursor: str | None = None,
+):
+    """
+    Exporta las newsletters como NDJSON (una por línea, de la más antigua a la más
+    reciente) en streaming, con memoria constante sea cual sea el tamaño del archivo.
+    Filtros: rango de fechas (`desde`/`hasta`, YYYY-MM-DD, incluidos) y remitente
+    (`sender_id` o dirección `sender`); `bodies` y `summaries` añaden el cuerpo y el
+    resumen. Con `gzip=true` la respuesta va comprimida (Content-Encoding: gzip).
+    Cada línea lleva su `cursor`: si la descarga se corta, pasar el de la última
+    línea recibida como `cursor` la reanuda justo después.
+    """
+    despues_de = parsear_cursor(cursor) if cursor else None
+    newsletters = exportar_newsletters(
+        desde, hasta, sender_id, sender, bodies, summaries, despues_de
+    )
+    return StreamingResponse(
+        lineas_ndjson(newsletters, gzip=gzip),
+        media_type="application/x-ndjson",
+        headers={"Content-Encoding": "gzip"} if gzip else None,
+    )
@@ -1,13 +1,42 @@
-from fastapi import APIRouter
+import asyncio
 
-from app.services.correos.newsletter_mail import newsletter_no_leidas
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import get_async_db
+from app.models.job import SyncJob
+from app.services.correos.sync_jobs import encolar_sync, job_to_dict
 
 router = APIRouter()
 
 
 @router.get("/newsletter/")
-def get_newsletter():
+async def get_newsletter():
+    """
+    Compatibilidad: lanza (o se une a) una sincronización en segundo plano.
+    Usa POST /newsletter/sync y consulta su estado con GET /newsletter/sync/{job_id}.
+    """
+    return await asyncio.to_thread(encolar_sync)
+
+
+@router.post("/newsletter/sync", status_code=202)
+async def start_sync():
+    """
+    Encola la sincronización IMAP y devuelve el job al instante. Si ya hay una en
+    curso, devuelve ese mismo job. El encolado (cerrojo + escritura del job) se hace
+    en un hilo para no bloquear el bucle de eventos.
+    """
+    return await asyncio.to_thread(encolar_sync)
 
-    respuesta = newsletter_no_leidas()
 
-    return respuesta
+@router.get("/newsletter/sync/{job_id}")
+async def get_sync_status(job_id: str, db: AsyncSession = Depends(get_async_db)):
+    """
+    Devuelve el estado y los contadores de progreso de un job de sincronización.
+    """
+    job = await db.get(SyncJob, job_id)
+    if not job:
+        raise HTTPException(
+            status_code=404, detail="Job de sincronización no encontrado"
+        )
+    return job_to_dict(job)
@@ -0,0 +1,15 @@
+from datetime import datetime
+
+from fastapi import HTTPException
+
+from app.core import cursores
+
+
+def parsear_cursor(cursor: str) -> tuple[datetime, int]:
+    """
+    cursores.parsear_cursor para los endpoints: un cursor no válido es un 400.
+    """
+    try:
+        return cursores.parsear_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor de paginación no válido")
@@ -0,0 +1,43 @@
+import asyncio
+from datetime import date
+
+from fastapi import APIRouter, HTTPException
+
+from app.services.ai.cache_resumenes import estadisticas_cache
+from app.services.ai.cola_resumenes import estado_cola, reencolar
+
+router = APIRouter()
+
+
+@router.get("/summaries/queue")
+async def get_summary_queue():
+    """
+    Estado de la cola de resúmenes: newsletters por estado (pending/done/failed),
+    cuántas esperan ya, cuántas han agotado los intentos y el próximo reintento.
+    """
+    return await asyncio.to_thread(estado_cola)
+
+
+@router.get("/summaries/cache")
+async def get_summary_cache():
+    """
+    Estado de la caché de resúmenes: aciertos, fallos, escrituras y expulsiones desde
+    el arranque (también en /metrics) y entradas y bytes que ocupa.
+    """
+    return await asyncio.to_thread(estadisticas_cache)
+
+
+@router.post("/summaries/requeue", status_code=202)
+async def requeue_summaries(desde: date, hasta: date, todas: bool = False):
+    """
+    Vuelve a poner en cola los resúmenes de las newsletters recibidas entre `desde`
+    y `hasta` (YYYY-MM-DD, incluidos), sin esperas ni intentos acumulados: por
+    defecto las que no tienen resumen y, con `todas`, también las resumidas.
+    La cola las procesa en su siguiente pasada.
+    """
+    if hasta < desde:
+        raise HTTPException(
+            status_code=400, detail="'hasta' no puede ser anterior a 'desde'"
+        )
+    encoladas = await asyncio.to_thread(reencolar, desde, hasta, todas)
+    return {"encoladas": encoladas}
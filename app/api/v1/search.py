@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Depends, Query, Response
+from sqlalchemy.orm import Session
+
+from app.core.database import get_db
+from app.services.correos.busqueda_fts import buscar_newsletters
+
+router = APIRouter()
+
+
+@router.get("/search", response_model=list)
+def search_newsletters(
+    response: Response,
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+):
+    """
+    Búsqueda por palabras clave en asunto, autor, cuerpo y resumen de las newsletters,
+    ordenada por relevancia (BM25) y con un fragmento resaltado de la coincidencia.
+    Si hay más resultados, la cabecera X-Next-Offset indica el siguiente `offset`.
+    """
+    resultados = buscar_newsletters(db, q, limit + 1, offset)
+    if len(resultados) > limit:
+        resultados = resultados[:limit]
+        response.headers["X-Next-Offset"] = str(offset + limit)
+    return resultados
@@ -0,0 +1,83 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from app.api.v1.paginacion import parsear_cursor
+from app.core.cursores import crear_cursor
+from app.core.database import get_db
+from app.models.newsletter import Newsletter, Sender
+
+router = APIRouter()
+
+
+@router.get("/senders", response_model=list)
+def get_senders(db: Session = Depends(get_db)):
+    """
+    Lista los remitentes con su número de newsletters y las fechas de la primera y la
+    última recibida, ordenados por número de mensajes (descendente).
+    """
+    senders = db.query(Sender).order_by(Sender.message_count.desc(), Sender.email.asc())
+    return [
+        {
+            "id": sender.id,
+            "email": sender.email,
+            "name": sender.name,
+            "message_count": sender.message_count,
+            "first_seen": sender.first_seen.isoformat() if sender.first_seen else None,
+            "last_seen": sender.last_seen.isoformat() if sender.last_seen else None,
+        }
+        for sender in senders
+    ]
+
+
+@router.get("/senders/{sender_id}/newsletters", response_model=list)
+def get_sender_newsletters(
+    sender_id: int,
+    response: Response,
+    cursor: str | None = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+):
+    """
+    Lista las newsletters de un remitente, de la más reciente a la más antigua, usando el
+    índice sobre sender_id. Si hay más, la cabecera X-Next-Cursor contiene el cursor
+    de la siguiente página.
+    """
+    if not db.query(Sender.id).filter(Sender.id == sender_id).first():
+        raise HTTPException(status_code=404, detail="Remitente no encontrado")
+
+    query = (
+        db.query(
+            Newsletter.id,
+            Newsletter.subject,
+            Newsletter.summary,
+            Newsletter.received_at,
+            Newsletter.author,
+        )
+        .filter(Newsletter.sender_id == sender_id)
+        .order_by(Newsletter.received_at.desc(), Newsletter.id.desc())
+    )
+    if cursor:
+        fecha, newsletter_id = parsear_cursor(cursor)
+        query = query.filter(
+            or_(
+                Newsletter.received_at < fecha,
+                and_(Newsletter.received_at == fecha, Newsletter.id < newsletter_id),
+            )
+        )
+    rows = query.limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = crear_cursor(
+            rows[-1].received_at, rows[-1].id
+        )
+    return [
+        {
+            "id": row.id,
+            "subject": row.subject,
+            "summary": row.summary,
+            "received_at": row.received_at.isoformat(),
+            "author": row.author,
+        }
+        for row in rows
+    ]
@@ -0,0 +1,169 @@
+"""
+Generador de correos sintéticos para los benchmarks offline.
+
+Produce newsletters realistas en formato RFC822: solo texto, solo HTML y
+multipart/alternative (con la parte HTML antes o después de la de texto), a veces con
+adjuntos, con tamaños variables, remitentes de un conjunto fijo y fechas repartidas
+entre varios días. La salida es determinista para una misma semilla.
+
+Uso (escribe un corpus de ficheros .eml):
+    python -m app.benchmarks.buzon_sintetico --correos 500 --salida /tmp/corpus
+"""
+
+import argparse
+import os
+import random
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from email.utils import format_datetime
+
+REMITENTES = [
+    ("Tech Semanal", "hola@techsemanal.example"),
+    ("Diario Económico", "boletin@economico.example"),
+    ("Python Weekly ES", "news@pythonweekly.example"),
+    ("Ciencia Hoy", "ciencia@cienciahoy.example"),
+    ("El Resumen", "resumen@elresumen.example"),
+    ("Startups & Co", "info@startups.example"),
+]
+
+PALABRAS = (
+    "inteligencia artificial modelo datos mercado empresa inversión lanzamiento "
+    "investigación seguridad privacidad energía clima política europa gobierno "
+    "software python rust base datos rendimiento latencia nube servidor usuario "
+    "producto ronda financiación estudio universidad resultado análisis tendencia"
+).split()
+
+PIE = (
+    "Has recibido este correo porque estás suscrito. Darse de baja: "
+    "https://example.com/unsubscribe?u=1234567890abcdef&list=987654 "
+    "© 2025 Newsletter S.L. Todos los derechos reservados. Calle Falsa 123, Madrid."
+)
+
+
+def _parrafo(rng: random.Random, palabras: int) -> str:
+    texto = " ".join(rng.choice(PALABRAS) for _ in range(palabras))
+    return texto.capitalize() + "."
+
+
+def _historias(rng: random.Random, n: int) -> list[tuple[str, str]]:
+    return [
+        (
+            _parrafo(rng, rng.randint(4, 9)).rstrip("."),
+            " ".join(
+                _parrafo(rng, rng.randint(20, 60)) for _ in range(rng.randint(1, 4))
+            ),
+        )
+        for _ in range(n)
+    ]
+
+
+def _como_texto(historias: list[tuple[str, str]]) -> str:
+    bloques = [f"{titulo}\n\n{cuerpo}" for titulo, cuerpo in historias]
+    return "\n\n".join(bloques) + f"\n\n--\n{PIE}\n"
+
+
+def _como_html(historias: list[tuple[str, str]]) -> str:
+    secciones = "".join(
+        f'<tr><td class="story"><h2>{titulo}</h2><p>{cuerpo}</p>'
+        f'<a href="https://example.com/r?id={i}&utm_source=newsletter">Leer más</a>'
+        f"</td></tr>"
+        for i, (titulo, cuerpo) in enumerate(historias)
+    )
+    return (
+        "<!DOCTYPE html><html><head><title>Newsletter</title>"
+        "<style>body{font-family:sans-serif}.story{padding:12px}"
+        "h2{color:#333}</style>"
+        "<script>window.dataLayer=window.dataLayer||[];</script></head><body>"
+        '<table width="100%"><tr><td><a href="https://example.com">Ver en el '
+        "navegador</a></td></tr>"
+        f"{secciones}"
+        f'<tr><td class="footer"><small>{PIE}</small></td></tr></table>'
+        '<img src="https://track.example.com/open.gif?u=1" width="1" height="1">'
+        "</body></html>"
+    )
+
+
+def generar_correo(
+    i: int, inicio: datetime, dias: int, seed: int = 0
+) -> tuple[bytes, datetime]:
+    """
+    Genera el correo número `i` como bytes RFC822, con fecha dentro de los `dias`
+    días a partir de `inicio`. Devuelve (bytes, fecha).
+    """
+    rng = random.Random(seed * 1_000_003 + i)
+    nombre, direccion = REMITENTES[rng.randrange(len(REMITENTES))]
+    fecha = inicio + timedelta(
+        days=rng.randrange(max(1, dias)), minutes=rng.randrange(24 * 60)
+    )
+    historias = _historias(rng, rng.choice([1, 2, 3, 5, 8, 15]))
+
+    msg = EmailMessage()
+    msg["From"] = f"{nombre} <{direccion}>"
+    msg["To"] = "yo@example.com"
+    msg["Subject"] = f"{nombre} #{i}: {historias[0][0]}"
+    msg["Date"] = format_datetime(fecha)
+    msg["Message-ID"] = f"<{i}.{seed}@bench.example>"
+
+    tipo = rng.random()
+    if tipo < 0.2:
+        msg.set_content(_como_texto(historias))
+    elif tipo < 0.45:
+        msg.set_content(_como_html(historias), subtype="html")
+    elif tipo < 0.75:
+        msg.set_content(_como_texto(historias))
+        msg.add_alternative(_como_html(historias), subtype="html")
+    else:
+        # Algunos clientes envían la parte HTML antes que la de texto plano
+        msg.set_content(_como_html(historias), subtype="html")
+        msg.add_alternative(_como_texto(historias))
+    if rng.random() < 0.1:
+        msg.add_attachment(
+            rng.randbytes(rng.randint(10_000, 200_000)),
+            maintype="application",
+            subtype="pdf",
+            filename="informe.pdf",
+        )
+    return msg.as_bytes(), fecha
+
+
+def generar_buzon(
+    n: int,
+    inicio: datetime = datetime(2025, 1, 1, tzinfo=timezone.utc),
+    dias: int = 60,
+    seed: int = 0,
+) -> list[bytes]:
+    """
+    Genera `n` correos sintéticos repartidos en `dias` días.
+    """
+    return [generar_correo(i, inicio, dias, seed)[0] for i in range(n)]
+
+
+def escribir_corpus(
+    directorio: str, n: int, dias: int = 60, seed: int = 0
+) -> list[str]:
+    """
+    Escribe `n` correos sintéticos como ficheros .eml y devuelve sus rutas.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    rutas = []
+    for i, raw in enumerate(generar_buzon(n, dias=dias, seed=seed)):
+        ruta = os.path.join(directorio, f"{i:06d}.eml")
+        with open(ruta, "wb") as f:
+            f.write(raw)
+        rutas.append(ruta)
+    return rutas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--correos", type=int, default=500)
+    parser.add_argument("--dias", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--salida", required=True)
+    args = parser.parse_args()
+    rutas = escribir_corpus(args.salida, args.correos, args.dias, args.seed)
+    print(f"{len(rutas)} correos escritos en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Micro-benchmark offline de la extracción del cuerpo de los correos.
+
+Procesa un corpus de ficheros .eml (o uno sintético generado al vuelo) y mide
+mensajes/segundo y memoria residente máxima (peak RSS) de cada implementación, cada
+una en su propio proceso para que el pico de memoria no se mezcle:
+
+- "extraccion": app.services.correos.extraccion.extraer_cuerpo
+- "bs4": el recorrido anterior con BeautifulSoup y html.parser, como referencia
+
+Uso:
+    python -m app.benchmarks.extraccion --corpus /ruta/a/emls
+    python -m app.benchmarks.extraccion --correos 300 --repeticiones 3
+"""
+
+import argparse
+import atexit
+import email
+import glob
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from app.benchmarks.buzon_sintetico import escribir_corpus
+
+
+def extraer_cuerpo_bs4(msg) -> str:
+    """
+    Implementación previa (inline en newsletter_no_leidas), solo como referencia.
+    """
+    from bs4 import BeautifulSoup
+
+    body = ""
+    if msg.is_multipart():
+        for part in msg.walk():
+            content_type = part.get_content_type()
+            if "attachment" in str(part.get("Content-Disposition")):
+                continue
+            if content_type == "text/plain":
+                body = part.get_payload(decode=True).decode(
+                    part.get_content_charset() or "utf-8", errors="replace"
+                )
+                break
+            elif content_type == "text/html":
+                html_content = part.get_payload(decode=True).decode(
+                    part.get_content_charset() or "utf-8", errors="replace"
+                )
+                soup = BeautifulSoup(html_content, "html.parser")
+                body = soup.get_text(separator="\n", strip=True)
+                break
+    else:
+        body = msg.get_payload(decode=True).decode(
+            msg.get_content_charset() or "utf-8", errors="replace"
+        )
+        if "<html" in body.lower():
+            body = BeautifulSoup(body, "html.parser").get_text(
+                separator="\n", strip=True
+            )
+    return body
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux devuelve KiB; macOS, bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def ejecutar(modo: str, rutas: list[str], repeticiones: int) -> dict:
+    if modo == "bs4":
+        extraer = extraer_cuerpo_bs4
+    else:
+        from app.services.correos.extraccion import extraer_cuerpo as extraer
+
+    rss_inicial = _peak_rss_mb()
+    caracteres = 0
+    t0 = time.perf_counter()
+    for _ in range(repeticiones):
+        for ruta in rutas:
+            with open(ruta, "rb") as f:
+                msg = email.message_from_binary_file(f)
+            caracteres += len(extraer(msg))
+    duracion = time.perf_counter() - t0
+    mensajes = len(rutas) * repeticiones
+    return {
+        "modo": modo,
+        "mensajes": mensajes,
+        "mensajes_por_segundo": round(mensajes / duracion, 1),
+        "caracteres_medios": caracteres // max(1, mensajes),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "peak_rss_inicial_mb": round(rss_inicial, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--corpus", help="Directorio con ficheros .eml")
+    parser.add_argument("--correos", type=int, default=300)
+    parser.add_argument("--repeticiones", type=int, default=1)
+    parser.add_argument(
+        "--modos",
+        nargs="+",
+        default=["extraccion", "bs4"],
+        choices=["extraccion", "bs4"],
+    )
+    args = parser.parse_args()
+
+    if args.corpus:
+        rutas = sorted(glob.glob(os.path.join(args.corpus, "*.eml")))
+    else:
+        directorio = tempfile.mkdtemp(prefix="bench_extraccion_")
+        atexit.register(shutil.rmtree, directorio, ignore_errors=True)
+        rutas = escribir_corpus(directorio, args.correos)
+    if not rutas:
+        parser.error("El corpus no contiene ficheros .eml")
+
+    for modo in args.modos:
+        # Un proceso nuevo por modo para medir su pico de memoria por separado
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            print(executor.submit(ejecutar, modo, rutas, args.repeticiones).result())
+
+
+if __name__ == "__main__":
+    main()
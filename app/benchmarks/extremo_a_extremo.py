@@ -0,0 +1,356 @@
+"""
+Benchmark offline de extremo a extremo: buzón sintético -> IMAP -> resúmenes -> BD -> API.
+
+Genera un buzón de `--correos` newsletters sintéticas (texto, HTML y multipart, con
+adjuntos y tamaños variables, repartidas en `--dias` días), lo sirve con el servidor
+IMAP falso y lo ingiere con sincronizar_carpeta usando el backend de resúmenes local
+(`--latencia` segundos por petición, `--lote` newsletters por petición). Después
+lanza `--peticiones` peticiones con `--concurrencia` clientes contra la aplicación
+ASGI (sin red) mezclando GET /days, GET /days/{id} y POST /days/{id}/summarize.
+
+La salida es JSON: correos por segundo, tiempo ocupado por etapa (descarga IMAP,
+parseo, resumen y SQL), tamaño de la BD y percentiles de latencia por endpoint. Con
+`--salida` se guarda en un fichero y con `--comparar` se compara con un resultado
+anterior (p. ej. de otro commit).
+
+Uso:
+    python -m app.benchmarks.extremo_a_extremo --correos 500 --dias 60 \\
+        --latencia 0.05 --peticiones 600 --concurrencia 16 --salida resultado.json
+"""
+
+import argparse
+import asyncio
+import atexit
+import imaplib
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+# Base de datos desechable: nunca se escribe en la BD configurada en .env
+_tmp_dir = tempfile.mkdtemp(prefix="bench_e2e_")
+atexit.register(shutil.rmtree, _tmp_dir, ignore_errors=True)
+_db_path = os.path.join(_tmp_dir, "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_path}"
+os.environ.setdefault("FOLDER", "INBOX")
+
+import httpx  # noqa: E402
+from sqlalchemy import event, text  # noqa: E402
+
+from app.api.v1.cache_http import cache_respuestas  # noqa: E402
+from app.benchmarks.buzon_sintetico import generar_buzon  # noqa: E402
+from app.benchmarks.fake_imap import ServidorImapFalso  # noqa: E402
+from app.core.database import SessionLocal, engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models.newsletter import NewsletterDia, Sender  # noqa: E402
+from app.services.ai.backends import BackendLocal, configurar_backend  # noqa: E402
+from app.services.correos.newsletter_mail import (  # noqa: E402
+    _parsear_correo,
+    sincronizar_carpeta,
+)
+
+
+class _Cronometro:
+    """
+    Acumula tiempo ocupado y número de operaciones por etapa (seguro entre hilos).
+    Las etapas se solapan entre hilos: el total puede superar el tiempo real.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.segundos = {}
+        self.operaciones = {}
+
+    def sumar(self, etapa: str, segundos: float, n: int = 1):
+        with self._lock:
+            self.segundos[etapa] = self.segundos.get(etapa, 0.0) + segundos
+            self.operaciones[etapa] = self.operaciones.get(etapa, 0) + n
+
+    def resultado(self) -> dict:
+        return {
+            etapa: {
+                "segundos": round(segundos, 3),
+                "operaciones": self.operaciones[etapa],
+            }
+            for etapa, segundos in sorted(self.segundos.items())
+        }
+
+
+class _ImapCronometrado:
+    """
+    Envuelve una conexión IMAP midiendo el tiempo de los UID FETCH.
+    """
+
+    def __init__(self, mail: imaplib.IMAP4, cronometro: _Cronometro):
+        self._mail = mail
+        self._cronometro = cronometro
+
+    def uid(self, comando: str, *args):
+        t0 = time.perf_counter()
+        try:
+            return self._mail.uid(comando, *args)
+        finally:
+            if comando.upper() == "FETCH":
+                self._cronometro.sumar("imap_fetch", time.perf_counter() - t0)
+
+    def __getattr__(self, nombre):
+        return getattr(self._mail, nombre)
+
+
+class _BackendCronometrado(BackendLocal):
+    """
+    BackendLocal que mide el tiempo de cada petición de resumen.
+    """
+
+    def __init__(self, cronometro: _Cronometro, **kwargs):
+        super().__init__(**kwargs)
+        self._cronometro = cronometro
+
+    def generar(self, prompt: str) -> str:
+        t0 = time.perf_counter()
+        try:
+            return super().generar(prompt)
+        finally:
+            self._cronometro.sumar("resumen", time.perf_counter() - t0)
+
+    def generar_lote(self, prompts: list[str]) -> list[str]:
+        t0 = time.perf_counter()
+        try:
+            return super().generar_lote(prompts)
+        finally:
+            self._cronometro.sumar("resumen", time.perf_counter() - t0)
+
+
+def _medir_sql(cronometro: _Cronometro):
+    """
+    Acumula el tiempo de todas las sentencias SQL del motor síncrono.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("bench_t0", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _despues(conn, cursor, statement, parameters, context, executemany):
+        cronometro.sumar("sql", time.perf_counter() - conn.info["bench_t0"].pop())
+
+
+def _tamano_bd() -> dict:
+    tamanos = {
+        nombre: os.path.getsize(_db_path + sufijo)
+        for nombre, sufijo in (("db", ""), ("wal", "-wal"))
+        if os.path.exists(_db_path + sufijo)
+    }
+    with engine.connect() as conn:
+        conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+    tamanos["db_tras_checkpoint"] = os.path.getsize(_db_path)
+    return {f"{clave}_mb": round(valor / 1e6, 2) for clave, valor in tamanos.items()}
+
+
+def _percentiles(latencias: list[float]) -> dict:
+    if not latencias:
+        return {"peticiones": 0}
+    ordenadas = sorted(latencias)
+
+    def percentil(p: float) -> float:
+        return round(ordenadas[min(len(ordenadas) - 1, int(p * len(ordenadas)))], 2)
+
+    return {
+        "peticiones": len(ordenadas),
+        "media_ms": round(statistics.fmean(ordenadas), 2),
+        "p50_ms": percentil(0.50),
+        "p95_ms": percentil(0.95),
+        "p99_ms": percentil(0.99),
+        "max_ms": round(ordenadas[-1], 2),
+    }
+
+
+def ingerir(args, cronometro: _Cronometro) -> dict:
+    buzon = generar_buzon(args.correos, dias=args.dias, seed=args.seed)
+    servidor = ServidorImapFalso(buzon).iniciar()
+
+    # El parseo se hace en línea con la descarga: se mide aparte, en un solo hilo
+    t0 = time.perf_counter()
+    for raw in buzon:
+        _parsear_correo(raw)
+    cronometro.sumar("parseo", time.perf_counter() - t0, len(buzon))
+
+    progreso = {}
+    hitos = {}
+    t0 = time.perf_counter()
+
+    def al_progresar(contadores: dict):
+        progreso.update(contadores)
+        for clave, valor in contadores.items():
+            if valor >= args.correos and clave not in hitos:
+                hitos[clave] = round(time.perf_counter() - t0, 3)
+
+    mail = imaplib.IMAP4("127.0.0.1", servidor.puerto)
+    mail.login("bench", "bench")
+    try:
+        sincronizar_carpeta(_ImapCronometrado(mail, cronometro), progreso=al_progresar)
+    finally:
+        mail.logout()
+        servidor.detener()
+    duracion = time.perf_counter() - t0
+    return {
+        "segundos": round(duracion, 3),
+        "correos_por_segundo": round(args.correos / duracion, 2),
+        "contadores": progreso,
+        # Segundos desde el inicio hasta que cada etapa terminó con todos los correos
+        "etapa_completa_s": hitos,
+        "bytes_buzon_mb": round(sum(map(len, buzon)) / 1e6, 2),
+    }
+
+
+async def cargar_api(args) -> dict:
+    db = SessionLocal()
+    try:
+        dias = [dia_id for (dia_id,) in db.query(NewsletterDia.id)]
+        remitentes = [sender_id for (sender_id,) in db.query(Sender.id)]
+    finally:
+        db.close()
+    rng = random.Random(args.seed)
+    operaciones = []
+    for _ in range(args.peticiones):
+        r = rng.random()
+        if r < args.peso_summarize:
+            operaciones.append(
+                ("summarize", "POST", f"/days/{rng.choice(dias)}/summarize")
+            )
+        elif r < args.peso_summarize + (1 - args.peso_summarize) / 2:
+            consulta = (
+                f"?sender_id={rng.choice(remitentes)}" if rng.random() < 0.5 else ""
+            )
+            operaciones.append(("days", "GET", f"/days{consulta}"))
+        else:
+            operaciones.append(("day", "GET", f"/days/{rng.choice(dias)}"))
+
+    latencias = {"days": [], "day": [], "summarize": []}
+    errores = {"days": 0, "day": 0, "summarize": 0}
+    cola = iter(operaciones)
+    transporte = httpx.ASGITransport(app=app)
+
+    async def cliente():
+        async with httpx.AsyncClient(
+            transport=transporte, base_url="http://bench/api/v1", timeout=None
+        ) as http:
+            for nombre, metodo, ruta in cola:
+                t0 = time.perf_counter()
+                respuesta = await http.request(metodo, ruta)
+                latencias[nombre].append((time.perf_counter() - t0) * 1000)
+                if respuesta.status_code != 200:
+                    errores[nombre] += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(cliente() for _ in range(args.concurrencia)))
+    duracion = time.perf_counter() - t0
+    return {
+        "segundos": round(duracion, 3),
+        "peticiones_por_segundo": round(args.peticiones / duracion, 2),
+        "endpoints": {
+            nombre: {**_percentiles(valores), "errores": errores[nombre]}
+            for nombre, valores in latencias.items()
+        },
+        "cache_http": dict(cache_respuestas.contadores),
+    }
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _aplanar(datos: dict, prefijo: str = "") -> dict:
+    plano = {}
+    for clave, valor in datos.items():
+        if isinstance(valor, dict):
+            plano.update(_aplanar(valor, f"{prefijo}{clave}."))
+        elif isinstance(valor, (int, float)) and not isinstance(valor, bool):
+            plano[f"{prefijo}{clave}"] = valor
+    return plano
+
+
+def comparar(anterior: dict, actual: dict) -> dict:
+    """
+    Compara las métricas numéricas de dos resultados (cambio en % respecto al
+    anterior). Los parámetros de la ejecución no se comparan.
+    """
+    antes = _aplanar({k: v for k, v in anterior.items() if k != "parametros"})
+    ahora = _aplanar({k: v for k, v in actual.items() if k != "parametros"})
+    return {
+        clave: {
+            "antes": antes[clave],
+            "ahora": ahora[clave],
+            "cambio_pct": (
+                round((ahora[clave] - antes[clave]) / antes[clave] * 100, 1)
+                if antes[clave]
+                else None
+            ),
+        }
+        for clave in antes
+        if clave in ahora and antes[clave] != ahora[clave]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--correos", type=int, default=500)
+    parser.add_argument("--dias", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latencia", type=float, default=0.05)
+    parser.add_argument("--lote", type=int, default=1)
+    parser.add_argument("--peticiones", type=int, default=600)
+    parser.add_argument("--concurrencia", type=int, default=16)
+    parser.add_argument("--peso-summarize", type=float, default=0.05)
+    parser.add_argument("--salida")
+    parser.add_argument("--comparar")
+    args = parser.parse_args()
+
+    cronometro = _Cronometro()
+    configurar_backend(
+        _BackendCronometrado(
+            cronometro, latencia=args.latencia, tasa_fallo=0, max_lote=args.lote
+        )
+    )
+    _medir_sql(cronometro)
+
+    resultado = {
+        "parametros": {
+            **vars(args),
+            "commit": _commit(),
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+        },
+        "ingesta": ingerir(args, cronometro),
+    }
+    resultado["etapas"] = cronometro.resultado()
+    resultado["bd"] = _tamano_bd()
+    resultado["api"] = asyncio.run(cargar_api(args))
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            resultado["comparacion"] = comparar(json.load(f), resultado)
+    salida = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(salida + "\n")
+    print(salida)
+
+
+if __name__ == "__main__":
+    main()
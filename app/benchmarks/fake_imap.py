@@ -0,0 +1,308 @@
+"""
+Servidor IMAP falso en memoria para probar la ingesta sin un servidor real.
+
+Implementa lo que usa la aplicación: CAPABILITY, LOGIN, SELECT (con UIDVALIDITY y
+UIDNEXT), UID SEARCH (UID n:*, UNSEEN, ALL), UID FETCH (UID RFC822), NOOP, IDLE/DONE
+y LOGOUT. Los correos se añaden en caliente con `agregar` y los clientes en IDLE
+reciben "* n EXISTS" al momento. También permite simular fallos: cortar todas las
+conexiones, cerrar las sesiones IDLE pasado un tiempo (como los servidores reales) o
+no anunciar IDLE.
+
+Uso (sirve un buzón sintético; configurar IMAP_SERVER=127.0.0.1 e IMAP_PORT):
+    python -m app.benchmarks.fake_imap --correos 200 --puerto 1143
+"""
+
+import argparse
+import re
+import socketserver
+import threading
+import time
+
+from app.benchmarks.buzon_sintetico import generar_buzon
+
+LINEA_RE = re.compile(r"^(\S+) (\S+)(?: (.*))?$")
+
+
+class _Manejador(socketserver.StreamRequestHandler):
+    server: "_ServidorTCP"
+
+    def setup(self):
+        super().setup()
+        self.lock_escritura = threading.Lock()
+        self.en_idle = False
+        self.conocidos = 0  # Último EXISTS comunicado a este cliente
+
+    def escribir(self, texto: str | bytes):
+        datos = texto.encode("utf-8") if isinstance(texto, str) else texto
+        with self.lock_escritura:
+            self.wfile.write(datos)
+            self.wfile.flush()
+
+    def handle(self):
+        buzon = self.server.buzon
+        buzon.registrar(self)
+        try:
+            capacidades = "IMAP4rev1 IDLE" if buzon.idle else "IMAP4rev1"
+            self.escribir(f"* OK [CAPABILITY {capacidades}] Servidor IMAP falso\r\n")
+            while True:
+                linea = self.rfile.readline()
+                if not linea:
+                    return
+                match = LINEA_RE.match(linea.decode("utf-8", "replace").rstrip("\r\n"))
+                if not match:
+                    self.escribir("* BAD Comando no válido\r\n")
+                    continue
+                tag, comando, argumentos = match.groups()
+                if not self.ejecutar(tag, comando.upper(), argumentos or ""):
+                    return
+        except (ConnectionError, OSError):
+            return
+        finally:
+            buzon.desregistrar(self)
+
+    def ejecutar(self, tag: str, comando: str, argumentos: str) -> bool:
+        buzon = self.server.buzon
+        if comando == "CAPABILITY":
+            capacidades = "IMAP4rev1 IDLE" if buzon.idle else "IMAP4rev1"
+            self.escribir(f"* CAPABILITY {capacidades}\r\n{tag} OK CAPABILITY\r\n")
+        elif comando == "LOGIN":
+            buzon.contadores["logins"] += 1
+            self.escribir(f"{tag} OK LOGIN completado\r\n")
+        elif comando in ("SELECT", "EXAMINE"):
+            with buzon.lock:
+                total, uidnext = len(buzon.mensajes), buzon.uidnext
+                self.conocidos = total
+            self.escribir(
+                f"* {total} EXISTS\r\n* 0 RECENT\r\n"
+                f"* OK [UIDVALIDITY {buzon.uidvalidity}] UIDs válidos\r\n"
+                f"* OK [UIDNEXT {uidnext}] Siguiente UID\r\n"
+                f"{tag} OK [READ-WRITE] SELECT completado\r\n"
+            )
+        elif comando == "NOOP":
+            with buzon.lock:
+                total = self.conocidos = len(buzon.mensajes)
+            self.escribir(f"* {total} EXISTS\r\n{tag} OK NOOP\r\n")
+        elif comando == "UID":
+            self.uid(tag, argumentos)
+        elif comando == "IDLE":
+            return self.idle(tag)
+        elif comando == "LOGOUT":
+            self.escribir(f"* BYE Hasta luego\r\n{tag} OK LOGOUT completado\r\n")
+            return False
+        else:
+            self.escribir(f"{tag} BAD Comando no soportado: {comando}\r\n")
+        return True
+
+    def uid(self, tag: str, argumentos: str):
+        buzon = self.server.buzon
+        subcomando, _, resto = argumentos.partition(" ")
+        subcomando = subcomando.upper()
+        if subcomando == "SEARCH":
+            uids = buzon.buscar(resto.strip().upper())
+            respuesta = " ".join(["* SEARCH", *map(str, uids)])
+            self.escribir(f"{respuesta}\r\n{tag} OK SEARCH\r\n")
+        elif subcomando == "FETCH":
+            conjunto = resto.split(" ", 1)[0]
+            for seq, uid, raw in buzon.obtener(conjunto):
+                self.escribir(
+                    f"* {seq} FETCH (UID {uid} RFC822 {{{len(raw)}}}\r\n".encode()
+                    + raw
+                    + b")\r\n"
+                )
+            buzon.contadores["fetch"] += 1
+            self.escribir(f"{tag} OK FETCH completado\r\n")
+        else:
+            self.escribir(f"{tag} BAD UID {subcomando} no soportado\r\n")
+
+    def idle(self, tag: str) -> bool:
+        buzon = self.server.buzon
+        buzon.contadores["idle"] += 1
+        self.escribir("+ idling\r\n")
+        with buzon.lock:
+            self.en_idle = True
+            total = len(buzon.mensajes)
+            pendientes = total > self.conocidos
+            self.conocidos = total
+        if pendientes:
+            # Como los servidores reales: lo llegado entre comandos se anuncia ya
+            self.escribir(f"* {total} EXISTS\r\n")
+        if buzon.idle_timeout:
+            self.connection.settimeout(buzon.idle_timeout)
+        try:
+            linea = self.rfile.readline()
+        except TimeoutError:
+            # Como los servidores reales: la sesión IDLE demasiado larga se corta
+            self.escribir("* BYE Tiempo de IDLE agotado\r\n")
+            return False
+        finally:
+            self.en_idle = False
+            self.connection.settimeout(None)
+        if not linea:
+            return False
+        if linea.strip().upper() != b"DONE":
+            self.escribir(f"{tag} BAD Se esperaba DONE\r\n")
+            return True
+        self.escribir(f"{tag} OK IDLE terminado\r\n")
+        return True
+
+
+class _ServidorTCP(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class ServidorImapFalso:
+    """
+    Buzón IMAP en memoria servido en 127.0.0.1. `puerto=0` elige un puerto libre.
+    """
+
+    def __init__(
+        self,
+        correos: list[bytes] | None = None,
+        puerto: int = 0,
+        uidvalidity: int = 1,
+        idle: bool = True,
+        idle_timeout: float | None = None,
+    ):
+        self.uidvalidity = uidvalidity
+        self.idle = idle
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        self.mensajes = []  # (uid, raw, visto)
+        self.uidnext = 1
+        self.contadores = {"logins": 0, "fetch": 0, "idle": 0}
+        self._clientes = set()
+        for raw in correos or []:
+            self._anadir(raw)
+        self._tcp = _ServidorTCP(("127.0.0.1", puerto), _Manejador)
+        self._tcp.buzon = self
+        self._hilo = None
+
+    @property
+    def puerto(self) -> int:
+        return self._tcp.server_address[1]
+
+    def iniciar(self) -> "ServidorImapFalso":
+        self._hilo = threading.Thread(
+            target=self._tcp.serve_forever, name="imap-falso", daemon=True
+        )
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self.cortar_conexiones()
+        self._tcp.shutdown()
+        self._tcp.server_close()
+
+    def registrar(self, cliente: _Manejador):
+        with self.lock:
+            self._clientes.add(cliente)
+
+    def desregistrar(self, cliente: _Manejador):
+        with self.lock:
+            self._clientes.discard(cliente)
+
+    def _anadir(self, raw: bytes) -> int:
+        uid = self.uidnext
+        self.mensajes.append([uid, raw, False])
+        self.uidnext += 1
+        return uid
+
+    def agregar(self, raw: bytes) -> int:
+        """
+        Añade un correo al buzón y lo anuncia a los clientes en IDLE. Devuelve su UID.
+        """
+        with self.lock:
+            uid = self._anadir(raw)
+            total = len(self.mensajes)
+            en_idle = [cliente for cliente in self._clientes if cliente.en_idle]
+            for cliente in en_idle:
+                cliente.conocidos = total
+        for cliente in en_idle:
+            try:
+                cliente.escribir(f"* {total} EXISTS\r\n")
+            except OSError:
+                pass
+        return uid
+
+    def cortar_conexiones(self):
+        """
+        Cierra de golpe todas las conexiones abiertas (simula una caída de red).
+        """
+        with self.lock:
+            clientes = list(self._clientes)
+        for cliente in clientes:
+            try:
+                cliente.connection.shutdown(2)
+            except OSError:
+                pass
+
+    def buscar(self, criterio: str) -> list[int]:
+        with self.lock:
+            uids = [uid for uid, _, _ in self.mensajes]
+            no_vistos = [uid for uid, _, visto in self.mensajes if not visto]
+        if criterio == "UNSEEN":
+            return no_vistos
+        if criterio.startswith("UID "):
+            return self._uids_de_conjunto(criterio[4:], uids)
+        return uids
+
+    def obtener(self, conjunto: str) -> list[tuple[int, int, bytes]]:
+        with self.lock:
+            uids = set(self._uids_de_conjunto(conjunto, [m[0] for m in self.mensajes]))
+            resultado = []
+            for seq, mensaje in enumerate(self.mensajes, start=1):
+                if mensaje[0] in uids:
+                    mensaje[2] = True  # RFC822 marca el correo como leído
+                    resultado.append((seq, mensaje[0], mensaje[1]))
+            return resultado
+
+    @staticmethod
+    def _uids_de_conjunto(conjunto: str, uids: list[int]) -> list[int]:
+        """
+        Resuelve un conjunto de UIDs ("3:7,9,12:*"). Como en IMAP, "n:*" incluye
+        siempre el último UID aunque sea menor que n.
+        """
+        if not uids:
+            return []
+        maximo = max(uids)
+        seleccion = set()
+        for parte in conjunto.split(","):
+            inicio, _, fin = parte.partition(":")
+            inicio = maximo if inicio == "*" else int(inicio)
+            fin = inicio if not fin else (maximo if fin == "*" else int(fin))
+            bajo, alto = min(inicio, fin), max(inicio, fin)
+            seleccion.update(uid for uid in uids if bajo <= uid <= alto)
+        return sorted(seleccion)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--correos", type=int, default=200)
+    parser.add_argument("--dias", type=int, default=30)
+    parser.add_argument("--puerto", type=int, default=1143)
+    parser.add_argument(
+        "--cada",
+        type=float,
+        default=0,
+        help="Segundos entre correos nuevos añadidos en caliente (0: ninguno)",
+    )
+    args = parser.parse_args()
+
+    servidor = ServidorImapFalso(
+        generar_buzon(args.correos, dias=args.dias), puerto=args.puerto
+    ).iniciar()
+    print(f"Servidor IMAP falso en 127.0.0.1:{servidor.puerto}")
+    try:
+        i = args.correos
+        while True:
+            time.sleep(args.cada or 3600)
+            if args.cada:
+                servidor.agregar(generar_buzon(1, dias=1, seed=i)[0])
+                i += 1
+    except KeyboardInterrupt:
+        servidor.detener()
+
+
+if __name__ == "__main__":
+    main()
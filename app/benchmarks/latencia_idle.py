@@ -0,0 +1,136 @@
+"""
+Benchmark offline de la escucha IMAP IDLE contra el servidor IMAP falso.
+
+Arranca app.benchmarks.fake_imap con un buzón sintético, conecta EscuchaIdle (con un
+resumidor falso y una SQLite temporal) y mide el tiempo desde que llega un correo al
+buzón hasta que está guardado en la BD. A mitad de prueba se cortan las conexiones
+para comprobar la reconexión, y el servidor corta las sesiones IDLE que duran más de
+`--idle-servidor` segundos para comprobar que el cliente las renueva antes.
+
+Uso:
+    python -m app.benchmarks.latencia_idle --iniciales 50 --nuevos 20 --cada 0.2
+"""
+
+import argparse
+import atexit
+import imaplib
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from functools import partial
+
+# Base de datos desechable: nunca se escribe en la BD configurada en .env
+_tmp_dir = tempfile.mkdtemp(prefix="bench_idle_")
+atexit.register(shutil.rmtree, _tmp_dir, ignore_errors=True)
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}"
+os.environ.setdefault("FOLDER", "INBOX")
+
+from app.benchmarks.buzon_sintetico import generar_buzon  # noqa: E402
+from app.benchmarks.fake_imap import ServidorImapFalso  # noqa: E402
+from app.benchmarks.pipeline_resumen import resumidor_falso  # noqa: E402
+from app.core.config import FOLDER  # noqa: E402
+from app.core.database import Base, SessionLocal, engine  # noqa: E402
+from app.models.newsletter import Newsletter  # noqa: E402
+from app.services.correos.busqueda_fts import crear_indice_fts  # noqa: E402
+from app.services.correos.escucha_idle import EscuchaIdle  # noqa: E402
+from app.services.correos.newsletter_mail import sincronizar_carpeta  # noqa: E402
+
+
+def _guardado(email_id: str) -> bool:
+    db = SessionLocal()
+    try:
+        return (
+            db.query(Newsletter.id).filter(Newsletter.email_id == email_id).first()
+            is not None
+        )
+    finally:
+        db.close()
+
+
+def _esperar(email_id: str, timeout: float) -> float | None:
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < timeout:
+        if _guardado(email_id):
+            return time.perf_counter() - t0
+        time.sleep(0.005)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iniciales", type=int, default=50)
+    parser.add_argument("--nuevos", type=int, default=20)
+    parser.add_argument("--cada", type=float, default=0.2)
+    parser.add_argument("--latencia-resumen", type=float, default=0.05)
+    parser.add_argument("--idle-cliente", type=float, default=1.0)
+    parser.add_argument("--idle-servidor", type=float, default=2.0)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    crear_indice_fts(engine)
+    servidor = ServidorImapFalso(
+        generar_buzon(args.iniciales, seed=1), idle_timeout=args.idle_servidor
+    ).iniciar()
+
+    def conectar():
+        mail = imaplib.IMAP4("127.0.0.1", servidor.puerto)
+        mail.login("bench", "bench")
+        return mail
+
+    escucha = EscuchaIdle(
+        conectar=conectar,
+        sincronizar=partial(
+            sincronizar_carpeta, summarizer=resumidor_falso(args.latencia_resumen)
+        ),
+        idle_timeout=args.idle_cliente,
+        reconexion_inicial=0.2,
+        reconexion_max=2.0,
+    )
+    t0 = time.perf_counter()
+    escucha.iniciar()
+    ultimo_inicial = f"{FOLDER}:{servidor.uidvalidity}:{args.iniciales}"
+    sincronizacion_inicial = _esperar(ultimo_inicial, 60)
+
+    latencias = []
+    perdidos = 0
+    for i in range(args.nuevos):
+        if i == args.nuevos // 2:
+            servidor.cortar_conexiones()  # Caída de red a mitad de prueba
+        uid = servidor.agregar(generar_buzon(1, dias=1, seed=1000 + i)[0])
+        latencia = _esperar(f"{FOLDER}:{servidor.uidvalidity}:{uid}", 30)
+        if latencia is None:
+            perdidos += 1
+        else:
+            latencias.append(latencia)
+        time.sleep(args.cada)
+    escucha.detener()
+    servidor.detener()
+
+    latencias_ordenadas = sorted(latencias)
+    print(
+        json.dumps(
+            {
+                "sincronizacion_inicial_s": round(
+                    sincronizacion_inicial or time.perf_counter() - t0, 3
+                ),
+                "nuevos": args.nuevos,
+                "perdidos": perdidos,
+                "latencia_p50_ms": (
+                    round(statistics.median(latencias) * 1000, 1) if latencias else None
+                ),
+                "latencia_max_ms": (
+                    round(latencias_ordenadas[-1] * 1000, 1) if latencias else None
+                ),
+                "conexiones": escucha.conexiones,
+                "logins_servidor": servidor.contadores["logins"],
+                "ciclos_idle": servidor.contadores["idle"],
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
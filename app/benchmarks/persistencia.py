@@ -0,0 +1,120 @@
+"""
+Benchmark offline de la persistencia de la ingesta: commits por mensaje y mensajes/s.
+
+Compara el camino por mensaje (save_newsletter_to_db + add_newsletter_to_day, dos
+sesiones por correo) con save_newsletters_bulk (una transacción por lote), cada uno
+sobre su propia SQLite temporal.
+
+Uso:
+    python -m app.benchmarks.persistencia --correos 1000 --lote 100
+"""
+
+import argparse
+import atexit
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Base de datos desechable: nunca se escribe en la BD configurada en .env
+_tmp_dir = tempfile.mkdtemp(prefix="bench_persistencia_")
+atexit.register(shutil.rmtree, _tmp_dir, ignore_errors=True)
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}"
+
+from sqlalchemy import event  # noqa: E402
+
+from app.core.database import Base, engine  # noqa: E402
+from app.services.correos.newsletter_db import (  # noqa: E402
+    add_newsletter_to_day,
+    save_newsletter_to_db,
+    save_newsletters_bulk,
+)
+
+
+def correos_sinteticos(n: int, prefijo: str, inicio: datetime) -> list[dict]:
+    return [
+        {
+            "email_id": f"{prefijo}:{i}",
+            "subject": f"Newsletter {i}",
+            "body": f"Contenido de la newsletter {i}. " * 50,
+            "received_at": inicio + timedelta(hours=i),
+            "author": f"Autor {i % 10} <autor{i % 10}@example.com>",
+            "sender_email": f"autor{i % 10}@example.com",
+            "sender_name": f"Autor {i % 10}",
+        }
+        for i in range(n)
+    ]
+
+
+def por_mensaje(correos: list[dict]):
+    for correo in correos:
+        newsletter_obj = save_newsletter_to_db(
+            correo["email_id"],
+            correo["subject"],
+            correo["body"],
+            correo["received_at"],
+            "Resumen",
+            correo["author"],
+            correo["sender_email"],
+            correo["sender_name"],
+        )
+        add_newsletter_to_day(newsletter_obj, correo["received_at"])
+
+
+def por_lotes(lote_max: int):
+    def guardar(correos: list[dict]):
+        for inicio in range(0, len(correos), lote_max):
+            lote = correos[inicio : inicio + lote_max]
+            save_newsletters_bulk([(correo, "Resumen") for correo in lote])
+
+    return guardar
+
+
+def medir(nombre: str, guardar, correos: list[dict]) -> dict:
+    commits = 0
+
+    def contar_commit(conn):
+        nonlocal commits
+        commits += 1
+
+    event.listen(engine, "commit", contar_commit)
+    t0 = time.perf_counter()
+    guardar(correos)
+    duracion = time.perf_counter() - t0
+    event.remove(engine, "commit", contar_commit)
+    return {
+        "modo": nombre,
+        "correos": len(correos),
+        "commits": commits,
+        "commits_por_mensaje": round(commits / len(correos), 3),
+        "correos_por_segundo": round(len(correos) / duracion, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--correos", type=int, default=1000)
+    parser.add_argument("--lote", type=int, default=100)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    # Cada modo usa fechas distintas para que ninguno reutilice los días del otro
+    print(
+        medir(
+            "por_mensaje",
+            por_mensaje,
+            correos_sinteticos(args.correos, "a", datetime(2020, 1, 1, 8)),
+        )
+    )
+    print(
+        medir(
+            f"lotes_de_{args.lote}",
+            por_lotes(args.lote),
+            correos_sinteticos(args.correos, "b", datetime(2025, 1, 1, 8)),
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark offline del pipeline de ingesta con el backend de resúmenes local.
+
+Mide cuántas newsletters por segundo procesa PipelineIngesta para distintos niveles
+de concurrencia y tamaños de lote (newsletters por petición al modelo), sustituyendo
+Gemini por BackendLocal, que tarda `--latencia` segundos por petición.
+No necesita red, IMAP ni API key; la persistencia se hace en una SQLite temporal.
+
+Uso:
+    python -m app.benchmarks.pipeline_resumen --correos 200 --latencia 0.2 \\
+        --concurrencia 1 4 8 --lote 1 5 --rpm 0
+"""
+
+import argparse
+import atexit
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Base de datos desechable: nunca se escribe en la BD configurada en .env
+_tmp_dir = tempfile.mkdtemp(prefix="bench_pipeline_")
+atexit.register(shutil.rmtree, _tmp_dir, ignore_errors=True)
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}"
+# Sin caché de resúmenes: cada medición llama al backend para todos los correos
+os.environ["SUMMARY_CACHE_MAX_BYTES"] = "0"
+
+from app.core.database import Base, engine  # noqa: E402
+from app.services.ai.backends import BackendLocal, configurar_backend  # noqa: E402
+from app.services.ai.resumen_newsletter import (  # noqa: E402
+    summarize_newsletter,
+    summarize_newsletters,
+)
+from app.services.correos.pipeline import PipelineIngesta  # noqa: E402
+
+
+def resumidor_falso(latencia: float):
+    """
+    Devuelve un resumidor que simula la latencia del modelo durmiendo `latencia` s.
+    """
+
+    def summarize(content: str) -> str:
+        time.sleep(latencia)
+        return f"Resumen falso ({len(content)} caracteres)"
+
+    return summarize
+
+
+def correos_sinteticos(n: int, prefijo: str) -> list[dict]:
+    inicio = datetime(2025, 1, 1, 8, 0)
+    return [
+        {
+            "email_id": f"{prefijo}:{i}",
+            "subject": f"Newsletter {i}",
+            "body": f"Contenido de la newsletter {i}. " * 50,
+            "received_at": inicio + timedelta(hours=i),
+            "author": f"Autor {i % 10} <autor{i % 10}@example.com>",
+        }
+        for i in range(n)
+    ]
+
+
+def medir(n: int, latencia: float, concurrencia: int, rpm: float, lote: int) -> dict:
+    backend = BackendLocal(latencia=latencia, tasa_fallo=0, max_lote=lote)
+    configurar_backend(backend)
+    pipeline = PipelineIngesta(
+        summarize_newsletter,
+        concurrency=concurrencia,
+        rpm=rpm,
+        summarizer_lote=summarize_newsletters if lote > 1 else None,
+        batch_size=lote,
+    )
+    t0 = time.perf_counter()
+    for correo in correos_sinteticos(n, f"bench-c{concurrencia}-l{lote}"):
+        pipeline.enviar(correo)
+    pipeline.cerrar()
+    duracion = time.perf_counter() - t0
+    return {
+        "concurrencia": concurrencia,
+        "lote": lote,
+        "peticiones": backend.peticiones,
+        "segundos": round(duracion, 3),
+        "correos_por_segundo": round(n / duracion, 2),
+        **dict(pipeline.contadores),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--correos", type=int, default=100)
+    parser.add_argument("--latencia", type=float, default=0.2)
+    parser.add_argument("--concurrencia", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--lote", type=int, nargs="+", default=[1])
+    parser.add_argument("--rpm", type=float, default=0)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    for lote in args.lote:
+        for concurrencia in args.concurrencia:
+            print(medir(args.correos, args.latencia, concurrencia, args.rpm, lote))
+
+
+if __name__ == "__main__":
+    main()
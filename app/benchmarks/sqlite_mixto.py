@@ -0,0 +1,231 @@
+"""
+Benchmark offline de carga mixta de lectura/escritura sobre SQLite.
+
+Un hilo escribe lotes de newsletters nuevas (save_newsletters_bulk, como la
+ingesta) mientras varios hilos leen como el frontend (página de días y detalle de un
+día con cuerpos). Mide lecturas/s, latencia p50/p99 de lectura, newsletters
+escritas/s y errores por bloqueo. Cada modo corre en su propio proceso y BD temporal:
+
+- "base": la configuración anterior a los perfiles de SQLite: SQLITE_PROFILE=default
+  (ningún PRAGMA: journal en modo DELETE y solo la espera por defecto del driver) y
+  únicamente los índices originales de newsletters, newsletters_dias y
+  newsletter_dia_rel (sin índice sobre la fecha del día). Sin el índice único, los
+  días se resuelven como entonces: consulta de los existentes y alta de los que
+  faltan (un solo escritor, así que no se duplican).
+- "optimizado": SQLITE_PROFILE=performance (WAL, synchronous=NORMAL, mmap...) y
+  todos los índices.
+
+Uso:
+    python -m app.benchmarks.sqlite_mixto --iniciales 3000 --segundos 10 --lectores 4
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+MODOS = ("base", "optimizado")
+TABLAS_ORIGINALES = ("newsletters", "newsletters_dias", "newsletter_dia_rel")
+INDICES_ORIGINALES = {
+    "ix_newsletters_id",
+    "ix_newsletters_email_id",
+    "ix_newsletters_dias_id",
+}
+
+
+def _correos(inicio: int, n: int, dias: int) -> list[tuple[dict, str]]:
+    base = datetime(2025, 1, 1, 8)
+    rng = random.Random(inicio)
+    return [
+        (
+            {
+                "email_id": f"bench:{i}",
+                "subject": f"Newsletter {i}",
+                "body": f"Contenido de la newsletter {i}. " * 80,
+                "received_at": base
+                + timedelta(days=rng.randrange(dias), minutes=rng.randrange(1440)),
+                "author": f"Autor {i % 20} <autor{i % 20}@example.com>",
+                "sender_email": f"autor{i % 20}@example.com",
+                "sender_name": f"Autor {i % 20}",
+            },
+            f"Resumen de la newsletter {i}",
+        )
+        for i in range(inicio, inicio + n)
+    ]
+
+
+def _percentil(valores: list[float], p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))]
+
+
+def _asegurar_dias_base(db, fechas: set[datetime]) -> dict[datetime, int]:
+    """
+    asegurar_dias sin el índice único de 'fecha' (modo "base"): una consulta para los
+    días existentes y un flush para crear el resto.
+    """
+    from app.models.newsletter import NewsletterDia
+
+    dias = dict(
+        db.query(NewsletterDia.fecha, NewsletterDia.id).filter(
+            NewsletterDia.fecha.in_(list(fechas))
+        )
+    )
+    nuevos = [
+        NewsletterDia(fecha=fecha, summary=None) for fecha in fechas - dias.keys()
+    ]
+    db.add_all(nuevos)
+    db.flush()
+    dias.update((dia.fecha, dia.id) for dia in nuevos)
+    return dias
+
+
+def ejecutar(modo: str, iniciales: int, segundos: float, lectores: int, lote: int):
+    """
+    Ejecuta la carga en este proceso. DATABASE_URL y SQLITE_PROFILE deben estar ya
+    en el entorno (ver main).
+    """
+    from fastapi import Response
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+
+    from app.api.v1.days import _day_to_dict, _pagina_de_dias
+    from app.core.database import Base, SessionLocal, engine
+    from app.services.correos import newsletter_db
+    from app.services.correos.busqueda_fts import crear_indice_fts
+    from app.services.correos.newsletter_db import save_newsletters_bulk
+
+    Base.metadata.create_all(bind=engine)
+    crear_indice_fts(engine)
+    if modo == "base":
+        with engine.begin() as conn:
+            indices = conn.execute(
+                text(
+                    "SELECT name FROM sqlite_master WHERE type = 'index' "
+                    "AND sql IS NOT NULL AND tbl_name IN "
+                    f"{TABLAS_ORIGINALES}"
+                )
+            ).scalars()
+            for indice in set(indices) - INDICES_ORIGINALES:
+                conn.execute(text(f"DROP INDEX {indice}"))
+        newsletter_db.asegurar_dias = _asegurar_dias_base
+
+    dias = max(30, iniciales // 25)  # ~25 newsletters por día
+    for inicio in range(0, iniciales, 500):
+        save_newsletters_bulk(_correos(inicio, min(500, iniciales - inicio), dias))
+    with engine.connect() as conn:
+        day_ids = [
+            fila[0] for fila in conn.execute(text("SELECT id FROM newsletters_dias"))
+        ]
+
+    parar = threading.Event()
+    latencias = []
+    errores = {"lectura": 0, "escritura": 0}
+    escritas = 0
+    lock = threading.Lock()
+
+    def escritor():
+        nonlocal escritas
+        siguiente = iniciales
+        while not parar.is_set():
+            try:
+                save_newsletters_bulk(_correos(siguiente, lote, dias))
+                with lock:
+                    escritas += lote
+            except OperationalError:
+                with lock:
+                    errores["escritura"] += 1
+            siguiente += lote
+
+    def lector(semilla: int):
+        rng = random.Random(semilla)
+        while not parar.is_set():
+            db = SessionLocal()
+            t0 = time.perf_counter()
+            try:
+                if rng.random() < 0.5:
+                    _pagina_de_dias(db, Response(), None, 30, None)
+                else:
+                    _day_to_dict(db, rng.choice(day_ids), with_body=True)
+                duracion = time.perf_counter() - t0
+                with lock:
+                    latencias.append(duracion)
+            except OperationalError:
+                with lock:
+                    errores["lectura"] += 1
+            finally:
+                db.close()
+
+    hilos = [threading.Thread(target=escritor)] + [
+        threading.Thread(target=lector, args=(i,)) for i in range(lectores)
+    ]
+    t0 = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    time.sleep(segundos)
+    parar.set()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - t0
+
+    return {
+        "modo": modo,
+        "lecturas": len(latencias),
+        "lecturas_por_segundo": round(len(latencias) / duracion, 1),
+        "lectura_p50_ms": (
+            round(statistics.median(latencias) * 1000, 2) if latencias else 0
+        ),
+        "lectura_p99_ms": round(_percentil(latencias, 0.99) * 1000, 2),
+        "newsletters_escritas_por_segundo": round(escritas / duracion, 1),
+        "errores": errores,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iniciales", type=int, default=3000)
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--lectores", type=int, default=4)
+    parser.add_argument("--lote", type=int, default=50)
+    parser.add_argument("--modos", nargs="+", default=list(MODOS), choices=MODOS)
+    parser.add_argument("--modo", choices=MODOS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.modo:
+        resultado = ejecutar(
+            args.modo, args.iniciales, args.segundos, args.lectores, args.lote
+        )
+        print(json.dumps(resultado))
+        return
+
+    for modo in args.modos:
+        # Proceso nuevo por modo: el motor y los PRAGMAs se configuran al importar
+        with tempfile.TemporaryDirectory(prefix=f"bench_sqlite_{modo}_") as directorio:
+            entorno = {
+                **os.environ,
+                "DATABASE_URL": f"sqlite:///{os.path.join(directorio, 'bench.db')}",
+                "SQLITE_PROFILE": "default" if modo == "base" else "performance",
+            }
+            salida = subprocess.run(
+                [sys.executable, "-m", "app.benchmarks.sqlite_mixto", "--modo", modo]
+                + [f"--iniciales={args.iniciales}", f"--segundos={args.segundos}"]
+                + [f"--lectores={args.lectores}", f"--lote={args.lote}"],
+                env=entorno,
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+        print(salida.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    main()
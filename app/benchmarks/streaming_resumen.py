@@ -0,0 +1,220 @@
+"""
+Benchmark offline del resumen del día en streaming (SSE) frente al endpoint clásico.
+
+Sustituye Gemini por un backend de streaming falso (latencia hasta el primer token y
+retardo entre tokens configurables) y llama directamente a la aplicación ASGI, sin
+servidor ni red. Mide el tiempo hasta el primer byte y hasta el primer fragmento de
+POST /days/{id}/summarize/stream frente al tiempo total de POST /days/{id}/summarize,
+y comprueba que un stream que falla o que el cliente abandona no guarda nada.
+
+Uso:
+    python -m app.benchmarks.streaming_resumen --newsletters 40 --primer-token 0.8 \\
+        --por-token 0.02 --tokens 300
+"""
+
+import argparse
+import asyncio
+import atexit
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Base de datos desechable: nunca se escribe en la BD configurada en .env
+_tmp_dir = tempfile.mkdtemp(prefix="bench_stream_")
+atexit.register(shutil.rmtree, _tmp_dir, ignore_errors=True)
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}"
+os.environ.setdefault("FOLDER", "INBOX")
+
+from app.api.v1.days import get_generador_stream  # noqa: E402
+from app.core.database import SessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models.newsletter import NewsletterDia  # noqa: E402
+from app.services.ai import resumen_newsletter  # noqa: E402
+from app.services.correos.newsletter_db import save_newsletters_bulk  # noqa: E402
+
+RESUMEN_PREVIO = "Resumen anterior del día"
+
+
+def generador_stream_falso(
+    primer_token: float, por_token: float, tokens: int, fallo_en: int | None = None
+):
+    """
+    Devuelve un backend de streaming que espera `primer_token` segundos y después
+    emite `tokens` fragmentos cada `por_token` segundos. Con `fallo_en` lanza un
+    error tras emitir ese número de fragmentos.
+    """
+
+    async def generar(prompt: str):
+        await asyncio.sleep(primer_token)
+        for i in range(tokens):
+            if fallo_en is not None and i >= fallo_en:
+                raise RuntimeError("Fallo simulado del modelo en streaming")
+            if i:
+                await asyncio.sleep(por_token)
+            yield f"\n{i // 10 + 1}. " if i % 10 == 0 else f"palabra{i} "
+
+    return generar
+
+
+def preparar_dia(n: int) -> int:
+    """
+    Guarda `n` newsletters ya resumidas en un mismo día y devuelve el ID del día.
+    """
+    inicio = datetime(2025, 1, 1, 8, 0)
+    save_newsletters_bulk(
+        [
+            (
+                {
+                    "email_id": f"bench-stream:{i}",
+                    "subject": f"Newsletter {i}",
+                    "body": f"Contenido de la newsletter {i}. " * 50,
+                    "received_at": inicio + timedelta(minutes=i),
+                    "author": f"Autor {i % 5} <autor{i % 5}@example.com>",
+                },
+                f"Resumen de la newsletter {i}. " * 10,
+            )
+            for i in range(n)
+        ]
+    )
+    db = SessionLocal()
+    try:
+        dia = db.query(NewsletterDia).one()
+        dia.summary = RESUMEN_PREVIO
+        db.commit()
+        return dia.id
+    finally:
+        db.close()
+
+
+def resumen_guardado(day_id: int) -> str | None:
+    db = SessionLocal()
+    try:
+        return db.get(NewsletterDia, day_id).summary
+    finally:
+        db.close()
+
+
+async def peticion(ruta: str, desconectar_tras: int | None = None) -> dict:
+    """
+    Envía un POST a la aplicación ASGI y mide cuándo llega cada parte del cuerpo.
+    Con `desconectar_tras`, el cliente se desconecta tras recibir esas partes.
+    """
+    ruta, _, query = ruta.partition("?")
+    desconectado = asyncio.Event()
+    partes = []
+    t0 = time.perf_counter()
+    tiempos = {"primer_byte": None, "primer_fragmento": None}
+
+    async def receive():
+        if not partes and not desconectado.is_set():
+            await asyncio.sleep(0)
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await desconectado.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(mensaje):
+        if mensaje["type"] != "http.response.body" or not mensaje.get("body"):
+            return
+        ahora = time.perf_counter() - t0
+        tiempos["primer_byte"] = tiempos["primer_byte"] or ahora
+        if b"event: chunk" in mensaje["body"] or not ruta.endswith("/stream"):
+            tiempos["primer_fragmento"] = tiempos["primer_fragmento"] or ahora
+        partes.append(mensaje["body"])
+        if desconectar_tras is not None and len(partes) >= desconectar_tras:
+            desconectado.set()
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": ruta,
+        "raw_path": ruta.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 1),
+        "server": ("bench", 80),
+    }
+    await app(scope, receive, send)
+    cuerpo = b"".join(partes).decode("utf-8")
+    return {
+        "primer_byte_ms": round(tiempos["primer_byte"] * 1000, 1),
+        "primer_fragmento_ms": round(tiempos["primer_fragmento"] * 1000, 1),
+        "total_ms": round((time.perf_counter() - t0) * 1000, 1),
+        "eventos": [
+            linea[len("event: ") :]
+            for linea in cuerpo.splitlines()
+            if linea.startswith("event: ")
+        ],
+    }
+
+
+async def medir(args) -> dict:
+    day_id = preparar_dia(args.newsletters)
+    generar = generador_stream_falso(args.primer_token, args.por_token, args.tokens)
+
+    async def generar_completo(prompt: str) -> str:
+        return "".join([fragmento async for fragmento in generar(prompt)])
+
+    # El endpoint clásico usa el mismo backend falso, esperando a la respuesta entera
+    resumen_newsletter._generar_async = generar_completo
+    app.dependency_overrides[get_generador_stream] = lambda: generar
+
+    clasico = await peticion(f"/api/v1/days/{day_id}/summarize")
+    # force: las newsletters no han cambiado y, si no, se reutilizaría el resumen
+    streaming = await peticion(f"/api/v1/days/{day_id}/summarize/stream?force=true")
+    guardado_ok = resumen_guardado(day_id)
+
+    # Un stream fallido o abandonado conserva el resumen anterior
+    db = SessionLocal()
+    db.get(NewsletterDia, day_id).summary = RESUMEN_PREVIO
+    db.commit()
+    db.close()
+    app.dependency_overrides[get_generador_stream] = lambda: generador_stream_falso(
+        args.primer_token, args.por_token, args.tokens, fallo_en=args.tokens // 2
+    )
+    fallido = await peticion(f"/api/v1/days/{day_id}/summarize/stream?force=true")
+    conserva_tras_fallo = resumen_guardado(day_id) == RESUMEN_PREVIO
+    app.dependency_overrides[get_generador_stream] = lambda: generar
+    await peticion(
+        f"/api/v1/days/{day_id}/summarize/stream?force=true", desconectar_tras=5
+    )
+    conserva_tras_abandono = resumen_guardado(day_id) == RESUMEN_PREVIO
+    app.dependency_overrides.clear()
+
+    return {
+        "newsletters": args.newsletters,
+        "modelo_primer_token_ms": args.primer_token * 1000,
+        "modelo_total_ms": round(
+            (args.primer_token + args.por_token * (args.tokens - 1)) * 1000, 1
+        ),
+        "clasico_primer_byte_ms": clasico["primer_byte_ms"],
+        "clasico_total_ms": clasico["total_ms"],
+        "stream_primer_byte_ms": streaming["primer_byte_ms"],
+        "stream_primer_fragmento_ms": streaming["primer_fragmento_ms"],
+        "stream_total_ms": streaming["total_ms"],
+        "stream_eventos": len(streaming["eventos"]),
+        "stream_guardado": bool(guardado_ok) and guardado_ok != RESUMEN_PREVIO,
+        "fallo_eventos_finales": fallido["eventos"][-1:],
+        "conserva_tras_fallo": conserva_tras_fallo,
+        "conserva_tras_abandono": conserva_tras_abandono,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--newsletters", type=int, default=40)
+    parser.add_argument("--primer-token", type=float, default=0.8)
+    parser.add_argument("--por-token", type=float, default=0.02)
+    parser.add_argument("--tokens", type=int, default=300)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(medir(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+import zlib
+
+# Nivel 6: el equilibrio por defecto de zlib entre tamaño y velocidad; el texto de
+# las newsletters (muy repetitivo) suele quedar entre 3 y 5 veces más pequeño.
+NIVEL_ZLIB = 6
+
+
+def comprimir(texto: str) -> bytes:
+    """
+    Comprime un texto (UTF-8) con zlib.
+    """
+    return zlib.compress((texto or "").encode("utf-8"), NIVEL_ZLIB)
+
+
+def descomprimir(datos: bytes | None) -> str:
+    """
+    Inversa de `comprimir`. Devuelve una cadena vacía si no hay datos.
+    """
+    if not datos:
+        return ""
+    return zlib.decompress(datos).decode("utf-8")
@@ -11,8 +11,106 @@ IMAP_PORT = os.getenv("IMAP_PORT")
 USERNAME = os.getenv("USERNAME")
 PASSWORD = os.getenv("PASSWORD")
 FOLDER = os.getenv("FOLDER")
+# Número de UIDs que se piden en cada UID FETCH durante la sincronización
+IMAP_FETCH_BATCH = int(os.getenv("IMAP_FETCH_BATCH", "100"))
+# Escucha en segundo plano con IMAP IDLE: los correos nuevos se ingieren al llegar.
+# La espera se renueva cada IMAP_IDLE_TIMEOUT segundos (los servidores cortan a los
+# 30 min, RFC 2177); si el servidor no admite IDLE se consulta cada
+# IMAP_POLL_INTERVAL segundos. Tras un fallo se reconecta con espera exponencial
+# hasta IMAP_RECONNECT_MAX segundos.
+IMAP_IDLE = os.getenv("IMAP_IDLE", "true").lower() in ("1", "true", "yes")
+IMAP_IDLE_TIMEOUT = float(os.getenv("IMAP_IDLE_TIMEOUT", str(25 * 60)))
+IMAP_POLL_INTERVAL = float(os.getenv("IMAP_POLL_INTERVAL", "60"))
+IMAP_RECONNECT_MAX = float(os.getenv("IMAP_RECONNECT_MAX", "300"))
+# Tamaño máximo (caracteres) del texto extraído de cada correo
+BODY_MAX_CHARS = int(os.getenv("BODY_MAX_CHARS", "200000"))
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Perfil de PRAGMAs de SQLite aplicado a cada conexión: "performance" (WAL,
+# synchronous=NORMAL, mmap, caché) o "default" (valores de SQLite). Cada valor del
+# perfil se puede sobrescribir con su variable SQLITE_<PRAGMA>, p. ej. SQLITE_MMAP_SIZE.
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "performance")
+SQLITE_PRAGMAS = {
+    pragma: os.environ[f"SQLITE_{pragma.upper()}"]
+    for pragma in (
+        "journal_mode",
+        "synchronous",
+        "mmap_size",
+        "cache_size",
+        "busy_timeout",
+    )
+    if os.getenv(f"SQLITE_{pragma.upper()}")
+}
 
 GEMINI_KEY = os.getenv("GEMINI_KEY")
 MODEL_GEMINI = os.getenv("MODEL_GEMINI")
+
+# Backend de los resúmenes: "gemini" o "local" (determinista y sin red, para pruebas
+# de carga y uso offline, con latencia por petición y tasa de fallos configurables)
+SUMMARY_BACKEND = os.getenv("SUMMARY_BACKEND", "gemini")
+SUMMARY_LOCAL_LATENCY = float(os.getenv("SUMMARY_LOCAL_LATENCY", "0.5"))
+SUMMARY_LOCAL_FAILURE_RATE = float(os.getenv("SUMMARY_LOCAL_FAILURE_RATE", "0"))
+# Newsletters resumidas en una misma petición al modelo (1 desactiva los lotes)
+SUMMARY_BATCH_SIZE = int(os.getenv("SUMMARY_BATCH_SIZE", "1"))
+
+# Preprocesado del cuerpo antes de resumirlo: las líneas repetidas en al menos
+# BOILERPLATE_MIN_MESSAGES de los últimos BOILERPLATE_HISTORY correos del mismo
+# remitente se eliminan (BOILERPLATE_HISTORY=0 lo desactiva) y el texto se recorta a
+# SUMMARY_INPUT_MAX_TOKENS tokens (0: sin límite)
+BOILERPLATE_HISTORY = int(os.getenv("BOILERPLATE_HISTORY", "5"))
+BOILERPLATE_MIN_MESSAGES = int(os.getenv("BOILERPLATE_MIN_MESSAGES", "3"))
+SUMMARY_INPUT_MAX_TOKENS = int(os.getenv("SUMMARY_INPUT_MAX_TOKENS", "6000"))
+
+# Cola de resúmenes: los correos cuyo resumen falla (o todos, con
+# SUMMARY_QUEUE_ON_INGEST, para que la ingesta no espere al modelo) quedan pendientes y
+# un proceso en segundo plano los resume cada SUMMARY_QUEUE_INTERVAL segundos (0 lo
+# desactiva) en lotes de SUMMARY_QUEUE_BATCH, reintentando los fallidos con espera
+# exponencial desde SUMMARY_RETRY_BASE hasta SUMMARY_RETRY_MAX segundos, como mucho
+# SUMMARY_MAX_ATTEMPTS veces
+SUMMARY_QUEUE_ON_INGEST = os.getenv("SUMMARY_QUEUE_ON_INGEST", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+SUMMARY_QUEUE_INTERVAL = float(os.getenv("SUMMARY_QUEUE_INTERVAL", "30"))
+SUMMARY_QUEUE_BATCH = int(os.getenv("SUMMARY_QUEUE_BATCH", "20"))
+SUMMARY_RETRY_BASE = float(os.getenv("SUMMARY_RETRY_BASE", "60"))
+SUMMARY_RETRY_MAX = float(os.getenv("SUMMARY_RETRY_MAX", "21600"))
+SUMMARY_MAX_ATTEMPTS = int(os.getenv("SUMMARY_MAX_ATTEMPTS", "8"))
+
+# Pipeline de ingesta: llamadas concurrentes al modelo y límite de peticiones/minuto
+# (SUMMARY_RPM=0 desactiva el límite)
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+SUMMARY_RPM = float(os.getenv("SUMMARY_RPM", "0"))
+# Máximo de newsletters guardadas por transacción en la etapa de persistencia
+PERSIST_BATCH_SIZE = int(os.getenv("PERSIST_BATCH_SIZE", "100"))
+
+# Caché persistente de resúmenes por contenido (tamaño máximo en bytes, 0 la desactiva)
+SUMMARY_CACHE_MAX_BYTES = int(
+    os.getenv("SUMMARY_CACHE_MAX_BYTES", str(50 * 1024 * 1024))
+)
+
+# Resumen del día: "hierarchical" (map-reduce sobre los resúmenes de cada newsletter)
+# o "full" (cuerpos completos en un único prompt); tokens máximos por bloque
+DAY_SUMMARY_MODE = os.getenv("DAY_SUMMARY_MODE", "hierarchical")
+DAY_SUMMARY_CHUNK_TOKENS = int(os.getenv("DAY_SUMMARY_CHUNK_TOKENS", "8000"))
+# Cada cuántos segundos se actualizan en segundo plano los resúmenes de los días con
+# newsletters nuevas (0 lo desactiva)
+DAY_SUMMARY_REFRESH_INTERVAL = float(os.getenv("DAY_SUMMARY_REFRESH_INTERVAL", "300"))
+
+# Casi duplicados (similitud de Jaccard estimada con MinHash, 0 lo desactiva): un
+# correo a NEAR_DUPLICATE_THRESHOLD o más de una newsletter ya resumida, con el mismo
+# asunto, reutiliza su resumen, y las newsletters de un día a DAY_CLUSTER_THRESHOLD o más se agrupan en una
+# misma historia antes del resumen del día
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.85"))
+DAY_CLUSTER_THRESHOLD = float(os.getenv("DAY_CLUSTER_THRESHOLD", "0.5"))
+
+# Filas leídas de la BD por bloque en la exportación NDJSON (GET /api/v1/export)
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+# Número de días por página en GET /api/v1/days
+DAYS_PAGE_SIZE = int(os.getenv("DAYS_PAGE_SIZE", "30"))
+
+# Caché en memoria de respuestas JSON de los endpoints de días (número de entradas,
+# 0 la desactiva); se invalida sola al cambiar la versión de los datos
+HTTP_CACHE_MAX_ENTRIES = int(os.getenv("HTTP_CACHE_MAX_ENTRIES", "256"))
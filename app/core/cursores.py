@@ -0,0 +1,20 @@
+from datetime import datetime
+
+
+def crear_cursor(fecha: datetime, row_id: int) -> str:
+    """
+    Cursor de paginación por clave (fecha, id): cabecera X-Next-Cursor de la API y
+    campo 'cursor' de la exportación.
+    """
+    return f"{fecha.isoformat()}_{row_id}"
+
+
+def parsear_cursor(cursor: str) -> tuple[datetime, int]:
+    """
+    Inverso de crear_cursor. Lanza ValueError si el cursor no es válido.
+    """
+    try:
+        fecha, row_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(fecha), int(row_id)
+    except ValueError:
+        raise ValueError(f"Cursor de paginación no válido: {cursor}")
@@ -1,8 +1,14 @@
-from sqlalchemy import create_engine
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 
-from app.core.config import DATABASE_URL
+from app.core.compresion import descomprimir
+from app.core.config import DATABASE_URL, SQLITE_PRAGMAS, SQLITE_PROFILE
+from app.core.metricas import BD_SEGUNDOS
 
 engine = create_engine(
     DATABASE_URL,
@@ -12,6 +18,85 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
+def _url_async(url: str) -> str:
+    """
+    URL equivalente con un driver asíncrono (sqlite -> sqlite+aiosqlite).
+    """
+    url = make_url(url)
+    if url.drivername == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+    return url.render_as_string(hide_password=False)
+
+
+# Motor y sesiones asíncronas para los endpoints (no bloquean el bucle de eventos).
+# El motor síncrono sigue siendo el de la ingesta en segundo plano y los scripts.
+async_engine = create_async_engine(_url_async(DATABASE_URL))
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+
+
+# Perfiles de PRAGMAs por conexión. En "performance":
+# - WAL: los lectores no se bloquean mientras la ingesta escribe (y viceversa).
+# - synchronous=NORMAL: con WAL no se pierde consistencia, solo las últimas
+#   transacciones ante un corte de luz, y evita un fsync por commit.
+# - mmap_size / cache_size (negativo = KiB): lecturas desde memoria.
+# - busy_timeout: espera al cerrojo de escritura en lugar de fallar al instante.
+# "default" no ejecuta ningún PRAGMA (la configuración anterior a los perfiles): solo
+# queda la espera de 5 s que el driver sqlite3 aplica por defecto.
+PERFILES_SQLITE = {
+    "default": {},
+    "performance": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 10000,
+    },
+}
+
+
+def pragmas_sqlite(perfil: str = SQLITE_PROFILE) -> dict:
+    """
+    PRAGMAs del perfil, con los valores sobrescritos por SQLITE_<PRAGMA> (config).
+    """
+    if perfil not in PERFILES_SQLITE:
+        raise ValueError(
+            f"SQLITE_PROFILE desconocido: {perfil} (opciones: {list(PERFILES_SQLITE)})"
+        )
+    return {**PERFILES_SQLITE[perfil], **SQLITE_PRAGMAS}
+
+
+def _configurar_conexion_sqlite(dbapi_conn, connection_record):
+    # Permite leer los cuerpos comprimidos desde SQL (vista del índice FTS)
+    dbapi_conn.create_function(
+        "descomprimir_cuerpo", 1, descomprimir, deterministic=True
+    )
+    cursor = dbapi_conn.cursor()
+    for nombre, valor in pragmas_sqlite().items():
+        cursor.execute(f"PRAGMA {nombre} = {valor}")
+    cursor.close()
+
+
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", _configurar_conexion_sqlite)
+    event.listen(async_engine.sync_engine, "connect", _configurar_conexion_sqlite)
+
+
+# Duración de cada commit (flush incluido) de cualquier sesión, síncrona o asíncrona
+@event.listens_for(Session, "before_commit")
+def _inicio_commit(session):
+    session.info["inicio_commit"] = time.perf_counter()
+
+
+@event.listens_for(Session, "after_commit")
+def _fin_commit(session):
+    inicio = session.info.pop("inicio_commit", None)
+    if inicio is not None:
+        BD_SEGUNDOS.observar(time.perf_counter() - inicio, operacion="commit")
+
+
 # Función para obtener una sesión de la BD
 def get_db():
     db = SessionLocal()
@@ -19,3 +104,9 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# Igual que get_db, con una sesión asíncrona
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
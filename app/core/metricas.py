@@ -0,0 +1,267 @@
+import bisect
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import ContextDecorator
+
+# Límites (segundos) de los histogramas de duración: de milisegundos a minutos
+BUCKETS_SEGUNDOS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+    10.0, 30.0, 60.0, 120.0,
+)  # fmt: skip
+
+REGISTRO = []
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatear_etiquetas(pares) -> str:
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{nombre}="{_escapar(v)}"' for nombre, v in pares) + "}"
+
+
+class _Metrica(ABC):
+    """
+    Serie de valores por combinación de etiquetas, segura entre hilos. Cada métrica
+    se registra al crearse y se exporta en formato de texto de Prometheus.
+    """
+
+    tipo = ""
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple[str, ...] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self._series = {}
+        self._lock = threading.Lock()
+        REGISTRO.append(self)
+
+    def _clave(self, etiquetas: dict) -> tuple:
+        return tuple(str(etiquetas.get(nombre, "")) for nombre in self.etiquetas)
+
+    @abstractmethod
+    def _lineas(self) -> list[str]: ...
+
+    def exportar(self) -> str:
+        cabecera = [
+            f"# HELP {self.nombre} {_escapar(self.ayuda)}",
+            f"# TYPE {self.nombre} {self.tipo}",
+        ]
+        with self._lock:
+            return "\n".join(cabecera + self._lineas())
+
+
+class Contador(_Metrica):
+    """
+    Contador monótono (p. ej. correos procesados o errores).
+    """
+
+    tipo = "counter"
+
+    def inc(self, n: float = 1, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._series[clave] = self._series.get(clave, 0) + n
+
+    def valor(self, **etiquetas) -> float:
+        with self._lock:
+            return self._series.get(self._clave(etiquetas), 0)
+
+    def _lineas(self) -> list[str]:
+        return [
+            f"{self.nombre}{_formatear_etiquetas(list(zip(self.etiquetas, clave)))} "
+            f"{valor}"
+            for clave, valor in sorted(self._series.items())
+        ]
+
+
+class _Cronometro(ContextDecorator):
+    def __init__(self, histograma: "Histograma", etiquetas: dict):
+        self.histograma = histograma
+        self.etiquetas = etiquetas
+
+    def _recreate_cm(self):
+        # Como decorador, cada llamada usa su propio cronómetro (hilos, recursión)
+        return _Cronometro(self.histograma, self.etiquetas)
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.segundos = time.perf_counter() - self.t0
+        self.histograma.observar(self.segundos, **self.etiquetas)
+        return False
+
+
+class Histograma(_Metrica):
+    """
+    Histograma de duraciones con buckets fijos. `cronometrar` sirve como gestor de
+    contexto o como decorador.
+    """
+
+    tipo = "histogram"
+
+    def __init__(
+        self,
+        nombre: str,
+        ayuda: str,
+        etiquetas: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = BUCKETS_SEGUNDOS,
+    ):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(sorted(buckets))
+
+    def observar(self, valor: float, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                # [cuenta por bucket (+Inf al final), suma, número de observaciones]
+                serie = self._series[clave] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            serie[0][bisect.bisect_left(self.buckets, valor)] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def cronometrar(self, **etiquetas) -> _Cronometro:
+        return _Cronometro(self, etiquetas)
+
+    def cuenta(self, **etiquetas) -> int:
+        with self._lock:
+            serie = self._series.get(self._clave(etiquetas))
+            return serie[2] if serie else 0
+
+    def _lineas(self) -> list[str]:
+        lineas = []
+        for clave, (cuentas, suma, total) in sorted(self._series.items()):
+            pares = list(zip(self.etiquetas, clave))
+            acumulado = 0
+            for limite, cuenta in zip((*self.buckets, "+Inf"), cuentas):
+                acumulado += cuenta
+                etiquetas = _formatear_etiquetas(pares + [("le", limite)])
+                lineas.append(f"{self.nombre}_bucket{etiquetas} {acumulado}")
+            etiquetas = _formatear_etiquetas(pares)
+            lineas.append(f"{self.nombre}_sum{etiquetas} {suma}")
+            lineas.append(f"{self.nombre}_count{etiquetas} {total}")
+        return lineas
+
+
+def exportar() -> str:
+    """
+    Todas las métricas registradas en formato de texto de Prometheus (0.0.4).
+    """
+    return "\n".join(metrica.exportar() for metrica in REGISTRO) + "\n"
+
+
+# Métricas de la aplicación
+ETAPA_SEGUNDOS = Histograma(
+    "newsletters_etapa_segundos",
+    "Duración de cada etapa de la sincronización y de los resúmenes",
+    ("etapa",),
+)
+BD_SEGUNDOS = Histograma(
+    "newsletters_bd_segundos",
+    "Duración de las operaciones de escritura y consulta en la BD",
+    ("operacion",),
+)
+MODELO_SEGUNDOS = Histograma(
+    "newsletters_modelo_segundos",
+    "Latencia de las llamadas al modelo de resúmenes",
+    ("backend", "operacion"),
+)
+MODELO_PETICIONES = Contador(
+    "newsletters_modelo_peticiones_total",
+    "Llamadas al modelo de resúmenes por resultado",
+    ("backend", "operacion", "resultado"),
+)
+TOKENS = Contador(
+    "newsletters_tokens_estimados_total",
+    "Tokens estimados (~4 caracteres por token) enviados y recibidos del modelo",
+    ("direccion",),
+)
+TOKENS_PREPROCESADO = Contador(
+    "newsletters_preprocesado_tokens_total",
+    "Tokens estimados de los cuerpos antes y después del preprocesado (original, "
+    "enviado) y ahorrados en cada paso (urls, boilerplate, recorte)",
+    ("tipo",),
+)
+CORREOS = Contador(
+    "newsletters_correos_total",
+    "Correos por etapa de la ingesta (fetched, parsed, summarized, failed, persisted)",
+    ("estado",),
+)
+BYTES = Contador(
+    "newsletters_bytes_total",
+    "Bytes procesados en la ingesta (raw: RFC822 descargado, cuerpo: texto extraído)",
+    ("tipo",),
+)
+ERRORES = Contador(
+    "newsletters_errores_total",
+    "Errores por etapa",
+    ("etapa",),
+)
+RESUMENES_DIA = Contador(
+    "newsletters_resumenes_dia_total",
+    "Resúmenes del día pedidos por modo (vigente: reutilizado sin llamar al modelo)",
+    ("modo",),
+)
+RESUMENES_COLA = Contador(
+    "newsletters_cola_resumenes_total",
+    "Resúmenes procesados por la cola de resúmenes por resultado (done, failed)",
+    ("resultado",),
+)
+CASI_DUPLICADOS = Contador(
+    "newsletters_casi_duplicados_total",
+    "Casi duplicados detectados con MinHash (reutilizado: resumen copiado de una "
+    "newsletter guardada; agrupada: unida a otra en el resumen del día)",
+    ("tipo",),
+)
+CACHE_RESUMENES = Contador(
+    "newsletters_cache_resumenes_total",
+    "Operaciones de la caché de resúmenes por resultado (hit, miss, store, eviction)",
+    ("resultado",),
+)
+HTTP_SEGUNDOS = Histograma(
+    "http_peticiones_segundos",
+    "Duración de las peticiones HTTP (en los streams, hasta enviar el último byte)",
+    ("metodo", "ruta", "estado"),
+)
+
+
+class MiddlewareMetricas:
+    """
+    Middleware ASGI que observa HTTP_SEGUNDOS en cada petición. La ruta es la
+    plantilla ("/days/{day_id}"), que el router deja en el scope, para no crear una
+    serie por cada ID. Al ser ASGI puro no envuelve la respuesta, así que los
+    streams (SSE) y las desconexiones del cliente funcionan igual que sin él.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        t0 = time.perf_counter()
+        estado = 500
+
+        async def send_medido(mensaje):
+            nonlocal estado
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, send_medido)
+        finally:
+            ruta = scope.get("route")
+            HTTP_SEGUNDOS.observar(
+                time.perf_counter() - t0,
+                metodo=scope["method"],
+                ruta=getattr(ruta, "path", "sin_ruta"),
+                estado=estado,
+            )
@@ -0,0 +1,142 @@
+import logging
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from app.core.compresion import comprimir
+from app.core.database import Base
+from app.core.version_datos import incrementar_version
+
+logger = logging.getLogger(__name__)
+
+# Columnas nuevas a tablas que ya existían. create_all solo crea tablas nuevas, así que
+# en BD existentes se añaden con ALTER TABLE al arrancar.
+COLUMNAS_NUEVAS = {
+    "newsletters": {
+        "sender_id": "INTEGER REFERENCES senders(id)",
+        "minhash": "BLOB",
+        "summary_status": "VARCHAR NOT NULL DEFAULT 'done'",
+        "summary_attempts": "INTEGER NOT NULL DEFAULT 0",
+        "summary_next_retry": "DATETIME",
+        "summary_error": "TEXT",
+    },
+    "newsletters_dias": {
+        "summary_fingerprint": "VARCHAR",
+        "summary_version": "VARCHAR",
+        "summary_members": "TEXT",
+        "summary_dirty": "BOOLEAN NOT NULL DEFAULT 0",
+    },
+}
+
+
+def aplicar_migraciones(engine: Engine) -> list[str]:
+    """
+    Añade las columnas que falten en tablas existentes y crea los índices declarados
+    en los modelos que aún no existan. Devuelve las columnas nuevas ("tabla.columna").
+    """
+    inspector = inspect(engine)
+    tablas = set(inspector.get_table_names())
+    nuevas = []
+    with engine.begin() as conn:
+        for tabla, columnas in COLUMNAS_NUEVAS.items():
+            if tabla not in tablas:
+                continue
+            existentes = {c["name"] for c in inspector.get_columns(tabla)}
+            for columna, definicion in columnas.items():
+                if columna not in existentes:
+                    conn.execute(
+                        text(f"ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}")
+                    )
+                    nuevas.append(f"{tabla}.{columna}")
+                    logger.info(f"Columna añadida: {tabla}.{columna}")
+
+        if "newsletters_dias" in tablas:
+            _fusionar_dias_duplicados(conn)
+
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+    return nuevas
+
+
+def _fusionar_dias_duplicados(conn) -> int:
+    """
+    Une los NewsletterDia repetidos para una misma fecha (posibles antes del índice
+    único sobre 'fecha'): sus newsletters pasan al de menor id, cuyo resumen se borra
+    para que se regenere, y el resto se eliminan. Devuelve cuántos días se eliminan.
+    """
+    duplicados = conn.execute(
+        text(
+            "SELECT d.id, k.conservar FROM newsletters_dias d "
+            "JOIN (SELECT fecha, min(id) AS conservar FROM newsletters_dias "
+            "      GROUP BY fecha HAVING count(*) > 1) k ON k.fecha = d.fecha "
+            "WHERE d.id != k.conservar"
+        )
+    ).all()
+    if not duplicados:
+        return 0
+    for dia_id, conservar in duplicados:
+        conn.execute(
+            text(
+                "INSERT OR IGNORE INTO newsletter_dia_rel (newsletter_id, dia_id) "
+                "SELECT newsletter_id, :conservar FROM newsletter_dia_rel "
+                "WHERE dia_id = :dia_id"
+            ),
+            {"dia_id": dia_id, "conservar": conservar},
+        )
+        conn.execute(
+            text("DELETE FROM newsletter_dia_rel WHERE dia_id = :dia_id"),
+            {"dia_id": dia_id},
+        )
+        conn.execute(
+            text("DELETE FROM newsletters_dias WHERE id = :dia_id"), {"dia_id": dia_id}
+        )
+        conn.execute(
+            text("UPDATE newsletters_dias SET summary = NULL WHERE id = :conservar"),
+            {"conservar": conservar},
+        )
+    incrementar_version(conn)
+    logger.info(f"Días duplicados fusionados: {len(duplicados)}")
+    return len(duplicados)
+
+
+def migrar_cuerpos(engine: Engine, lote: int = 500) -> int:
+    """
+    Mueve los cuerpos de la antigua columna 'newsletters.body' a 'newsletter_bodies',
+    comprimidos, y elimina la columna (ALTER TABLE ... DROP COLUMN, SQLite >= 3.35).
+    Se procesa por lotes de `lote` filas para no cargar todos los cuerpos en memoria.
+    No hace nada si la columna ya no existe. Devuelve cuántos cuerpos se han movido.
+    El espacio liberado no se devuelve al sistema hasta hacer VACUUM
+    (python -m app.scripts.migrar_cuerpos).
+    """
+    inspector = inspect(engine)
+    if "newsletters" not in inspector.get_table_names():
+        return 0
+    if "body" not in {c["name"] for c in inspector.get_columns("newsletters")}:
+        return 0
+
+    movidos = 0
+    ultimo_id = 0
+    with engine.begin() as conn:
+        while True:
+            filas = conn.execute(
+                text(
+                    "SELECT id, body FROM newsletters WHERE id > :ultimo "
+                    "ORDER BY id LIMIT :lote"
+                ),
+                {"ultimo": ultimo_id, "lote": lote},
+            ).all()
+            if not filas:
+                break
+            conn.execute(
+                text(
+                    "INSERT OR IGNORE INTO newsletter_bodies (newsletter_id, content) "
+                    "VALUES (:id, :content)"
+                ),
+                [{"id": id_, "content": comprimir(body)} for id_, body in filas],
+            )
+            movidos += len(filas)
+            ultimo_id = filas[-1][0]
+        conn.execute(text("ALTER TABLE newsletters DROP COLUMN body"))
+    logger.info(f"Cuerpos migrados a newsletter_bodies: {movidos}")
+    return movidos
@@ -0,0 +1,33 @@
+from datetime import datetime
+
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from app.models.version import DataVersion
+
+
+def incrementar_version(db: Session):
+    """
+    Incrementa el contador de versión de los datos dentro de la transacción de `db`.
+    Debe llamarse en toda escritura que cambie lo que devuelven los endpoints de días
+    (newsletters nuevas, resúmenes), de modo que el cambio y la nueva versión se
+    confirman a la vez y ninguna caché puede servir datos anteriores con la versión
+    nueva. Al guardarse en la BD, también lo ven otros procesos (scripts, workers).
+    """
+    stmt = insert(DataVersion).values(id=1, version=1, updated_at=datetime.utcnow())
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[DataVersion.id],
+            set_={
+                "version": DataVersion.version + 1,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
+    )
+
+
+def version_actual(db: Session) -> int:
+    """
+    Versión actual de los datos (0 si nunca se ha escrito nada).
+    """
+    return db.query(DataVersion.version).filter(DataVersion.id == 1).scalar() or 0
@@ -1,11 +1,57 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 from app.api.v1.days import router as days_router
+from app.api.v1.export import router as export_router
 from app.api.v1.get_newsletter import router as correos_router
+from app.api.v1.resumenes import router as resumenes_router
+from app.api.v1.search import router as search_router
+from app.api.v1.senders import router as senders_router
+from app.core.config import (
+    DAY_SUMMARY_REFRESH_INTERVAL,
+    IMAP_IDLE,
+    IMAP_SERVER,
+    SUMMARY_QUEUE_INTERVAL,
+)
 from app.core.database import Base, engine
+from app.core.metricas import MiddlewareMetricas, exportar
+from app.core.migraciones import aplicar_migraciones, migrar_cuerpos
+from app.services.ai.cola_resumenes import ColaResumenes, encolar_resumenes_con_error
+from app.services.ai.refresco_dias import RefrescoDias
+from app.services.correos.busqueda_fts import crear_indice_fts
+from app.services.correos.escucha_idle import EscuchaIdle
+from app.services.correos.newsletter_db import rellenar_remitentes
+from app.services.correos.sync_jobs import recuperar_jobs_interrumpidos
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Escucha IMAP IDLE: ingiere los correos nuevos en cuanto llegan, con una única
+    # conexión abierta (GET /newsletter/ sigue disponible para forzar una sync)
+    escucha = EscuchaIdle() if IMAP_IDLE and IMAP_SERVER else None
+    if escucha:
+        escucha.iniciar()
+    # Resúmenes de los días que han recibido newsletters después de resumirse
+    refresco = RefrescoDias() if DAY_SUMMARY_REFRESH_INTERVAL > 0 else None
+    if refresco:
+        refresco.iniciar()
+    # Resúmenes de newsletters pendientes o fallidos, con reintentos
+    cola = ColaResumenes() if SUMMARY_QUEUE_INTERVAL > 0 else None
+    if cola:
+        cola.iniciar()
+    yield
+    if cola:
+        cola.detener()
+    if refresco:
+        refresco.detener()
+    if escucha:
+        escucha.detener()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Permitir todos los orígenes
 origins = ["*"]
@@ -16,15 +62,45 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Permite todos los métodos (GET, POST, etc.)
     allow_headers=["*"],  # Permite todos los headers
+    expose_headers=["X-Next-Cursor", "X-Next-Offset", "ETag"],  # Paginación y caché
 )
+# Duración de cada petición (/metrics)
+app.add_middleware(MiddlewareMetricas)
+
 
 # Crear la base de datos y las tablas al iniciar la app
 print("🔄 Verificando y creando tablas si no existen...")
 Base.metadata.create_all(bind=engine)
+# Columnas e índices nuevos en BD existentes
+columnas_nuevas = aplicar_migraciones(engine)
+if "newsletters.sender_id" in columnas_nuevas:
+    print(f"👤 Remitentes asignados a {rellenar_remitentes()} newsletters existentes.")
+# Cuerpos de BD antiguas a la tabla comprimida (para recuperar espacio en disco:
+# python -m app.scripts.migrar_cuerpos)
+if movidos := migrar_cuerpos(engine):
+    print(f"🗜️ {movidos} cuerpos de newsletters comprimidos.")
+# Índice de búsqueda (en BD existentes se reconstruye al crearlo)
+crear_indice_fts(engine)
+# Resúmenes que no llegaron a generarse (con el índice ya listo, ver cola_resumenes)
+if encolados := encolar_resumenes_con_error():
+    print(f"🔁 {encolados} resúmenes sin generar puestos en cola.")
+# Las firmas de casi duplicados de BD existentes: python -m app.scripts.calcular_firmas
+
+# Los jobs de sincronización que quedaron a medias por un reinicio se marcan como fallidos
+recuperar_jobs_interrumpidos()
 
 # Registrar los endpoints de correos
 app.include_router(correos_router, prefix="/api/v1")
 app.include_router(days_router, prefix="/api/v1", tags=["Days"])
+app.include_router(search_router, prefix="/api/v1", tags=["Search"])
+app.include_router(senders_router, prefix="/api/v1", tags=["Senders"])
+app.include_router(resumenes_router, prefix="/api/v1", tags=["Summaries"])
+app.include_router(export_router, prefix="/api/v1", tags=["Export"])
+
+
+@app.get("/metrics", include_in_schema=False)
+def metricas():
+    return PlainTextResponse(exportar(), media_type="text/plain; version=0.0.4")
 
 
 @app.get("/")
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, DateTime, Integer, String, Text
+
+from app.core.database import Base
+
+
+class SummaryCache(Base):
+    __tablename__ = "summary_cache"
+
+    # sha256 del cuerpo normalizado + versión del prompt + modelo
+    key = Column(String, primary_key=True)
+    summary = Column(Text, nullable=False)
+    size = Column(Integer, nullable=False)  # Bytes del resumen, para la expulsión LRU
+    created_at = Column(DateTime, nullable=False)
+    last_access = Column(DateTime, nullable=False, index=True)
+    hits = Column(Integer, nullable=False, default=0)
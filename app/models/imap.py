@@ -0,0 +1,13 @@
+from sqlalchemy import Column, DateTime, Integer, String
+
+from app.core.database import Base
+
+
+class ImapCheckpoint(Base):
+    __tablename__ = "imap_checkpoints"
+
+    id = Column(Integer, primary_key=True, index=True)
+    folder = Column(String, unique=True, index=True, nullable=False)
+    uidvalidity = Column(Integer, nullable=False)  # UIDVALIDITY de la carpeta
+    last_uid = Column(Integer, nullable=False, default=0)  # Último UID procesado
+    updated_at = Column(DateTime, nullable=False)
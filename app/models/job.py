@@ -0,0 +1,21 @@
+from sqlalchemy import Column, DateTime, Integer, String, Text
+
+from app.core.database import Base
+
+
+class SyncJob(Base):
+    __tablename__ = "sync_jobs"
+
+    id = Column(String, primary_key=True, index=True)  # UUID en hexadecimal
+    status = Column(String, nullable=False, index=True)  # pending/running/done/failed
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    error = Column(Text, nullable=True)
+
+    # Contadores de progreso de la sincronización
+    fetched = Column(Integer, nullable=False, default=0)
+    parsed = Column(Integer, nullable=False, default=0)
+    summarized = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    persisted = Column(Integer, nullable=False, default=0)
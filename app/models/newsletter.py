@@ -1,6 +1,18 @@
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Table, Text
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+    Table,
+    Text,
+)
 from sqlalchemy.orm import relationship
 
+from app.core.compresion import comprimir, descomprimir
 from app.core.database import Base
 
 newsletter_dia_rel = Table(
@@ -8,6 +20,9 @@ newsletter_dia_rel = Table(
     Base.metadata,
     Column("newsletter_id", Integer, ForeignKey("newsletters.id"), primary_key=True),
     Column("dia_id", Integer, ForeignKey("newsletters_dias.id"), primary_key=True),
+    # La clave primaria solo sirve para buscar por newsletter; este índice cubre el
+    # sentido contrario (newsletters de un día)
+    Index("ix_newsletter_dia_rel_dia_id", "dia_id", "newsletter_id"),
 )
 
 
@@ -17,25 +32,103 @@ class Newsletter(Base):
     id = Column(Integer, primary_key=True, index=True)
     email_id = Column(String, unique=True, index=True)
     subject = Column(String, nullable=False)
-    body = Column(Text, nullable=False)
-    received_at = Column(DateTime, nullable=False)  # Guardamos la fecha real del email
+    # Guardamos la fecha real del email
+    received_at = Column(DateTime, nullable=False, index=True)
     summary = Column(Text, nullable=True)
+    # Estado del resumen (pending/done/failed), intentos y próximo reintento: los
+    # pendientes y fallidos los resume ColaResumenes
+    summary_status = Column(
+        String, nullable=False, default="done", server_default="done", index=True
+    )
+    summary_attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    summary_next_retry = Column(DateTime, nullable=True)
+    summary_error = Column(Text, nullable=True)
     author = Column(String, nullable=True)
+    sender_id = Column(Integer, ForeignKey("senders.id"), nullable=True, index=True)
+    # Firma MinHash del cuerpo (detección de casi duplicados, ver similitud.py)
+    minhash = Column(LargeBinary, nullable=True)
+
+    sender = relationship("Sender", back_populates="newsletters")
+
+    # El cuerpo vive comprimido en otra tabla y solo se lee cuando se accede a él
+    body_record = relationship(
+        "NewsletterBody",
+        uselist=False,
+        back_populates="newsletter",
+        cascade="all, delete-orphan",
+    )
 
     # Relación many-to-many con NewsletterDia
     dias = relationship(
         "NewsletterDia", secondary=newsletter_dia_rel, back_populates="newsletters"
     )
 
+    @property
+    def body(self) -> str:
+        """
+        Cuerpo de la newsletter, descomprimido de forma transparente.
+        """
+        return descomprimir(self.body_record.content) if self.body_record else ""
+
+    @body.setter
+    def body(self, texto: str):
+        if self.body_record is None:
+            self.body_record = NewsletterBody(content=comprimir(texto))
+        else:
+            self.body_record.content = comprimir(texto)
+
+
+class NewsletterBody(Base):
+    __tablename__ = "newsletter_bodies"
+
+    newsletter_id = Column(Integer, ForeignKey("newsletters.id"), primary_key=True)
+    content = Column(LargeBinary, nullable=False)  # Texto UTF-8 comprimido con zlib
+
+    newsletter = relationship("Newsletter", back_populates="body_record")
+
+
+class NewsletterLsh(Base):
+    __tablename__ = "newsletter_lsh"
+
+    # Cubos LSH de la firma MinHash (uno por banda): las newsletters parecidas
+    # comparten algún cubo, así que buscarlas es una consulta indexada
+    bucket = Column(Integer, primary_key=True)
+    newsletter_id = Column(Integer, ForeignKey("newsletters.id"), primary_key=True)
+
 
 class NewsletterDia(Base):
     __tablename__ = "newsletters_dias"
 
     id = Column(Integer, primary_key=True, index=True)
-    fecha = Column(DateTime, nullable=False)  # Fecha específica
+    # Medianoche del día: un único registro por fecha
+    fecha = Column(DateTime, nullable=False, unique=True, index=True)
     summary = Column(Text, nullable=True)  # Resumen general del día
+    # Huella de las newsletters incluidas en el resumen y versión (prompts, modo y
+    # modelo) con la que se generó: si ninguna cambia, el resumen no se regenera
+    summary_fingerprint = Column(String, nullable=True)
+    summary_version = Column(String, nullable=True)
+    # IDs de las newsletters incluidas, separados por comas: permiten plegar en el
+    # resumen solo las nuevas
+    summary_members = Column(Text, nullable=True)
+    # Newsletters nuevas desde el último resumen (las actualiza RefrescoDias)
+    summary_dirty = Column(
+        Boolean, nullable=False, default=False, server_default="0", index=True
+    )
 
     # Relación many-to-many con Newsletter
     newsletters = relationship(
         "Newsletter", secondary=newsletter_dia_rel, back_populates="dias"
     )
+
+
+class Sender(Base):
+    __tablename__ = "senders"
+
+    id = Column(Integer, primary_key=True, index=True)
+    email = Column(String, unique=True, index=True, nullable=False)  # En minúsculas
+    name = Column(String, nullable=True)  # Último nombre visible usado
+    message_count = Column(Integer, nullable=False, default=0)
+    first_seen = Column(DateTime, nullable=True)
+    last_seen = Column(DateTime, nullable=True)
+
+    newsletters = relationship("Newsletter", back_populates="sender")
@@ -0,0 +1,11 @@
+from sqlalchemy import Column, DateTime, Integer
+
+from app.core.database import Base
+
+
+class DataVersion(Base):
+    __tablename__ = "data_version"
+
+    id = Column(Integer, primary_key=True)  # Una única fila (id = 1)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=True)
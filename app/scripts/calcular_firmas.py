@@ -0,0 +1,18 @@
+"""
+Calcula las firmas MinHash (detección de casi duplicados) de las newsletters
+guardadas antes de que existieran.
+
+Uso:
+    python -m app.scripts.calcular_firmas
+"""
+
+import app.models.newsletter  # noqa: F401  (registra las tablas)
+from app.core.database import Base, engine
+from app.core.migraciones import aplicar_migraciones
+from app.services.correos.similitud import calcular_firmas_pendientes
+
+if __name__ == "__main__":
+    Base.metadata.create_all(bind=engine)
+    aplicar_migraciones(engine)
+    total = calcular_firmas_pendientes()
+    print(f"Firmas calculadas: {total} newsletters.")
@@ -0,0 +1,64 @@
+"""
+Exporta las newsletters guardadas como NDJSON (una por línea), en streaming y con
+memoria constante. Misma salida que GET /api/v1/export.
+
+Uso:
+    python -m app.scripts.exportar --desde 2025-01-01 --hasta 2025-01-31 \\
+        --resumenes --gzip --salida enero.ndjson.gz
+    python -m app.scripts.exportar --cursor <cursor de la última línea> >> todo.ndjson
+"""
+
+import argparse
+import sys
+from datetime import date, datetime
+
+from app.core.cursores import parsear_cursor
+from app.services.correos.exportacion import exportar_newsletters, lineas_ndjson
+
+
+def _cursor(valor: str) -> tuple[datetime, int]:
+    try:
+        return parsear_cursor(valor)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--desde", type=date.fromisoformat)
+    parser.add_argument("--hasta", type=date.fromisoformat)
+    parser.add_argument("--sender-id", type=int)
+    parser.add_argument("--sender", help="Dirección del remitente")
+    parser.add_argument("--cuerpos", action="store_true", help="Incluir los cuerpos")
+    parser.add_argument(
+        "--resumenes", action="store_true", help="Incluir los resúmenes"
+    )
+    parser.add_argument("--gzip", action="store_true", help="Comprimir la salida")
+    parser.add_argument(
+        "--cursor", type=_cursor, help="Reanudar tras la línea con este cursor"
+    )
+    parser.add_argument("--salida", help="Fichero de salida (por defecto, stdout)")
+    args = parser.parse_args()
+
+    newsletters = exportar_newsletters(
+        args.desde,
+        args.hasta,
+        args.sender_id,
+        args.sender,
+        args.cuerpos,
+        args.resumenes,
+        args.cursor,
+    )
+    # Al reanudar se añade al final del fichero (gzip admite varios miembros seguidos)
+    modo = "ab" if args.cursor else "wb"
+    salida = open(args.salida, modo) if args.salida else sys.stdout.buffer
+    try:
+        for datos in lineas_ndjson(newsletters, gzip=args.gzip):
+            salida.write(datos)
+    finally:
+        if args.salida:
+            salida.close()
+
+
+if __name__ == "__main__":
+    main()
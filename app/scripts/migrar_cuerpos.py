@@ -0,0 +1,36 @@
+"""
+Migra una base de datos existente al almacenamiento comprimido de los cuerpos.
+
+Mueve 'newsletters.body' a la tabla 'newsletter_bodies' (zlib), sustituye el índice
+FTS por el de contenido externo y ejecuta VACUUM para que el fichero encoja.
+
+Uso:
+    python -m app.scripts.migrar_cuerpos
+"""
+
+import os
+
+from sqlalchemy import text
+
+import app.models.newsletter  # noqa: F401  (registra las tablas)
+from app.core.database import Base, engine
+from app.core.migraciones import migrar_cuerpos
+from app.services.correos.busqueda_fts import crear_indice_fts
+
+
+def _tamano_fichero() -> int | None:
+    ruta = engine.url.database
+    return os.path.getsize(ruta) if ruta and os.path.exists(ruta) else None
+
+
+if __name__ == "__main__":
+    antes = _tamano_fichero()
+    Base.metadata.create_all(bind=engine)
+    movidos = migrar_cuerpos(engine)
+    reconstruido = crear_indice_fts(engine)
+    print(f"Cuerpos comprimidos: {movidos}. Índice FTS reconstruido: {reconstruido}.")
+    with engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM"))
+    despues = _tamano_fichero()
+    if antes is not None and despues is not None:
+        print(f"Tamaño de la BD: {antes / 1e6:.1f} MB -> {despues / 1e6:.1f} MB")
@@ -0,0 +1,15 @@
+"""
+Reconstruye el índice de búsqueda FTS5 a partir de las newsletters guardadas.
+
+Uso:
+    python -m app.scripts.reconstruir_fts
+"""
+
+import app.models.newsletter  # noqa: F401  (registra las tablas)
+from app.core.database import Base, engine
+from app.services.correos.busqueda_fts import reconstruir_indice_fts
+
+if __name__ == "__main__":
+    Base.metadata.create_all(bind=engine)
+    total = reconstruir_indice_fts()
+    print(f"Índice FTS reconstruido: {total} newsletters indexadas.")
@@ -0,0 +1,265 @@
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator
+
+from google import genai
+from google.genai import types
+
+from app.core.config import (
+    GEMINI_KEY,
+    MODEL_GEMINI,
+    SUMMARY_BACKEND,
+    SUMMARY_BATCH_SIZE,
+    SUMMARY_LOCAL_FAILURE_RATE,
+    SUMMARY_LOCAL_LATENCY,
+)
+
+logger = logging.getLogger(__name__)
+
+PROMPT_LOTE = """
+        Vas a recibir {n} tareas independientes, separadas por "=== Tarea N ===".
+        Resuelve cada una por separado siguiendo sus propias instrucciones.
+        Devuelve un array JSON con exactamente {n} cadenas: la respuesta a cada tarea,
+        en el mismo orden.
+
+        {tareas}
+        """
+
+
+class BackendResumen(ABC):
+    """
+    Modelo que genera los resúmenes. `modelo` identifica las respuestas en la caché
+    de resúmenes y `max_lote` es el número de prompts que admite una sola petición
+    (1: sin lotes). Todos los métodos propagan los errores del modelo.
+    """
+
+    nombre: str
+    modelo: str
+    max_lote: int = 1
+
+    @abstractmethod
+    def generar(self, prompt: str) -> str: ...
+
+    @abstractmethod
+    async def generar_async(self, prompt: str) -> str: ...
+
+    @abstractmethod
+    def generar_stream(self, prompt: str) -> AsyncIterator[str]: ...
+
+    def generar_lote(self, prompts: list[str]) -> list[str]:
+        """
+        Genera las respuestas de varios prompts, en el mismo orden. Por defecto hace
+        una petición por prompt; los backends que lo admiten usan una sola.
+        """
+        return [self.generar(prompt) for prompt in prompts]
+
+    async def generar_lote_async(self, prompts: list[str]) -> list[str]:
+        return [await self.generar_async(prompt) for prompt in prompts]
+
+
+def _prompt_lote(prompts: list[str]) -> str:
+    tareas = "\n\n".join(
+        f"=== Tarea {i} ===\n{prompt}" for i, prompt in enumerate(prompts, start=1)
+    )
+    return PROMPT_LOTE.format(n=len(prompts), tareas=tareas)
+
+
+def _respuestas_lote(texto: str | None, n: int) -> list[str]:
+    """
+    Valida la respuesta JSON de un lote: una cadena no vacía por prompt.
+    """
+    respuestas = json.loads(texto or "null")
+    if (
+        not isinstance(respuestas, list)
+        or len(respuestas) != n
+        or not all(isinstance(r, str) and r.strip() for r in respuestas)
+    ):
+        raise ValueError(f"Respuesta de lote no válida (se esperaban {n} resúmenes).")
+    return respuestas
+
+
+class BackendGemini(BackendResumen):
+    """
+    Gemini mediante google-genai. El cliente se crea en la primera llamada, así que
+    la aplicación arranca sin GEMINI_KEY (p. ej. con el backend local). Los lotes se
+    envían en una única petición con salida JSON estructurada.
+    """
+
+    nombre = "gemini"
+
+    def __init__(
+        self,
+        api_key: str | None = GEMINI_KEY,
+        modelo: str | None = MODEL_GEMINI,
+        max_lote: int = SUMMARY_BATCH_SIZE,
+    ):
+        self.api_key = api_key
+        self.modelo = modelo
+        self.max_lote = max(1, max_lote)
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                if not self.api_key:
+                    raise ValueError("GEMINI_KEY no está configurada.")
+                self._client = genai.Client(api_key=self.api_key)
+            return self._client
+
+    @staticmethod
+    def _config_lote():
+        return types.GenerateContentConfig(
+            response_mime_type="application/json", response_schema=list[str]
+        )
+
+    def generar(self, prompt: str) -> str:
+        response = self.client.models.generate_content(
+            model=self.modelo, contents=prompt
+        )
+        if not response.text:
+            raise ValueError("El modelo devolvió una respuesta vacía.")
+        return response.text
+
+    async def generar_async(self, prompt: str) -> str:
+        response = await self.client.aio.models.generate_content(
+            model=self.modelo, contents=prompt
+        )
+        if not response.text:
+            raise ValueError("El modelo devolvió una respuesta vacía.")
+        return response.text
+
+    async def generar_stream(self, prompt: str) -> AsyncIterator[str]:
+        respuesta = await self.client.aio.models.generate_content_stream(
+            model=self.modelo, contents=prompt
+        )
+        async for chunk in respuesta:
+            if chunk.text:
+                yield chunk.text
+
+    def generar_lote(self, prompts: list[str]) -> list[str]:
+        if len(prompts) == 1:
+            return [self.generar(prompts[0])]
+        response = self.client.models.generate_content(
+            model=self.modelo,
+            contents=_prompt_lote(prompts),
+            config=self._config_lote(),
+        )
+        return _respuestas_lote(response.text, len(prompts))
+
+    async def generar_lote_async(self, prompts: list[str]) -> list[str]:
+        if len(prompts) == 1:
+            return [await self.generar_async(prompts[0])]
+        response = await self.client.aio.models.generate_content(
+            model=self.modelo,
+            contents=_prompt_lote(prompts),
+            config=self._config_lote(),
+        )
+        return _respuestas_lote(response.text, len(prompts))
+
+
+class BackendLocal(BackendResumen):
+    """
+    Backend determinista sin red para pruebas de carga y uso offline. Cada petición
+    (también un lote entero) tarda `latencia` segundos; el resumen son las últimas
+    `palabras` palabras del prompt con una huella del mismo. Un prompt falla si su
+    hash cae por debajo de `tasa_fallo`, de modo que siempre fallan los mismos (un
+    lote falla si falla alguno de sus prompts).
+    """
+
+    nombre = "local"
+    modelo = "local"
+
+    def __init__(
+        self,
+        latencia: float = SUMMARY_LOCAL_LATENCY,
+        tasa_fallo: float = SUMMARY_LOCAL_FAILURE_RATE,
+        max_lote: int = SUMMARY_BATCH_SIZE,
+        palabras: int = 60,
+        latencia_token: float = 0.0,
+    ):
+        self.latencia = max(0.0, latencia)
+        self.tasa_fallo = tasa_fallo
+        self.max_lote = max(1, max_lote)
+        self.palabras = palabras
+        self.latencia_token = latencia_token
+        self.peticiones = 0
+        self._lock = threading.Lock()
+
+    def _contar(self):
+        with self._lock:
+            self.peticiones += 1
+
+    def _responder(self, prompt: str) -> str:
+        huella = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        if int(huella[:8], 16) / 0xFFFFFFFF < self.tasa_fallo:
+            raise RuntimeError(f"Fallo simulado del backend local ({huella[:8]}).")
+        cola = " ".join(prompt.split()[-self.palabras :])
+        return f"Resumen local {huella[:8]}: {cola}"
+
+    def generar(self, prompt: str) -> str:
+        self._contar()
+        time.sleep(self.latencia)
+        return self._responder(prompt)
+
+    async def generar_async(self, prompt: str) -> str:
+        self._contar()
+        await asyncio.sleep(self.latencia)
+        return self._responder(prompt)
+
+    async def generar_stream(self, prompt: str) -> AsyncIterator[str]:
+        self._contar()
+        await asyncio.sleep(self.latencia)
+        for palabra in self._responder(prompt).split(" "):
+            yield palabra + " "
+            await asyncio.sleep(self.latencia_token)
+
+    def generar_lote(self, prompts: list[str]) -> list[str]:
+        self._contar()
+        time.sleep(self.latencia)
+        return [self._responder(prompt) for prompt in prompts]
+
+    async def generar_lote_async(self, prompts: list[str]) -> list[str]:
+        self._contar()
+        await asyncio.sleep(self.latencia)
+        return [self._responder(prompt) for prompt in prompts]
+
+
+BACKENDS = {"gemini": BackendGemini, "local": BackendLocal}
+
+_backend: BackendResumen | None = None
+_lock_backend = threading.Lock()
+
+
+def obtener_backend() -> BackendResumen:
+    """
+    Devuelve el backend activo; el primero se crea según SUMMARY_BACKEND.
+    """
+    global _backend
+    with _lock_backend:
+        if _backend is None:
+            if SUMMARY_BACKEND not in BACKENDS:
+                raise ValueError(
+                    f"SUMMARY_BACKEND desconocido: {SUMMARY_BACKEND!r} "
+                    f"(opciones: {', '.join(BACKENDS)})."
+                )
+            _backend = BACKENDS[SUMMARY_BACKEND]()
+            logger.info(f"Backend de resúmenes: {_backend.nombre} ({_backend.modelo}).")
+        return _backend
+
+
+def configurar_backend(backend: BackendResumen) -> BackendResumen:
+    """
+    Sustituye el backend activo (p. ej. un BackendLocal con otros parámetros en los
+    benchmarks). Devuelve el anterior.
+    """
+    global _backend
+    with _lock_backend:
+        anterior, _backend = _backend, backend
+        return anterior
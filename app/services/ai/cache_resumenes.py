@@ -0,0 +1,193 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import bindparam, func
+
+from app.core.config import SUMMARY_CACHE_MAX_BYTES
+from app.core.database import SessionLocal
+from app.core.metricas import CACHE_RESUMENES
+from app.models.cache import SummaryCache
+
+logger = logging.getLogger(__name__)
+
+ESPACIOS_RE = re.compile(r"\s+")
+
+# Los accesos (último acceso y aciertos, para la expulsión LRU) se acumulan en
+# memoria y se escriben juntos cada TOQUES_MAX aciertos o TOQUES_SEGUNDOS segundos,
+# en lugar de hacer un commit por cada lectura
+TOQUES_MAX = 100
+TOQUES_SEGUNDOS = 30.0
+
+_lock = threading.Lock()
+_lock_escritura = threading.Lock()  # Las escrituras se serializan por _total_bytes
+_toques = {}  # clave -> [último acceso, aciertos sin escribir]
+_ultima_escritura = time.monotonic()
+# Bytes que ocupa la caché: se calcula una vez y después se actualiza en cada
+# escritura y expulsión (None: hay que recalcularlo)
+_total_bytes = None
+
+_ACTUALIZAR_ACCESO = (
+    SummaryCache.__table__.update()
+    .where(SummaryCache.__table__.c.key == bindparam("b_key"))
+    .values(
+        last_access=bindparam("b_last_access"),
+        hits=SummaryCache.__table__.c.hits + bindparam("b_hits"),
+    )
+)
+
+
+def clave_cache(content: str, prompt_version: str, model: str) -> str:
+    """
+    Calcula la clave de caché. Si el contenido viene de preparar_contenido
+    (TextoPreparado) se usa el cuerpo original, que no depende del historial del
+    remitente, y si no el propio contenido; se normaliza (espacios colapsados) para
+    que los reenvíos con distinto formato de espacios compartan resumen. Cambiar el
+    prompt o el modelo cambia la clave, así que las entradas antiguas dejan de usarse
+    solas.
+    """
+    texto = getattr(content, "cuerpo", content)
+    normalizado = ESPACIOS_RE.sub(" ", texto).strip()
+    datos = f"{prompt_version}\0{model}\0{normalizado}".encode("utf-8")
+    return hashlib.sha256(datos).hexdigest()
+
+
+def _escribir_toques(db):
+    """
+    Vuelca en la BD (sin commit) los accesos acumulados, en un solo executemany.
+    """
+    global _ultima_escritura
+    with _lock:
+        toques = [
+            {"b_key": clave, "b_last_access": acceso, "b_hits": hits}
+            for clave, (acceso, hits) in _toques.items()
+        ]
+        _toques.clear()
+        _ultima_escritura = time.monotonic()
+    if toques:
+        db.execute(_ACTUALIZAR_ACCESO, toques)
+
+
+def _anotar_toque(clave: str) -> bool:
+    """
+    Anota un acierto en memoria. Devuelve True si toca escribir los acumulados.
+    """
+    with _lock:
+        toque = _toques.setdefault(clave, [None, 0])
+        toque[0] = datetime.utcnow()
+        toque[1] += 1
+        return (
+            len(_toques) >= TOQUES_MAX
+            or time.monotonic() - _ultima_escritura >= TOQUES_SEGUNDOS
+        )
+
+
+def obtener_resumen(clave: str) -> str | None:
+    """
+    Devuelve el resumen cacheado para la clave, o None. El último acceso se anota en
+    memoria y se escribe por lotes (ver TOQUES_MAX).
+    """
+    if SUMMARY_CACHE_MAX_BYTES <= 0:
+        return None
+    db = SessionLocal()
+    try:
+        summary = (
+            db.query(SummaryCache.summary).filter(SummaryCache.key == clave).scalar()
+        )
+        if summary is None:
+            CACHE_RESUMENES.inc(resultado="miss")
+            return None
+        CACHE_RESUMENES.inc(resultado="hit")
+        if _anotar_toque(clave):
+            _escribir_toques(db)
+            db.commit()
+        return summary
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error leyendo la caché de resúmenes: {e}")
+        return None
+    finally:
+        db.close()
+
+
+def guardar_resumen(clave: str, summary: str):
+    """
+    Guarda un resumen válido en la caché y expulsa las entradas usadas hace más
+    tiempo si se supera SUMMARY_CACHE_MAX_BYTES. Los errores del modelo nunca
+    deben llegar aquí.
+    """
+    global _total_bytes
+    if SUMMARY_CACHE_MAX_BYTES <= 0 or not summary:
+        return
+    with _lock_escritura:
+        db = SessionLocal()
+        try:
+            # Los accesos pendientes cuentan para decidir qué expulsar
+            _escribir_toques(db)
+            ahora = datetime.utcnow()
+            size = len(summary.encode("utf-8"))
+            anterior = (
+                db.query(SummaryCache.size).filter(SummaryCache.key == clave).scalar()
+            )
+            db.merge(
+                SummaryCache(
+                    key=clave,
+                    summary=summary,
+                    size=size,
+                    created_at=ahora,
+                    last_access=ahora,
+                    hits=0,
+                )
+            )
+            db.flush()
+
+            if _total_bytes is None:
+                total = db.query(func.coalesce(func.sum(SummaryCache.size), 0)).scalar()
+            else:
+                total = _total_bytes + size - (anterior or 0)
+            expulsadas = []
+            if total > SUMMARY_CACHE_MAX_BYTES:
+                for clave_antigua, size_antigua in db.query(
+                    SummaryCache.key, SummaryCache.size
+                ).order_by(SummaryCache.last_access.asc()):
+                    if total <= SUMMARY_CACHE_MAX_BYTES:
+                        break
+                    total -= size_antigua
+                    expulsadas.append(clave_antigua)
+                db.query(SummaryCache).filter(SummaryCache.key.in_(expulsadas)).delete(
+                    synchronize_session=False
+                )
+            db.commit()
+            _total_bytes = total
+            CACHE_RESUMENES.inc(resultado="store")
+            if expulsadas:
+                CACHE_RESUMENES.inc(len(expulsadas), resultado="eviction")
+        except Exception as e:
+            db.rollback()
+            _total_bytes = None
+            logger.error(f"Error guardando en la caché de resúmenes: {e}")
+        finally:
+            db.close()
+
+
+def estadisticas_cache() -> dict:
+    """
+    Devuelve los contadores de aciertos/fallos del proceso (también en /metrics,
+    newsletters_cache_resumenes_total) y el tamaño de la caché.
+    """
+    estadisticas = {
+        resultado: CACHE_RESUMENES.valor(resultado=resultado)
+        for resultado in ("hit", "miss", "store", "eviction")
+    }
+    db = SessionLocal()
+    try:
+        entradas, total = db.query(
+            func.count(SummaryCache.key), func.coalesce(func.sum(SummaryCache.size), 0)
+        ).one()
+    finally:
+        db.close()
+    estadisticas.update({"entries": entradas, "bytes": total})
+    return estadisticas
@@ -0,0 +1,296 @@
+import logging
+import threading
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from typing import Callable
+
+from sqlalchemy import and_, func, or_
+
+from app.core.compresion import comprimir
+from app.core.config import (
+    SUMMARY_MAX_ATTEMPTS,
+    SUMMARY_QUEUE_BATCH,
+    SUMMARY_QUEUE_INTERVAL,
+)
+from app.core.database import SessionLocal
+from app.core.metricas import ETAPA_SEGUNDOS, RESUMENES_COLA
+from app.core.version_datos import incrementar_version
+from app.models.newsletter import Newsletter, NewsletterBody, newsletter_dia_rel
+from app.services.ai.preprocesado import preparar_newsletter
+from app.services.ai.resumen_newsletter import ERROR_RESUMEN, summarize_newsletters
+from app.services.correos.busqueda_fts import actualizar_resumen_fts
+from app.services.correos.newsletter_db import columnas_resumen, marcar_dias_pendientes
+
+logger = logging.getLogger(__name__)
+
+ESTADOS_EN_COLA = ("pending", "failed")
+
+CUERPO_VACIO = comprimir("")
+
+
+def _en_cola(ahora: datetime):
+    """
+    Condición de las newsletters que la cola debe resumir ya: pendientes, o fallidas
+    con el reintento vencido y sin agotar los intentos.
+    """
+    return (
+        Newsletter.summary_status.in_(ESTADOS_EN_COLA),
+        Newsletter.summary_attempts < SUMMARY_MAX_ATTEMPTS,
+        or_(
+            Newsletter.summary_next_retry.is_(None),
+            Newsletter.summary_next_retry <= ahora,
+        ),
+    )
+
+
+class ColaResumenes:
+    """
+    Tarea en segundo plano que cada `intervalo` segundos resume las newsletters sin
+    resumen (pendientes o fallidas, ver columnas_resumen) en lotes de `lote`, de la
+    más reciente a la más antigua. Un resumen que falla se reintenta con espera
+    exponencial (espera_reintento) hasta SUMMARY_MAX_ATTEMPTS veces; si falla un lote
+    entero (el modelo no responde) la pasada termina y los siguientes lotes esperan a
+    la próxima, así que tras una caída la cola se recupera sola, en bloque.
+    """
+
+    def __init__(
+        self,
+        intervalo: float = SUMMARY_QUEUE_INTERVAL,
+        lote: int = SUMMARY_QUEUE_BATCH,
+        resumir: Callable[..., list[str]] = summarize_newsletters,
+    ):
+        self.intervalo = intervalo
+        self.lote = max(1, lote)
+        self._resumir = resumir
+        self._parar = threading.Event()
+        self._hilo = None
+
+    def iniciar(self):
+        if self._hilo and self._hilo.is_alive():
+            return
+        self._parar.clear()
+        self._hilo = threading.Thread(
+            target=self._bucle, name="cola-resumenes", daemon=True
+        )
+        self._hilo.start()
+
+    def detener(self, timeout: float | None = 5.0):
+        self._parar.set()
+        if self._hilo:
+            self._hilo.join(timeout)
+
+    def _bucle(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                self.drenar()
+            except Exception as e:
+                logger.error(f"Error procesando la cola de resúmenes: {e}")
+
+    def drenar(self) -> dict:
+        """
+        Procesa lotes mientras queden newsletters en cola y el último lote haya
+        resumido alguna. Devuelve cuántas han quedado resumidas (done) y fallidas.
+        """
+        totales = Counter()
+        while not self._parar.is_set():
+            resultado = self.procesar_lote()
+            totales.update(resultado)
+            if not resultado["done"]:
+                break
+        if totales:
+            logger.info(
+                f"Cola de resúmenes: {totales['done']} resumidas, "
+                f"{totales['failed']} fallidas."
+            )
+        return dict(totales)
+
+    @ETAPA_SEGUNDOS.cronometrar(etapa="cola_resumenes")
+    def procesar_lote(self) -> Counter:
+        """
+        Resume un lote de la cola con summarize_newsletters (que consulta la caché y
+        agrupa según el backend; una llamada más, sin caché, para las regeneraciones
+        forzadas) y guarda el resultado de cada newsletter. Las que no tienen cuerpo
+        quedan como "done" sin resumen.
+        """
+        ahora = datetime.utcnow()
+        resultado = Counter()
+        db = SessionLocal()
+        try:
+            newsletters = (
+                db.query(Newsletter)
+                .filter(*_en_cola(ahora))
+                .order_by(Newsletter.received_at.desc())
+                .limit(self.lote)
+                .all()
+            )
+            if not newsletters:
+                return resultado
+            cuerpos = [(n, n.body) for n in newsletters]
+            resumenes = {}
+            # Las que ya tienen resumen vienen de reencolar(todas=True): se regeneran
+            # sin consultar la caché, que devolvería el mismo resumen
+            for forzar in (False, True):
+                grupo = [
+                    (n, body)
+                    for n, body in cuerpos
+                    if body and bool(n.summary) == forzar
+                ]
+                if grupo:
+                    contenidos = [preparar_newsletter(n, body) for n, body in grupo]
+                    nuevos = self._resumir(contenidos, forzar=forzar)
+                    resumenes.update(zip((n.id for n, _ in grupo), nuevos))
+
+            resumidas = []
+            for newsletter, body in cuerpos:
+                if not body:
+                    newsletter.summary_status = "done"
+                    newsletter.summary_next_retry = None
+                    continue
+                columnas = columnas_resumen(
+                    resumenes[newsletter.id],
+                    intentos_previos=newsletter.summary_attempts,
+                )
+                if columnas["summary_status"] == "done":
+                    actualizar_resumen_fts(
+                        db, newsletter.id, newsletter.summary, columnas["summary"]
+                    )
+                    resumidas.append(newsletter.id)
+                elif newsletter.summary:
+                    # Un reencolado con resumen lo conserva si la regeneración falla
+                    columnas.pop("summary")
+                for columna, valor in columnas.items():
+                    setattr(newsletter, columna, valor)
+                resultado[columnas["summary_status"]] += 1
+                RESUMENES_COLA.inc(resultado=columnas["summary_status"])
+
+            if resumidas:
+                dias = [
+                    dia_id
+                    for (dia_id,) in db.query(newsletter_dia_rel.c.dia_id)
+                    .filter(newsletter_dia_rel.c.newsletter_id.in_(resumidas))
+                    .distinct()
+                ]
+                # Los días ya resumidos incorporan las nuevas en RefrescoDias
+                marcar_dias_pendientes(db, dias)
+            incrementar_version(db)
+            db.commit()
+            return resultado
+        except Exception as e:
+            db.rollback()
+            raise e
+        finally:
+            db.close()
+
+
+def reencolar(desde: date, hasta: date, todas: bool = False) -> int:
+    """
+    Vuelve a poner en cola (intentos a cero, sin espera) las newsletters recibidas
+    entre `desde` y `hasta`, ambos incluidos. Por defecto solo las que no tienen
+    resumen, incluidas las que agotaron sus intentos; con `todas`, también las ya
+    resumidas, que conservan su resumen hasta que se regenera. Devuelve cuántas.
+    """
+    db = SessionLocal()
+    try:
+        query = db.query(Newsletter).filter(
+            Newsletter.received_at >= datetime.combine(desde, time.min),
+            Newsletter.received_at
+            < datetime.combine(hasta + timedelta(days=1), time.min),
+        )
+        if not todas:
+            query = query.filter(Newsletter.summary_status != "done")
+        encoladas = query.update(
+            {
+                "summary_status": "pending",
+                "summary_attempts": 0,
+                "summary_next_retry": None,
+                "summary_error": None,
+            },
+            synchronize_session=False,
+        )
+        if encoladas:
+            incrementar_version(db)
+        db.commit()
+        return encoladas
+    except Exception as e:
+        db.rollback()
+        raise e
+    finally:
+        db.close()
+
+
+def estado_cola() -> dict:
+    """
+    Número de newsletters por estado del resumen, cuántas esperan ya a la cola,
+    cuántas han agotado los intentos y cuándo vence el próximo reintento.
+    """
+    ahora = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        por_estado = dict(
+            db.query(Newsletter.summary_status, func.count()).group_by(
+                Newsletter.summary_status
+            )
+        )
+        listas = db.query(func.count(Newsletter.id)).filter(*_en_cola(ahora)).scalar()
+        agotadas = (
+            db.query(func.count(Newsletter.id))
+            .filter(
+                Newsletter.summary_status == "failed",
+                Newsletter.summary_attempts >= SUMMARY_MAX_ATTEMPTS,
+            )
+            .scalar()
+        )
+        proximo = (
+            db.query(func.min(Newsletter.summary_next_retry))
+            .filter(Newsletter.summary_status == "failed")
+            .scalar()
+        )
+    finally:
+        db.close()
+    return {
+        "estados": {
+            estado: por_estado.get(estado, 0)
+            for estado in ("pending", "done", "failed")
+        },
+        "listas": listas,
+        "agotadas": agotadas,
+        "proximo_reintento": proximo.isoformat() if proximo else None,
+    }
+
+
+def encolar_resumenes_con_error() -> int:
+    """
+    Newsletters guardadas como resumidas ("done") sin resumen o con el texto de error
+    como resumen (BD anteriores a la cola): pasan a "pending" y pierden ese texto.
+    Solo depende de los datos, así que se puede ejecutar en cada arranque; las que
+    no tienen cuerpo quedan como están. Devuelve cuántas.
+    """
+    db = SessionLocal()
+    try:
+        sin_resumen = or_(
+            Newsletter.summary == ERROR_RESUMEN,
+            and_(
+                Newsletter.summary.is_(None),
+                Newsletter.body_record.has(NewsletterBody.content != CUERPO_VACIO),
+            ),
+        )
+        query = db.query(Newsletter).filter(
+            Newsletter.summary_status == "done", sin_resumen
+        )
+        con_error = query.filter(Newsletter.summary == ERROR_RESUMEN)
+        for (newsletter_id,) in con_error.with_entities(Newsletter.id).all():
+            # Sin efecto si el texto de error no llegó a indexarse
+            actualizar_resumen_fts(db, newsletter_id, ERROR_RESUMEN, None)
+        encoladas = query.update(
+            {"summary": None, "summary_status": "pending"},
+            synchronize_session=False,
+        )
+        if encoladas:
+            incrementar_version(db)
+        db.commit()
+        return encoladas
+    except Exception as e:
+        db.rollback()
+        raise e
+    finally:
+        db.close()
@@ -0,0 +1,35 @@
+import threading
+import time
+
+
+class LimitadorTasa:
+    """
+    Token bucket seguro entre hilos para limitar las llamadas al modelo a un número
+    de peticiones por minuto. `capacidad` es la ráfaga máxima permitida.
+    """
+
+    def __init__(self, por_minuto: float, capacidad: int = 1):
+        if por_minuto <= 0:
+            raise ValueError("El límite de peticiones por minuto debe ser positivo.")
+        self.tasa = por_minuto / 60.0
+        self.capacidad = max(1, capacidad)
+        self._tokens = float(self.capacidad)
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def adquirir(self):
+        """
+        Bloquea hasta que haya un token disponible y lo consume.
+        """
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self._tokens = min(
+                    self.capacidad, self._tokens + (ahora - self._ultimo) * self.tasa
+                )
+                self._ultimo = ahora
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                espera = (1 - self._tokens) / self.tasa
+            time.sleep(espera)
@@ -0,0 +1,255 @@
+import hashlib
+import logging
+import re
+import threading
+from collections import Counter
+from email.utils import parseaddr
+from urllib.parse import urlsplit
+
+from app.core.compresion import descomprimir
+from app.core.config import (
+    BOILERPLATE_HISTORY,
+    BOILERPLATE_MIN_MESSAGES,
+    SUMMARY_INPUT_MAX_TOKENS,
+)
+from app.core.database import SessionLocal
+from app.core.metricas import TOKENS_PREPROCESADO
+from app.models.newsletter import Newsletter, NewsletterBody, Sender
+
+logger = logging.getLogger(__name__)
+
+URL_RE = re.compile(r"\b(?:https?://|www\.)[^\s<>()\[\]{}\"']+", re.IGNORECASE)
+DIGITOS_RE = re.compile(r"\d+")
+ESPACIOS_RE = re.compile(r"\s+")
+
+# Marca de las partes eliminadas al recortar al presupuesto
+OMITIDO = "[...]"
+
+# Huellas de las líneas de cada newsletter guardada (los cuerpos no cambian): los
+# correos de un mismo remitente comparten historial y cada cuerpo se descomprime una
+# sola vez
+_cache_huellas = {}
+_lock_cache = threading.Lock()
+_MAX_CACHE = 4096
+
+
+class TextoPreparado(str):
+    """
+    Texto listo para el modelo (ver preparar_contenido) que conserva el cuerpo del
+    que sale (`cuerpo`). La caché de resúmenes usa ese cuerpo como clave: el texto
+    preparado depende del boilerplate aprendido del historial reciente del remitente,
+    así que el mismo cuerpo recibido más tarde daría otra clave.
+    """
+
+    def __new__(cls, texto: str, cuerpo: str):
+        preparado = super().__new__(cls, texto)
+        preparado.cuerpo = cuerpo
+        return preparado
+
+
+def estimar_tokens(texto: str) -> int:
+    """
+    Estimación barata del número de tokens (~4 caracteres por token).
+    """
+    return len(texto) // 4 + 1
+
+
+def colapsar_urls(texto: str) -> str:
+    """
+    Sustituye cada URL por su dominio entre corchetes: los enlaces de seguimiento
+    (cientos de caracteres de parámetros) no aportan nada al resumen.
+    """
+
+    def dominio(match: re.Match) -> str:
+        url = match.group(0).rstrip(".,;:!?")
+        resto = match.group(0)[len(url) :]
+        host = urlsplit(url if "://" in url else f"http://{url}").hostname or ""
+        host = host.removeprefix("www.")
+        return f"[{host}]{resto}" if host else match.group(0)
+
+    return URL_RE.sub(dominio, texto)
+
+
+def _huella_linea(linea: str) -> str:
+    """
+    Huella de una línea para compararla entre correos: sin URLs, en minúsculas y con
+    los números unificados (fechas, años del copyright, números de edición).
+    """
+    normalizada = DIGITOS_RE.sub("0", ESPACIOS_RE.sub(" ", linea).strip().lower())
+    return hashlib.sha1(normalizada.encode("utf-8")).hexdigest()[:16]
+
+
+def _huellas(texto: str) -> set[str]:
+    return {_huella_linea(linea) for linea in texto.splitlines() if linea.strip()}
+
+
+def _boilerplate_de_remitente(remitente: str, excluir_id: int | None) -> set[str]:
+    """
+    Huellas de las líneas que se repiten en al menos BOILERPLATE_MIN_MESSAGES de los
+    últimos BOILERPLATE_HISTORY correos guardados del remitente (pies de baja, avisos
+    legales, menús...). Devuelve un conjunto vacío si aún no hay historial suficiente.
+    """
+    db = SessionLocal()
+    try:
+        query = (
+            db.query(Newsletter.id)
+            .join(Sender, Sender.id == Newsletter.sender_id)
+            .filter(Sender.email == remitente)
+        )
+        if excluir_id is not None:
+            query = query.filter(Newsletter.id != excluir_id)
+        ids = tuple(
+            newsletter_id
+            for (newsletter_id,) in query.order_by(Newsletter.received_at.desc())
+            .limit(BOILERPLATE_HISTORY)
+            .all()
+        )
+        if len(ids) < BOILERPLATE_MIN_MESSAGES:
+            return set()
+        with _lock_cache:
+            conocidas = {i: _cache_huellas[i] for i in ids if i in _cache_huellas}
+        faltan = [i for i in ids if i not in conocidas]
+        if faltan:
+            nuevas = {
+                newsletter_id: _huellas(colapsar_urls(descomprimir(content)))
+                for newsletter_id, content in db.query(
+                    NewsletterBody.newsletter_id, NewsletterBody.content
+                ).filter(NewsletterBody.newsletter_id.in_(faltan))
+            }
+            conocidas.update(nuevas)
+            with _lock_cache:
+                if len(_cache_huellas) + len(nuevas) > _MAX_CACHE:
+                    _cache_huellas.clear()
+                _cache_huellas.update(nuevas)
+    finally:
+        db.close()
+    apariciones = Counter(h for huellas in conocidas.values() for h in huellas)
+    return {h for h, n in apariciones.items() if n >= BOILERPLATE_MIN_MESSAGES}
+
+
+def quitar_boilerplate(
+    texto: str, remitente: str | None, excluir_id: int | None = None
+) -> str:
+    """
+    Elimina las líneas que el remitente repite en sus correos anteriores. Si no
+    quedara nada (p. ej. un reenvío del mismo correo) se devuelve el texto intacto.
+    """
+    remitente = (remitente or "").strip().lower()
+    if not remitente or BOILERPLATE_HISTORY <= 0:
+        return texto
+    try:
+        repetidas = _boilerplate_de_remitente(remitente, excluir_id)
+    except Exception as e:
+        logger.error(f"Error leyendo el historial de {remitente}: {e}")
+        return texto
+    if not repetidas:
+        return texto
+    lineas = [
+        linea
+        for linea in texto.splitlines()
+        if not linea.strip() or _huella_linea(linea) not in repetidas
+    ]
+    if not any(linea.strip() for linea in lineas):
+        return texto
+    return "\n".join(lineas)
+
+
+def _es_titular(linea: str) -> bool:
+    """
+    Línea corta sin puntuación final: título de sección o titular de una noticia.
+    """
+    linea = linea.strip()
+    return 0 < len(linea.split()) <= 12 and not linea.endswith((".", ",", ";", ":"))
+
+
+def recortar_a_presupuesto(texto: str, presupuesto: int) -> str:
+    """
+    Recorta el texto a `presupuesto` tokens conservando primero los titulares y la
+    primera línea de cada sección, y después el resto del texto en orden de lectura,
+    de modo que el modelo ve todas las secciones aunque no entren enteras. Las partes
+    eliminadas se sustituyen por OMITIDO.
+    """
+    if presupuesto <= 0 or estimar_tokens(texto) <= presupuesto:
+        return texto
+    lineas = [linea for linea in texto.splitlines() if linea.strip()]
+    prioritarias = set()
+    for i, linea in enumerate(lineas):
+        if _es_titular(linea):
+            prioritarias.update((i, i + 1))
+    prioritarias.discard(len(lineas))
+
+    elegidas = set()
+    usados = 0
+    for i in sorted(prioritarias):
+        coste = estimar_tokens(lineas[i])
+        if usados + coste <= presupuesto:
+            elegidas.add(i)
+            usados += coste
+    for i, linea in enumerate(lineas):
+        if i in elegidas:
+            continue
+        coste = estimar_tokens(linea)
+        if usados + coste > presupuesto:
+            break
+        elegidas.add(i)
+        usados += coste
+    if not elegidas:
+        # Un único bloque enorme (texto plano sin saltos de línea)
+        return texto[: presupuesto * 4]
+
+    partes = []
+    for i, linea in enumerate(lineas):
+        if i in elegidas:
+            partes.append(linea)
+        elif partes and partes[-1] != OMITIDO:
+            partes.append(OMITIDO)
+    return "\n".join(partes)
+
+
+def preparar_contenido(
+    body: str, remitente: str | None = None, excluir_id: int | None = None
+) -> TextoPreparado:
+    """
+    Prepara el cuerpo de una newsletter antes de enviarlo al modelo: quita el
+    boilerplate aprendido del remitente (`excluir_id`: la propia newsletter, si ya
+    está guardada), colapsa las URLs y recorta a SUMMARY_INPUT_MAX_TOKENS. Registra
+    los tokens ahorrados en cada paso (métrica newsletters_preprocesado_tokens_total).
+    El resultado conserva el cuerpo original para la caché (ver TextoPreparado).
+    """
+    original = estimar_tokens(body)
+    sin_urls = colapsar_urls(body)
+    limpio = quitar_boilerplate(sin_urls, remitente, excluir_id)
+    texto = recortar_a_presupuesto(limpio, SUMMARY_INPUT_MAX_TOKENS)
+
+    informe = {
+        "urls": original - estimar_tokens(sin_urls),
+        "boilerplate": estimar_tokens(sin_urls) - estimar_tokens(limpio),
+        "recorte": estimar_tokens(limpio) - estimar_tokens(texto),
+    }
+    TOKENS_PREPROCESADO.inc(original, tipo="original")
+    TOKENS_PREPROCESADO.inc(estimar_tokens(texto), tipo="enviado")
+    for tipo, ahorrados in informe.items():
+        TOKENS_PREPROCESADO.inc(ahorrados, tipo=tipo)
+    logger.info(
+        f"Preprocesado: {original} -> {estimar_tokens(texto)} tokens "
+        f"(URLs -{informe['urls']}, boilerplate -{informe['boilerplate']}, "
+        f"recorte -{informe['recorte']})"
+    )
+    return TextoPreparado(texto, body)
+
+
+def preparar_correo(correo: dict) -> str:
+    """
+    preparar_contenido para un correo recién parseado (etapa de la ingesta).
+    """
+    return preparar_contenido(correo["body"], correo.get("sender_email"))
+
+
+def preparar_newsletter(newsletter: Newsletter, body: str) -> str:
+    """
+    preparar_contenido para una newsletter ya guardada: el remitente sale de su
+    campo author y la propia newsletter no cuenta como correo anterior.
+    """
+    return preparar_contenido(
+        body, parseaddr(newsletter.author or "")[1], newsletter.id
+    )
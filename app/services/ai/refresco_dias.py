@@ -0,0 +1,142 @@
+import logging
+import threading
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import DAY_SUMMARY_REFRESH_INTERVAL, SUMMARY_MAX_ATTEMPTS
+from app.core.database import SessionLocal
+from app.models.newsletter import NewsletterDia, newsletter_dia_rel
+from app.services.ai.resumen_newsletter import summarize_day
+from app.services.correos.newsletter_db import espera_reintento
+
+logger = logging.getLogger(__name__)
+
+
+class RefrescoDias:
+    """
+    Tarea en segundo plano que cada `intervalo` segundos actualiza el resumen de los
+    días marcados como pendientes (summary_dirty: han recibido newsletters después de
+    resumirse). Solo se tocan esos días y, cuando es posible, de forma incremental
+    (ver summarize_day). Un día cuyo resumen falla sigue marcado y se reintenta con
+    la misma espera exponencial que ColaResumenes (espera_reintento), como mucho
+    SUMMARY_MAX_ATTEMPTS veces; los intentos vuelven a cero cuando el día recibe
+    newsletters nuevas.
+    """
+
+    def __init__(
+        self,
+        intervalo: float = DAY_SUMMARY_REFRESH_INTERVAL,
+        resumir: Callable[[int, Session], str] = summarize_day,
+    ):
+        self.intervalo = intervalo
+        self._resumir = resumir
+        self._parar = threading.Event()
+        self._hilo = None
+        self.actualizados = 0
+        self.fallidos = 0
+        # day_id -> (newsletters del día, intentos fallidos, próximo reintento)
+        self._reintentos = {}
+
+    def iniciar(self):
+        if self._hilo and self._hilo.is_alive():
+            return
+        self._parar.clear()
+        self._hilo = threading.Thread(
+            target=self._bucle, name="refresco-dias", daemon=True
+        )
+        self._hilo.start()
+
+    def detener(self, timeout: float | None = 5.0):
+        self._parar.set()
+        if self._hilo:
+            self._hilo.join(timeout)
+
+    def _bucle(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                self.refrescar()
+            except Exception as e:
+                logger.error(f"Error actualizando los resúmenes pendientes: {e}")
+
+    def refrescar(self) -> dict:
+        """
+        Actualiza ahora los días pendientes, del más reciente al más antiguo.
+        Devuelve cuántos se han actualizado, cuántos han fallado y cuántos se han
+        aplazado (reintento aún no vencido o intentos agotados). summarize_day no
+        lanza excepciones: un día falla si sigue marcado como pendiente después.
+        """
+        db = SessionLocal()
+        try:
+            pendientes = (
+                db.query(
+                    NewsletterDia.id, func.count(newsletter_dia_rel.c.newsletter_id)
+                )
+                .outerjoin(
+                    newsletter_dia_rel, newsletter_dia_rel.c.dia_id == NewsletterDia.id
+                )
+                .filter(NewsletterDia.summary_dirty.is_(True))
+                .group_by(NewsletterDia.id)
+                .order_by(NewsletterDia.fecha.desc())
+                .all()
+            )
+        finally:
+            db.close()
+        # Los días que ya no están pendientes (resumidos por otra vía) se olvidan
+        self._reintentos = {
+            day_id: self._reintentos[day_id]
+            for day_id, _ in pendientes
+            if day_id in self._reintentos
+        }
+        resultado = {"actualizados": 0, "fallidos": 0, "aplazados": 0}
+        for day_id, newsletters in pendientes:
+            if self._parar.is_set():
+                break
+            intentos = 0
+            if day_id in self._reintentos:
+                antes, intentos, proximo = self._reintentos[day_id]
+                if antes != newsletters:
+                    intentos = 0
+                elif intentos >= SUMMARY_MAX_ATTEMPTS or datetime.utcnow() < proximo:
+                    resultado["aplazados"] += 1
+                    continue
+            db = SessionLocal()
+            try:
+                self._resumir(day_id, db)
+                pendiente = (
+                    db.query(NewsletterDia.summary_dirty)
+                    .filter(NewsletterDia.id == day_id)
+                    .scalar()
+                )
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Error actualizando el resumen del día {day_id}: {e}")
+                pendiente = True
+            finally:
+                db.close()
+            resultado["fallidos" if pendiente else "actualizados"] += 1
+            if not pendiente:
+                self._reintentos.pop(day_id, None)
+                continue
+            intentos += 1
+            self._reintentos[day_id] = (
+                newsletters,
+                intentos,
+                datetime.utcnow() + espera_reintento(intentos),
+            )
+            if intentos >= SUMMARY_MAX_ATTEMPTS:
+                logger.warning(
+                    f"El resumen del día {day_id} ha fallado {intentos} veces: no se "
+                    "reintentará hasta que reciba newsletters nuevas."
+                )
+        self.actualizados += resultado["actualizados"]
+        self.fallidos += resultado["fallidos"]
+        if resultado["actualizados"] or resultado["fallidos"]:
+            logger.info(
+                f"Resúmenes de días pendientes: {resultado['actualizados']} "
+                f"actualizados, {resultado['fallidos']} fallidos, "
+                f"{resultado['aplazados']} aplazados."
+            )
+        return resultado
@@ -1,26 +1,58 @@
+import asyncio
+import hashlib
 import logging
+import re
+import time
+from collections.abc import AsyncIterator, Callable
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
-from google import genai
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, object_session, selectinload
 
-from app.core.config import GEMINI_KEY, MODEL_GEMINI
+from app.core.compresion import descomprimir
+from app.core.config import (
+    DAY_CLUSTER_THRESHOLD,
+    DAY_SUMMARY_CHUNK_TOKENS,
+    DAY_SUMMARY_MODE,
+    NEAR_DUPLICATE_THRESHOLD,
+    SUMMARY_CONCURRENCY,
+)
 from app.core.database import SessionLocal
-from app.models.newsletter import Newsletter, NewsletterDia
+from app.core.metricas import (
+    CASI_DUPLICADOS,
+    ERRORES,
+    ETAPA_SEGUNDOS,
+    MODELO_PETICIONES,
+    MODELO_SEGUNDOS,
+    RESUMENES_DIA,
+    TOKENS,
+)
+from app.core.version_datos import incrementar_version
+from app.models.newsletter import Newsletter, NewsletterBody, NewsletterDia
+from app.services.ai.backends import BackendResumen, obtener_backend
+from app.services.ai.cache_resumenes import (
+    clave_cache,
+    guardar_resumen,
+    obtener_resumen,
+)
+from app.services.ai.preprocesado import (
+    colapsar_urls,
+    estimar_tokens,
+    preparar_newsletter,
+)
+from app.services.correos.busqueda_fts import actualizar_resumen_fts
+from app.services.correos.similitud import (
+    agrupar_similares,
+    buscar_similares,
+    firma_cuerpo,
+)
 
-# Configurar el cliente de Gemini con la API Key
-client = genai.Client(api_key=GEMINI_KEY)
 logger = logging.getLogger(__name__)
 
+ERROR_RESUMEN = "Error al generar el resumen."
 
-def summarize_newsletter(content: str) -> str:
-    """
-    Genera un resumen usando Gemini a partir del contenido proporcionado.
-
-    :param content: Texto completo de la newsletter.
-    :return: Resumen generado o un mensaje de error.
-    """
-    try:
-        prompt = f"""
+PROMPT_NEWSLETTER = """
         Analiza el siguiente texto y realiza un resumen en dos partes:
 
         1. **Identificación de Puntos Clave**:
@@ -35,24 +67,599 @@ def summarize_newsletter(content: str) -> str:
 
         {content}
         """
-        summary_response = client.models.generate_content(
-            model=MODEL_GEMINI, contents=prompt
+
+PROMPT_DIA = """
+        Analiza el siguiente conjunto de newsletters y realiza un resumen en dos partes:
+
+        1. **Esquema de Puntos Clave**: Enumera los temas principales abordados en las newsletters de manera estructurada. 
+           - Usa un formato claro, como una lista numerada o con viñetas.
+           - Identifica los temas recurrentes o más importantes.
+
+        2. **Desarrollo de los Puntos Clave**: Explica cada punto identificado de forma concisa y clara. 
+           - Proporciona un resumen breve pero informativo de cada tema.
+           - Si hay relación entre los puntos, indícalo.
+
+        Aquí están las newsletters a analizar:
+
+        {content}
+        """
+
+PROMPT_PARCIAL = """
+        Estos son resúmenes de varias newsletters del mismo día. Combínalos en un
+        resumen parcial que conserve todos los temas tratados:
+
+        - Agrupa los temas repetidos entre newsletters en un único punto.
+        - Para cada tema, indica brevemente lo esencial y qué newsletters lo tratan.
+        - No añadas información que no esté en los resúmenes.
+
+        Aquí están los resúmenes:
+
+        {content}
+        """
+
+PROMPT_INCREMENTAL = """
+        Este es el resumen del día de un conjunto de newsletters. Después llegaron
+        nuevas newsletters del mismo día: actualiza el resumen para incorporarlas.
+
+        - Conserva la estructura en dos partes (esquema de puntos clave y desarrollo).
+        - Añade los temas nuevos y amplía los puntos existentes que traten.
+        - No elimines información del resumen actual.
+
+        Resumen actual:
+
+        {resumen}
+
+        Newsletters nuevas:
+
+        {content}
+        """
+
+# La versión del prompt forma parte de la clave de caché: cambiar el texto la invalida
+# Casi duplicados: solo se reutiliza el resumen de un correo con el mismo asunto (sin
+# estos prefijos) y una longitud parecida (ver _mismo_correo)
+ASUNTO_PREFIJO_RE = re.compile(
+    r"^(?:\s*(?:re|fwd?|rv|tr|reenviado)\s*:)+", re.IGNORECASE
+)
+PROPORCION_LONGITUD_MIN = 0.8
+
+PROMPT_VERSION = hashlib.sha256(PROMPT_NEWSLETTER.encode("utf-8")).hexdigest()[:12]
+
+
+@contextmanager
+def _medir_llamada(backend: BackendResumen, operacion: str, prompts: list[str]):
+    """
+    Registra la latencia, el resultado y los tokens estimados de una llamada al
+    modelo. Las respuestas se añaden a la lista devuelta.
+    """
+    etiquetas = {"backend": backend.nombre, "operacion": operacion}
+    respuestas = []
+    t0 = time.perf_counter()
+    TOKENS.inc(sum(estimar_tokens(prompt) for prompt in prompts), direccion="entrada")
+    try:
+        yield respuestas
+    except Exception:
+        MODELO_PETICIONES.inc(resultado="error", **etiquetas)
+        raise
+    else:
+        MODELO_PETICIONES.inc(resultado="ok", **etiquetas)
+        TOKENS.inc(sum(estimar_tokens(r) for r in respuestas), direccion="salida")
+    finally:
+        MODELO_SEGUNDOS.observar(time.perf_counter() - t0, **etiquetas)
+
+
+def summarize_newsletter(content: str) -> str:
+    """
+    Genera un resumen con el backend configurado (ver backends) a partir del
+    contenido proporcionado. Antes consulta la caché de resúmenes por contenido (ver
+    cache_resumenes).
+
+    :param content: Texto completo de la newsletter.
+    :return: Resumen generado o un mensaje de error.
+    """
+    return summarize_newsletters([content])[0]
+
+
+def _resumir_lote(
+    backend: BackendResumen, contents: list[str], claves: list[str]
+) -> list[str]:
+    """
+    Resume varias newsletters en una sola petición y cachea los resultados. Si el
+    lote falla, se reintenta newsletter a newsletter para que un único fallo no
+    arrastre al resto.
+    """
+    prompts = [PROMPT_NEWSLETTER.format(content=content) for content in contents]
+    try:
+        with _medir_llamada(backend, _operacion(prompts), prompts) as nuevos:
+            nuevos.extend(backend.generar_lote(prompts))
+    except Exception as e:
+        ERRORES.inc(etapa="modelo")
+        logger.error(f"Error generando {len(contents)} resumen(es): {e}")
+        if len(contents) == 1:
+            return [ERROR_RESUMEN]
+        return [
+            _resumir_lote(backend, [content], [clave])[0]
+            for content, clave in zip(contents, claves)
+        ]
+    for clave, summary_text in zip(claves, nuevos):
+        logger.info(f"Resumen generado ({len(summary_text)} caracteres).")
+        # Solo se cachean respuestas válidas: los errores deben poder reintentarse
+        guardar_resumen(clave, summary_text)
+    return nuevos
+
+
+def summarize_newsletters(contents: list[str], forzar: bool = False) -> list[str]:
+    """
+    Versión por lotes de summarize_newsletter: las newsletters que no están en la
+    caché se resumen en peticiones de hasta `max_lote` newsletters del backend
+    (SUMMARY_BATCH_SIZE). Con `forzar` no se consulta la caché y se resumen todas
+    (los resúmenes nuevos sustituyen a los cacheados). Devuelve los resúmenes en el
+    mismo orden.
+    """
+    backend = obtener_backend()
+    claves = [
+        clave_cache(content, PROMPT_VERSION, backend.modelo) for content in contents
+    ]
+    if forzar:
+        resumenes = [None] * len(contents)
+    else:
+        resumenes = [obtener_resumen(clave) for clave in claves]
+    pendientes = [i for i, summary in enumerate(resumenes) if summary is None]
+    for lote in _en_lotes(pendientes, backend.max_lote):
+        nuevos = _resumir_lote(
+            backend, [contents[i] for i in lote], [claves[i] for i in lote]
         )
-        summary_text = summary_response.text
-        logger.info(f"Resumen generado: {summary_text}")
-        return summary_text
+        for i, summary_text in zip(lote, nuevos):
+            resumenes[i] = summary_text
+    return resumenes
+
+
+def _operacion(prompts: list[str]) -> str:
+    return "lote" if len(prompts) > 1 else "generar"
+
+
+def _en_lotes(items: list, tamano: int) -> list[list]:
+    tamano = max(1, tamano)
+    return [items[inicio : inicio + tamano] for inicio in range(0, len(items), tamano)]
+
+
+def _generar(prompt: str) -> str:
+    """
+    Llama al backend configurado con el prompt y devuelve el texto. Propaga cualquier
+    error.
+    """
+    backend = obtener_backend()
+    with _medir_llamada(backend, "generar", [prompt]) as respuestas:
+        respuestas.append(backend.generar(prompt))
+    return respuestas[0]
+
+
+async def summarize_newsletter_async(content: str) -> str:
+    """
+    Versión asíncrona de summarize_newsletter: no bloquea el bucle de eventos
+    mientras se espera al modelo. La caché se consulta en un hilo.
+    """
+    return (await summarize_newsletters_async([content]))[0]
+
+
+async def _resumir_lote_async(
+    backend: BackendResumen, contents: list[str], claves: list[str]
+) -> list[str]:
+    """
+    Versión asíncrona de _resumir_lote.
+    """
+    prompts = [PROMPT_NEWSLETTER.format(content=content) for content in contents]
+    try:
+        with _medir_llamada(backend, _operacion(prompts), prompts) as nuevos:
+            nuevos.extend(await backend.generar_lote_async(prompts))
     except Exception as e:
-        logger.error(f"Error generando resumen: {e}")
-        return "Error al generar el resumen."
+        ERRORES.inc(etapa="modelo")
+        logger.error(f"Error generando {len(contents)} resumen(es): {e}")
+        if len(contents) == 1:
+            return [ERROR_RESUMEN]
+        return [
+            (await _resumir_lote_async(backend, [content], [clave]))[0]
+            for content, clave in zip(contents, claves)
+        ]
+    for clave, summary_text in zip(claves, nuevos):
+        logger.info(f"Resumen generado ({len(summary_text)} caracteres).")
+        await asyncio.to_thread(guardar_resumen, clave, summary_text)
+    return nuevos
 
 
-def summarize_day(day_id: int, db: Session) -> str:
+async def summarize_newsletters_async(contents: list[str]) -> list[str]:
     """
-    Busca el registro diario en la BD, concatena el contenido de todas las newsletters asociadas a ese día,
-    usa Gemini para generar un resumen del día y lo guarda en la BD.
+    Versión asíncrona de summarize_newsletters.
+    """
+    backend = obtener_backend()
+    claves = [
+        clave_cache(content, PROMPT_VERSION, backend.modelo) for content in contents
+    ]
+    resumenes = await asyncio.to_thread(lambda: [obtener_resumen(c) for c in claves])
+    pendientes = [i for i, summary in enumerate(resumenes) if summary is None]
+    for lote in _en_lotes(pendientes, backend.max_lote):
+        nuevos = await _resumir_lote_async(
+            backend, [contents[i] for i in lote], [claves[i] for i in lote]
+        )
+        for i, summary_text in zip(lote, nuevos):
+            resumenes[i] = summary_text
+    return resumenes
+
+
+async def _generar_async(prompt: str) -> str:
+    """
+    Versión asíncrona de _generar. Propaga cualquier error.
+    """
+    backend = obtener_backend()
+    with _medir_llamada(backend, "generar", [prompt]) as respuestas:
+        respuestas.append(await backend.generar_async(prompt))
+    return respuestas[0]
+
+
+async def _en_paralelo(funcion, argumentos: list) -> list:
+    """
+    Ejecuta la corrutina `funcion` sobre cada argumento con, como mucho,
+    SUMMARY_CONCURRENCY llamadas simultáneas, conservando el orden.
+    """
+    semaforo = asyncio.Semaphore(max(1, SUMMARY_CONCURRENCY))
+
+    async def limitada(argumento):
+        async with semaforo:
+            return await funcion(argumento)
+
+    return await asyncio.gather(*(limitada(argumento) for argumento in argumentos))
+
+
+def _agrupar_por_tokens(textos: list[str], presupuesto: int) -> list[list[str]]:
+    """
+    Agrupa textos consecutivos en bloques que no superan `presupuesto` tokens.
+    Un texto que por sí solo supera el presupuesto se recorta.
+    """
+    max_chars = presupuesto * 4
+    bloques = []
+    actual = []
+    tokens_actual = 0
+    for texto in textos:
+        texto = texto[:max_chars]
+        tokens = estimar_tokens(texto)
+        if actual and tokens_actual + tokens > presupuesto:
+            bloques.append(actual)
+            actual = []
+            tokens_actual = 0
+        actual.append(texto)
+        tokens_actual += tokens
+    if actual:
+        bloques.append(actual)
+    return bloques
+
+
+def _resumen_valido(newsletter: Newsletter) -> bool:
+    return bool(newsletter.summary) and newsletter.summary != ERROR_RESUMEN
+
+
+def _asunto_normalizado(asunto: str | None) -> str:
+    return " ".join(ASUNTO_PREFIJO_RE.sub("", asunto or "").lower().split())
+
+
+def _mismo_correo(correo: dict, subject: str, body: str) -> bool:
+    """
+    Salvaguarda antes de reutilizar el resumen de un casi duplicado: mismo asunto
+    (sin prefijos Re:/Fwd:) y longitud parecida. Dos ediciones de una misma plantilla
+    pueden superar el umbral de similitud, pero no comparten asunto.
+    """
+    if _asunto_normalizado(correo["subject"]) != _asunto_normalizado(subject):
+        return False
+    nuevo, guardado = len(colapsar_urls(correo["body"])), len(colapsar_urls(body))
+    return min(nuevo, guardado) >= PROPORCION_LONGITUD_MIN * max(nuevo, guardado)
+
+
+def resumen_de_casi_duplicado(correo: dict, texto: str) -> str | None:
+    """
+    Etapa de la ingesta (PipelineIngesta, `reutilizar`): calcula la firma MinHash del
+    correo (firma_cuerpo, no del texto preprocesado `texto`), que se guarda con la
+    newsletter (correo["minhash"]), y devuelve el resumen de la newsletter guardada
+    más parecida si su similitud es >= NEAR_DUPLICATE_THRESHOLD y es el mismo correo
+    (reenvíos, ver _mismo_correo), o None.
+    """
+    firma = correo["minhash"] = firma_cuerpo(correo["body"], correo.get("sender_email"))
+    if not firma or NEAR_DUPLICATE_THRESHOLD <= 0:
+        return None
+    db = SessionLocal()
+    try:
+        similares = buscar_similares(
+            db, firma, NEAR_DUPLICATE_THRESHOLD, con_resumen=True
+        )
+        candidatas = {
+            newsletter_id: (subject, summary, content)
+            for newsletter_id, subject, summary, content in db.query(
+                Newsletter.id,
+                Newsletter.subject,
+                Newsletter.summary,
+                NewsletterBody.content,
+            )
+            .outerjoin(NewsletterBody, NewsletterBody.newsletter_id == Newsletter.id)
+            .filter(
+                Newsletter.id.in_([newsletter_id for newsletter_id, _ in similares])
+            )
+        }
+    finally:
+        db.close()
+    for newsletter_id, parecido in similares:
+        subject, summary, content = candidatas.get(newsletter_id, (None, None, None))
+        if summary in (None, ERROR_RESUMEN):
+            continue
+        if not _mismo_correo(correo, subject, descomprimir(content)):
+            logger.info(
+                f"Email {correo['email_id']}: parecido a la newsletter "
+                f"{newsletter_id} ({parecido:.0%}) pero con otro asunto o longitud, "
+                f"se resume."
+            )
+            continue
+        CASI_DUPLICADOS.inc(tipo="reutilizado")
+        logger.info(
+            f"Email {correo['email_id']}: casi duplicado de la newsletter "
+            f"{newsletter_id} ({parecido:.0%}), se reutiliza su resumen."
+        )
+        return summary
+    return None
+
+
+def _historias(newsletters: list[Newsletter]) -> list[list[Newsletter]]:
+    """
+    Agrupa las newsletters del día que cuentan la misma historia (similitud >=
+    DAY_CLUSTER_THRESHOLD) para resumirla una sola vez. La primera de cada grupo es
+    su representante: una que ya tenga resumen válido, si la hay.
+    """
+    historias = agrupar_similares(newsletters, DAY_CLUSTER_THRESHOLD)
+    for historia in historias:
+        historia.sort(key=lambda n: not _resumen_valido(n))
+        if len(historia) > 1:
+            CASI_DUPLICADOS.inc(len(historia) - 1, tipo="agrupada")
+    return historias
+
+
+def _entrada_historia(historia: list[Newsletter]) -> str:
+    """
+    Entrada del resumen del día: asuntos y autores de la historia y el resumen de su
+    representante.
+    """
+    asuntos = " / ".join(dict.fromkeys(n.subject for n in historia))
+    autores = ", ".join(dict.fromkeys(str(n.author) for n in historia))
+    return f"### {asuntos} ({autores})\n{historia[0].summary}"
+
+
+def _entradas_de_historias(
+    historias: list[list[Newsletter]],
+) -> tuple[list[str], set[int]]:
+    """
+    Una entrada por historia cuyo representante tiene resumen válido y los IDs de
+    todas las newsletters que cubren.
+    """
+    validas = [h for h in historias if _resumen_valido(h[0])]
+    return [_entrada_historia(h) for h in validas], {n.id for h in validas for n in h}
+
+
+def _resumenes_de_newsletters(
+    newsletters: list[Newsletter],
+) -> tuple[list[str], set[int]]:
+    """
+    Agrupa las newsletters en historias (ver _historias) y devuelve una entrada por
+    historia (asuntos, autores y resumen) y los IDs incluidos. Los representantes sin
+    resumen válido se resumen en paralelo y los resúmenes nuevos se guardan (con el
+    índice FTS y la versión de los datos) antes de seguir, como en la versión
+    asíncrona: si después el día no tiene contenido o falla el modelo, no se pierden.
+    """
+    historias = _historias(newsletters)
+    # El cuerpo (comprimido, en otra tabla) solo se carga si falta el resumen
+    pendientes = [(h[0], h[0].body) for h in historias if not _resumen_valido(h[0])]
+    sin_resumen = [n for n, body in pendientes if body]
+    if sin_resumen:
+        contenidos = [preparar_newsletter(n, body) for n, body in pendientes if body]
+        lotes = _en_lotes(contenidos, obtener_backend().max_lote)
+        with ThreadPoolExecutor(max_workers=max(1, SUMMARY_CONCURRENCY)) as executor:
+            nuevos = [
+                summary
+                for resumenes in executor.map(summarize_newsletters, lotes)
+                for summary in resumenes
+            ]
+        db = object_session(sin_resumen[0])
+        for newsletter, summary in zip(sin_resumen, nuevos):
+            if summary != ERROR_RESUMEN:
+                actualizar_resumen_fts(db, newsletter.id, newsletter.summary, summary)
+                newsletter.summary = summary
+                newsletter.summary_status = "done"
+                newsletter.summary_next_retry = None
+        incrementar_version(db)
+        db.commit()
+
+    return _entradas_de_historias(historias)
+
+
+def _reducir(entradas: list[str], presupuesto: int) -> str:
+    """
+    Reduce jerárquicamente las entradas: mientras no quepan en un único prompt, cada
+    bloque se resume en paralelo en un resumen parcial y se repite con los parciales.
+    Devuelve el contenido para PROMPT_DIA, que no supera `presupuesto` tokens.
+    """
+    bloques = _agrupar_por_tokens(entradas, presupuesto)
+    while len(bloques) > 1:
+        prompts = [
+            PROMPT_PARCIAL.format(content="\n\n".join(bloque)) for bloque in bloques
+        ]
+        with ThreadPoolExecutor(max_workers=max(1, SUMMARY_CONCURRENCY)) as executor:
+            parciales = list(executor.map(_generar, prompts))
+        nuevos_bloques = _agrupar_por_tokens(parciales, presupuesto)
+        if len(nuevos_bloques) >= len(bloques):
+            # Los parciales no encogen: se fuerza un único bloque recortado
+            nuevos_bloques = _agrupar_por_tokens(["\n\n".join(parciales)], presupuesto)[
+                :1
+            ]
+        bloques = nuevos_bloques
+    return "\n\n".join(bloques[0])
+
+
+def version_resumen_dia() -> str:
+    """
+    Versión de los resúmenes del día: prompts, modo (DAY_SUMMARY_MODE) y modelo del
+    backend. Un resumen guardado con otra versión se regenera desde cero.
+    """
+    prompts = PROMPT_NEWSLETTER + PROMPT_PARCIAL + PROMPT_DIA + PROMPT_INCREMENTAL
+    huella = hashlib.sha256(f"{DAY_SUMMARY_MODE}\n{prompts}".encode("utf-8"))
+    return f"{huella.hexdigest()[:12]}:{obtener_backend().modelo}"
+
+
+def huella_miembros(ids) -> str:
+    """
+    Huella de un conjunto de newsletters (sha256 de sus IDs ordenados).
+    """
+    texto = ",".join(str(i) for i in sorted(ids))
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()[:16]
+
+
+def _miembros_previos(day_record: NewsletterDia) -> set[int] | None:
+    """
+    IDs de las newsletters incluidas en el resumen guardado, o None si no hay un
+    resumen reutilizable (no existe, es de otra versión o anterior a las huellas).
+    """
+    if (
+        not day_record.summary
+        or day_record.summary_members is None
+        or day_record.summary_version != version_resumen_dia()
+    ):
+        return None
+    return {int(i) for i in day_record.summary_members.split(",") if i}
+
+
+def _plan_resumen_dia(
+    day_record: NewsletterDia, forzar: bool = False
+) -> tuple[str, list[Newsletter], set[int]]:
+    """
+    Decide cómo actualizar el resumen del día. Devuelve el modo, las newsletters que
+    hay que (re)procesar y las ya incluidas en el resumen guardado:
+
+    - "vigente": la huella coincide (mismas newsletters, misma versión); se reutiliza
+      el resumen sin llamar al modelo.
+    - "incremental": el resumen guardado cubre parte de las newsletters actuales;
+      solo se pliegan las nuevas.
+    - "completo": se regenera desde cero (sin resumen reutilizable, con `forzar` o
+      si han desaparecido newsletters del día).
+    """
+    newsletters = list(day_record.newsletters)
+    previas = None if forzar else _miembros_previos(day_record)
+    actuales = {n.id for n in newsletters}
+    if previas is None or not previas <= actuales:
+        return "completo", newsletters, set()
+    if day_record.summary_fingerprint == huella_miembros(actuales):
+        return "vigente", [], previas
+    return "incremental", [n for n in newsletters if n.id not in previas], previas
+
+
+def _entradas(newsletters: list[Newsletter]) -> tuple[list[str], set[int]]:
+    """
+    Contenido de cada historia del día (ver _historias) según DAY_SUMMARY_MODE
+    (cuerpo completo del representante o asuntos, autores y resumen) y los IDs de las
+    newsletters que cubre.
+    """
+    if DAY_SUMMARY_MODE == "full":
+        cuerpos = [(h, h[0].body) for h in _historias(newsletters)]
+        return (
+            [preparar_newsletter(h[0], body) for h, body in cuerpos if body],
+            {n.id for h, body in cuerpos if body for n in h},
+        )
+    return _resumenes_de_newsletters(newsletters)
+
+
+async def _entradas_async(
+    db: AsyncSession, newsletters: list[Newsletter]
+) -> tuple[list[str], set[int]]:
+    """
+    Versión asíncrona de _entradas.
+    """
+    if DAY_SUMMARY_MODE == "full":
+        historias = _historias(newsletters)
+        # El cuerpo se carga de forma perezosa: solo es posible dentro de run_sync
+        cuerpos = await db.run_sync(lambda _: [(h, h[0].body) for h in historias])
+        contenidos = await asyncio.to_thread(
+            lambda: [preparar_newsletter(h[0], body) for h, body in cuerpos if body]
+        )
+        return contenidos, {n.id for h, body in cuerpos if body for n in h}
+    return await _resumenes_de_newsletters_async(db, newsletters)
+
+
+def _prompt_incremental(day_record: NewsletterDia, entradas: list[str]) -> str | None:
+    """
+    Prompt que pliega las entradas nuevas en el resumen guardado, o None si no caben
+    en un único bloque de DAY_SUMMARY_CHUNK_TOKENS (entonces se regenera entero).
+    """
+    if sum(estimar_tokens(entrada) for entrada in entradas) > DAY_SUMMARY_CHUNK_TOKENS:
+        return None
+    return PROMPT_INCREMENTAL.format(
+        resumen=day_record.summary, content="\n\n".join(entradas)
+    )
+
+
+def _prompt_del_dia(
+    day_record: NewsletterDia, forzar: bool = False
+) -> tuple[str, str | None, set[int]]:
+    """
+    Prepara el prompt del resumen del día según _plan_resumen_dia (en modo jerárquico
+    genera antes los resúmenes y parciales que falten). Devuelve el modo, el prompt y
+    las newsletters que cubrirá el resumen. El prompt es None en modo "vigente" o si
+    el día no tiene contenido que resumir.
+    """
+    modo, newsletters, previas = _plan_resumen_dia(day_record, forzar)
+    if modo == "vigente":
+        return modo, None, previas
+    entradas, incluidas = _entradas(newsletters)
+    if modo == "incremental":
+        if not entradas:
+            # Las nuevas no tienen contenido (o falló su resumen): nada que plegar
+            return "vigente", None, previas
+        prompt = _prompt_incremental(day_record, entradas)
+        if prompt is not None:
+            return modo, prompt, previas | incluidas
+        modo, newsletters = "completo", list(day_record.newsletters)
+        entradas, incluidas = _entradas(newsletters)
+    if not entradas:
+        return modo, None, set()
+    if DAY_SUMMARY_MODE == "full":
+        return modo, PROMPT_DIA.format(content=" ".join(entradas)), incluidas
+    contenido = _reducir(entradas, DAY_SUMMARY_CHUNK_TOKENS)
+    return modo, PROMPT_DIA.format(content=contenido), incluidas
+
+
+def _aplicar_resumen_dia(
+    day_record: NewsletterDia, summary_text: str, miembros: set[int]
+):
+    """
+    Guarda en el registro el resumen con su huella, su versión y sus newsletters.
+    """
+    day_record.summary = summary_text
+    day_record.summary_fingerprint = huella_miembros(miembros)
+    day_record.summary_version = version_resumen_dia()
+    day_record.summary_members = ",".join(str(i) for i in sorted(miembros))
+    day_record.summary_dirty = False
+
+
+@ETAPA_SEGUNDOS.cronometrar(etapa="resumen_dia")
+def summarize_day(day_id: int, db: Session, forzar: bool = False) -> str:
+    """
+    Busca el registro diario en la BD, genera un resumen del día con el backend
+    configurado y lo guarda en la BD.
+
+    En modo "hierarchical" (DAY_SUMMARY_MODE, por defecto) se parte de los resúmenes
+    ya guardados de cada newsletter (generando los que falten), se agrupan en bloques de
+    DAY_SUMMARY_CHUNK_TOKENS, se resumen en paralelo y se reducen al resumen del día, de
+    modo que el tamaño del prompt no depende del número de newsletters.
+    En modo "full" se concatena el cuerpo completo de todas las newsletters.
+
+    Si las newsletters del día no han cambiado desde el último resumen (misma huella y
+    versión) se devuelve el guardado sin llamar al modelo; si solo se han añadido
+    newsletters, se pliegan en el resumen guardado (ver _plan_resumen_dia). Con
+    `forzar` se regenera siempre desde cero.
 
     :param day_id: ID del registro diario (NewsletterDia).
     :param db: Sesión de la base de datos.
+    :param forzar: Regenerar aunque el resumen guardado esté al día.
     :return: Resumen generado o un mensaje de error.
     """
     # Suponiendo que el modelo NewsletterDia tiene la relación "newsletters"
@@ -61,44 +668,235 @@ def summarize_day(day_id: int, db: Session) -> str:
         logger.error(f"Registro diario con ID {day_id} no encontrado.")
         return "Registro diario no encontrado."
     try:
-        combined_content = " ".join(
-            [
-                newsletter.body
-                for newsletter in day_record.newsletters
-                if newsletter.body
-            ]
-        )
-        if not combined_content:
+        modo, prompt, miembros = _prompt_del_dia(day_record, forzar)
+        RESUMENES_DIA.inc(modo=modo)
+        if modo == "vigente":
+            if day_record.summary_dirty:
+                day_record.summary_dirty = False
+                incrementar_version(db)
+                db.commit()
+            logger.info(f"Resumen del día {day_id} al día: no se regenera.")
+            return day_record.summary
+        if prompt is None:
             logger.warning(f"No hay contenido en las newsletters para el día {day_id}.")
             return "No hay contenido para resumir en este día."
+        summary_text = _generar(prompt)
 
-        prompt = f"""
-        Analiza el siguiente conjunto de newsletters y realiza un resumen en dos partes:
+        _aplicar_resumen_dia(day_record, summary_text, miembros)
+        incrementar_version(db)
+        db.commit()
+        logger.info(f"Resumen del día {day_id} guardado en la BD.")
+        return summary_text
+    except Exception as e:
+        db.rollback()
+        ERRORES.inc(etapa="resumen_dia")
+        logger.error(
+            f"Error en la generación del resumen diario para el día {day_id}: {e}"
+        )
+        return "Error al generar el resumen diario."
 
-        1. **Esquema de Puntos Clave**: Enumera los temas principales abordados en las newsletters de manera estructurada. 
-           - Usa un formato claro, como una lista numerada o con viñetas.
-           - Identifica los temas recurrentes o más importantes.
 
-        2. **Desarrollo de los Puntos Clave**: Explica cada punto identificado de forma concisa y clara. 
-           - Proporciona un resumen breve pero informativo de cada tema.
-           - Si hay relación entre los puntos, indícalo.
+async def _resumenes_de_newsletters_async(
+    db: AsyncSession, newsletters: list[Newsletter]
+) -> tuple[list[str], set[int]]:
+    """
+    Versión asíncrona de _resumenes_de_newsletters. Los resúmenes nuevos se guardan
+    (con el índice FTS y la versión de los datos) antes de seguir, para no mantener
+    abierta una transacción de escritura mientras se espera al modelo.
+    """
+    historias = _historias(newsletters)
+    pendientes = [h[0] for h in historias if not _resumen_valido(h[0])]
+    # El cuerpo se carga de forma perezosa: solo es posible dentro de run_sync
+    cuerpos = await db.run_sync(lambda _: [n.body for n in pendientes])
+    sin_resumen = [(n, body) for n, body in zip(pendientes, cuerpos) if body]
+    if sin_resumen:
+        contenidos = await asyncio.to_thread(
+            lambda: [preparar_newsletter(n, body) for n, body in sin_resumen]
+        )
+        lotes = _en_lotes(contenidos, obtener_backend().max_lote)
+        nuevos = [
+            summary
+            for resumenes in await _en_paralelo(summarize_newsletters_async, lotes)
+            for summary in resumenes
+        ]
 
-        Aquí están las newsletters a analizar:
+        def guardar(sync_db: Session):
+            for (newsletter, _), summary in zip(sin_resumen, nuevos):
+                if summary != ERROR_RESUMEN:
+                    actualizar_resumen_fts(
+                        sync_db, newsletter.id, newsletter.summary, summary
+                    )
+                    newsletter.summary = summary
+                    newsletter.summary_status = "done"
+                    newsletter.summary_next_retry = None
+            incrementar_version(sync_db)
 
-        {combined_content}
-        """
-        summary_response = client.models.generate_content(
-            model=MODEL_GEMINI, contents=prompt
-        )
-        summary_text = summary_response.text
+        await db.run_sync(guardar)
+        await db.commit()
 
-        day_record.summary = summary_text
-        db.commit()
-        logger.info(f"Resumen del día {day_id} guardado en la BD: {summary_text}")
-        return summary_text
+    return _entradas_de_historias(historias)
+
+
+async def _reducir_async(entradas: list[str], presupuesto: int) -> str:
+    """
+    Versión asíncrona de _reducir.
+    """
+    bloques = _agrupar_por_tokens(entradas, presupuesto)
+    while len(bloques) > 1:
+        prompts = [
+            PROMPT_PARCIAL.format(content="\n\n".join(bloque)) for bloque in bloques
+        ]
+        parciales = await _en_paralelo(_generar_async, prompts)
+        nuevos_bloques = _agrupar_por_tokens(parciales, presupuesto)
+        if len(nuevos_bloques) >= len(bloques):
+            nuevos_bloques = _agrupar_por_tokens(["\n\n".join(parciales)], presupuesto)[
+                :1
+            ]
+        bloques = nuevos_bloques
+    return "\n\n".join(bloques[0])
+
+
+async def _prompt_del_dia_async(
+    day_record: NewsletterDia, db: AsyncSession, forzar: bool = False
+) -> tuple[str, str | None, set[int]]:
+    """
+    Versión asíncrona de _prompt_del_dia.
+    """
+    modo, newsletters, previas = _plan_resumen_dia(day_record, forzar)
+    if modo == "vigente":
+        return modo, None, previas
+    entradas, incluidas = await _entradas_async(db, newsletters)
+    if modo == "incremental":
+        if not entradas:
+            return "vigente", None, previas
+        prompt = _prompt_incremental(day_record, entradas)
+        if prompt is not None:
+            return modo, prompt, previas | incluidas
+        modo, newsletters = "completo", list(day_record.newsletters)
+        entradas, incluidas = await _entradas_async(db, newsletters)
+    if not entradas:
+        return modo, None, set()
+    if DAY_SUMMARY_MODE == "full":
+        return modo, PROMPT_DIA.format(content=" ".join(entradas)), incluidas
+    contenido = await _reducir_async(entradas, DAY_SUMMARY_CHUNK_TOKENS)
+    return modo, PROMPT_DIA.format(content=contenido), incluidas
+
+
+async def _guardar_resumen_dia(
+    db: AsyncSession,
+    day_record: NewsletterDia,
+    summary_text: str,
+    miembros: set[int],
+):
+    _aplicar_resumen_dia(day_record, summary_text, miembros)
+    await db.run_sync(incrementar_version)
+    await db.commit()
+    logger.info(f"Resumen del día {day_record.id} guardado en la BD.")
+
+
+async def _marcar_vigente(db: AsyncSession, day_record: NewsletterDia):
+    """
+    El resumen guardado sigue al día: solo se quita la marca de pendiente.
+    """
+    if day_record.summary_dirty:
+        day_record.summary_dirty = False
+        await db.run_sync(incrementar_version)
+        await db.commit()
+    logger.info(f"Resumen del día {day_record.id} al día: no se regenera.")
+
+
+async def summarize_day_async(
+    day_id: int, db: AsyncSession, forzar: bool = False
+) -> str:
+    """
+    Versión asíncrona de summarize_day para los endpoints: mismas modalidades y
+    mensajes, con la sesión asíncrona y las llamadas asíncronas del backend, de modo
+    que el proceso sigue atendiendo otras peticiones mientras se genera el resumen.
+    """
+    day_record = await db.get(
+        NewsletterDia, day_id, options=[selectinload(NewsletterDia.newsletters)]
+    )
+    if not day_record:
+        logger.error(f"Registro diario con ID {day_id} no encontrado.")
+        return "Registro diario no encontrado."
+    try:
+        # Un decorador no mediría la corrutina, solo su creación
+        with ETAPA_SEGUNDOS.cronometrar(etapa="resumen_dia"):
+            modo, prompt, miembros = await _prompt_del_dia_async(day_record, db, forzar)
+            RESUMENES_DIA.inc(modo=modo)
+            if modo == "vigente":
+                await _marcar_vigente(db, day_record)
+                return day_record.summary
+            if prompt is None:
+                logger.warning(
+                    f"No hay contenido en las newsletters para el día {day_id}."
+                )
+                return "No hay contenido para resumir en este día."
+            summary_text = await _generar_async(prompt)
+            await _guardar_resumen_dia(db, day_record, summary_text, miembros)
+            return summary_text
     except Exception as e:
-        db.rollback()
+        await db.rollback()
+        ERRORES.inc(etapa="resumen_dia")
         logger.error(
             f"Error en la generación del resumen diario para el día {day_id}: {e}"
         )
         return "Error al generar el resumen diario."
+
+
+async def generar_stream(prompt: str) -> AsyncIterator[str]:
+    """
+    Llama al backend configurado en modo streaming y va devolviendo los fragmentos de
+    texto según llegan. Propaga cualquier error.
+    """
+    backend = obtener_backend()
+    t0 = time.perf_counter()
+    with _medir_llamada(backend, "stream", [prompt]) as fragmentos:
+        async for fragmento in backend.generar_stream(prompt):
+            if not fragmentos:
+                MODELO_SEGUNDOS.observar(
+                    time.perf_counter() - t0,
+                    backend=backend.nombre,
+                    operacion="stream_primer_token",
+                )
+            fragmentos.append(fragmento)
+            yield fragmento
+
+
+async def summarize_day_stream(
+    day_id: int,
+    db: AsyncSession,
+    generar: Callable[[str], AsyncIterator[str]] = generar_stream,
+    forzar: bool = False,
+) -> AsyncIterator[str]:
+    """
+    Variante en streaming de summarize_day_async: prepara el prompt igual y va
+    devolviendo los fragmentos del resumen según los genera el modelo. El texto
+    completo solo se guarda en NewsletterDia.summary si el stream termina bien; si
+    falla (o el consumidor lo abandona) el resumen anterior se conserva. Si el
+    resumen guardado está al día se devuelve entero en un único fragmento.
+
+    Lanza LookupError si el día no existe, ValueError si no hay contenido o la
+    respuesta llega vacía, y propaga los errores del modelo.
+    """
+    day_record = await db.get(
+        NewsletterDia, day_id, options=[selectinload(NewsletterDia.newsletters)]
+    )
+    if not day_record:
+        raise LookupError("Registro diario no encontrado.")
+    modo, prompt, miembros = await _prompt_del_dia_async(day_record, db, forzar)
+    RESUMENES_DIA.inc(modo=modo)
+    if modo == "vigente":
+        await _marcar_vigente(db, day_record)
+        yield day_record.summary
+        return
+    if prompt is None:
+        raise ValueError("No hay contenido para resumir en este día.")
+    partes = []
+    async for fragmento in generar(prompt):
+        partes.append(fragmento)
+        yield fragmento
+    summary_text = "".join(partes)
+    if not summary_text.strip():
+        raise ValueError("El modelo devolvió una respuesta vacía.")
+    await _guardar_resumen_dia(db, day_record, summary_text, miembros)
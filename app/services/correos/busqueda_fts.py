@@ -0,0 +1,214 @@
+import logging
+import re
+
+from sqlalchemy import DDL, DateTime, Float, Integer, String, bindparam, event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
+from app.models.newsletter import NewsletterBody
+
+logger = logging.getLogger(__name__)
+
+# Vista con el texto a indexar: el cuerpo se descomprime con la función SQL
+# descomprimir_cuerpo (registrada en cada conexión, ver app.core.database).
+CREAR_VISTA_FTS = """
+CREATE VIEW IF NOT EXISTS newsletters_fts_contenido AS
+SELECT n.id AS id,
+       n.subject AS subject,
+       coalesce(n.author, '') AS author,
+       coalesce(descomprimir_cuerpo(b.content), '') AS body,
+       coalesce(n.summary, '') AS summary
+FROM newsletters n
+LEFT JOIN newsletter_bodies b ON b.newsletter_id = n.id
+"""
+
+# Tabla FTS5 de contenido externo: solo guarda el índice y lee el texto de la vista
+# cuando lo necesita (snippet), así el cuerpo no se almacena dos veces. El rowid es el
+# id de la newsletter. Se quitan tildes para que "informacion" encuentre "información".
+CREAR_FTS = """
+CREATE VIRTUAL TABLE IF NOT EXISTS newsletters_fts USING fts5(
+    subject, author, body, summary,
+    content = 'newsletters_fts_contenido',
+    content_rowid = 'id',
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+"""
+
+# Pesos BM25 por columna: subject, author, body, summary
+PESOS_BM25 = "10.0, 5.0, 1.0, 3.0"
+
+TERMINO_RE = re.compile(r"\w+", re.UNICODE)
+
+# En BD nuevas el índice se crea junto con las tablas (create_all); la vista necesita
+# que ya existan tanto 'newsletters' como 'newsletter_bodies'.
+for _ddl in (CREAR_VISTA_FTS, CREAR_FTS):
+    event.listen(
+        NewsletterBody.__table__, "after_create", DDL(_ddl).execute_if(dialect="sqlite")
+    )
+
+
+def _es_sqlite(bind) -> bool:
+    return bind.dialect.name == "sqlite"
+
+
+def crear_indice_fts(engine: Engine) -> bool:
+    """
+    Crea la vista y la tabla virtual FTS5 si no existen (solo en SQLite). Si la tabla
+    FTS es la antigua, con copia propia del texto, se sustituye; si el índice está
+    vacío y ya hay newsletters (BD anteriores al índice), se reconstruye.
+    Devuelve True si el índice se ha reconstruido.
+    """
+    if not _es_sqlite(engine):
+        return False
+    with engine.begin() as conn:
+        definicion = conn.execute(
+            text("SELECT sql FROM sqlite_master WHERE name = 'newsletters_fts'")
+        ).scalar()
+        antigua = definicion is not None and "content_rowid" not in definicion.lower()
+        if antigua:
+            conn.execute(text("DROP TABLE newsletters_fts"))
+        conn.execute(text(CREAR_VISTA_FTS))
+        conn.execute(text(CREAR_FTS))
+        # newsletters_fts_docsize (tabla interna de FTS5) tiene una fila por entrada
+        sin_indexar = conn.execute(
+            text(
+                "SELECT EXISTS (SELECT 1 FROM newsletters) "
+                "AND NOT EXISTS (SELECT 1 FROM newsletters_fts_docsize)"
+            )
+        ).scalar()
+        if sin_indexar:
+            logger.info("Índice FTS vacío o antiguo; reconstruyendo...")
+            conn.execute(
+                text("INSERT INTO newsletters_fts (newsletters_fts) VALUES ('rebuild')")
+            )
+    return bool(sin_indexar)
+
+
+def indexar_newsletters(db: Session, ids: list[int]):
+    """
+    Añade al índice FTS las newsletters recién insertadas (ya volcadas con flush, con
+    su cuerpo), dentro de la transacción de `db`, de modo que el índice y la tabla
+    nunca divergen. El texto se toma de la vista de contenido en una sola sentencia.
+    """
+    if not ids or not _es_sqlite(db.get_bind()):
+        return
+    db.execute(
+        text(
+            "INSERT INTO newsletters_fts (rowid, subject, author, body, summary) "
+            "SELECT id, subject, author, body, summary "
+            "FROM newsletters_fts_contenido WHERE id IN :ids"
+        ).bindparams(bindparam("ids", expanding=True)),
+        {"ids": list(ids)},
+    )
+
+
+def actualizar_resumen_fts(
+    db: Session, newsletter_id: int, anterior: str | None, summary: str | None
+):
+    """
+    Actualiza el resumen de la entrada FTS de una newsletter. En una tabla de
+    contenido externo hay que borrar la entrada con los valores que se indexaron
+    (`anterior` es el resumen previo), si está indexada, y volver a insertarla con
+    el nuevo.
+    """
+    if not _es_sqlite(db.get_bind()):
+        return
+    parametros = {"id": newsletter_id}
+    db.execute(
+        text(
+            "INSERT INTO newsletters_fts "
+            "(newsletters_fts, rowid, subject, author, body, summary) "
+            "SELECT 'delete', id, subject, author, body, :anterior "
+            "FROM newsletters_fts_contenido WHERE id = :id "
+            # Borrar una entrada que no está en el índice lo corrompe
+            "AND id IN (SELECT id FROM newsletters_fts_docsize)"
+        ),
+        {**parametros, "anterior": anterior or ""},
+    )
+    db.execute(
+        text(
+            "INSERT INTO newsletters_fts (rowid, subject, author, body, summary) "
+            "SELECT id, subject, author, body, :summary "
+            "FROM newsletters_fts_contenido WHERE id = :id"
+        ),
+        {**parametros, "summary": summary or ""},
+    )
+
+
+def consulta_fts(q: str) -> str:
+    """
+    Convierte el texto del usuario en una consulta FTS5 segura: cada palabra se busca
+    como término literal (AND implícito) y la última admite prefijos.
+    """
+    terminos = TERMINO_RE.findall(q)
+    if not terminos:
+        return ""
+    partes = [f'"{termino}"' for termino in terminos]
+    partes[-1] += "*"
+    return " ".join(partes)
+
+
+def buscar_newsletters(db: Session, q: str, limit: int, offset: int) -> list[dict]:
+    """
+    Busca newsletters por palabras clave, ordenadas por relevancia BM25 y con un
+    fragmento resaltado (<mark>) del texto que coincide.
+    """
+    consulta = consulta_fts(q)
+    if not consulta:
+        return []
+    rows = db.execute(
+        text(f"""
+            SELECT n.id, n.subject, n.author, n.received_at,
+                   bm25(newsletters_fts, {PESOS_BM25}) AS score,
+                   snippet(newsletters_fts, -1, '<mark>', '</mark>', '…', 24) AS snippet
+            FROM newsletters_fts
+            JOIN newsletters n ON n.id = newsletters_fts.rowid
+            WHERE newsletters_fts MATCH :q
+            ORDER BY score
+            LIMIT :limit OFFSET :offset
+            """).columns(
+            id=Integer,
+            subject=String,
+            author=String,
+            received_at=DateTime,
+            score=Float,
+            snippet=String,
+        ),
+        {"q": consulta, "limit": limit, "offset": offset},
+    )
+    return [
+        {
+            "id": row.id,
+            "subject": row.subject,
+            "author": row.author,
+            "received_at": row.received_at.isoformat(),
+            "score": row.score,
+            "snippet": row.snippet,
+        }
+        for row in rows
+    ]
+
+
+def reconstruir_indice_fts():
+    """
+    Vuelve a generar el índice FTS completo a partir de la tabla de newsletters.
+    Necesario una vez en bases de datos creadas antes de existir el índice.
+    """
+    db = SessionLocal()
+    try:
+        crear_indice_fts(db.get_bind())
+        db.execute(
+            text("INSERT INTO newsletters_fts (newsletters_fts) VALUES ('rebuild')")
+        )
+        db.execute(
+            text("INSERT INTO newsletters_fts (newsletters_fts) VALUES ('optimize')")
+        )
+        total = db.execute(text("SELECT count(*) FROM newsletters_fts")).scalar()
+        db.commit()
+        return total
+    except Exception as e:
+        db.rollback()
+        raise e
+    finally:
+        db.close()
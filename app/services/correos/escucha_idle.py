@@ -0,0 +1,181 @@
+import imaplib
+import logging
+import random
+import re
+import select
+import threading
+import time
+from typing import Callable
+
+from app.core.config import (
+    IMAP_IDLE_TIMEOUT,
+    IMAP_POLL_INTERVAL,
+    IMAP_RECONNECT_MAX,
+)
+from app.core.sesion import inicio_sesion
+from app.services.correos.newsletter_mail import sincronizar_carpeta
+
+logger = logging.getLogger(__name__)
+
+# Respuestas no etiquetadas que indican correo nuevo en la carpeta
+NUEVOS_RE = re.compile(rb"^\* \d+ (EXISTS|RECENT)", re.IGNORECASE)
+
+
+def _hay_datos(mail: imaplib.IMAP4, espera: float) -> bool:
+    """
+    Indica si hay una línea del servidor lista para leer, esperando como mucho
+    `espera` segundos. imaplib lee a través de un búfer: antes de esperar en el socket
+    se comprueba (sin bloquear) si ya quedan datos en él.
+    """
+    timeout = mail.sock.gettimeout()
+    mail.sock.setblocking(False)
+    try:
+        pendiente = mail.file.peek(1)
+    finally:
+        mail.sock.settimeout(timeout)
+    if pendiente:
+        return True
+    listo, _, _ = select.select([mail.sock], [], [], espera)
+    return bool(listo)
+
+
+def _leer_linea(mail: imaplib.IMAP4) -> bytes:
+    linea = mail.readline()
+    if not linea:
+        raise imaplib.IMAP4.abort("El servidor ha cerrado la conexión.")
+    return linea
+
+
+def esperar_idle(
+    mail: imaplib.IMAP4, duracion: float, parar: threading.Event, tick: float = 1.0
+) -> bool:
+    """
+    Ejecuta un ciclo IDLE (RFC 2177) sobre la carpeta seleccionada: espera hasta
+    `duracion` segundos a que el servidor anuncie correo nuevo (o a que se active
+    `parar`), termina con DONE y devuelve True si hay correo nuevo.
+    imaplib (Python < 3.14) no implementa IDLE, así que se usa su socket directamente.
+    """
+    tag = mail._new_tag()
+    mail.send(tag + b" IDLE\r\n")
+    nuevos = False
+    linea = _leer_linea(mail)
+    while not linea.startswith(b"+"):
+        if linea.startswith(tag):
+            raise imaplib.IMAP4.error(f"IDLE rechazado: {linea!r}")
+        nuevos = nuevos or bool(NUEVOS_RE.match(linea))
+        linea = _leer_linea(mail)
+
+    limite = time.monotonic() + duracion
+    while not nuevos and not parar.is_set():
+        restante = limite - time.monotonic()
+        if restante <= 0:
+            break
+        if not _hay_datos(mail, min(tick, restante)):
+            continue
+        linea = _leer_linea(mail)
+        if linea.upper().startswith(b"* BYE"):
+            raise imaplib.IMAP4.abort(f"Desconectado por el servidor: {linea!r}")
+        nuevos = bool(NUEVOS_RE.match(linea))
+
+    mail.send(b"DONE\r\n")
+    linea = _leer_linea(mail)
+    while not linea.startswith(tag):
+        nuevos = nuevos or bool(NUEVOS_RE.match(linea))
+        linea = _leer_linea(mail)
+    if b" OK" not in linea.upper():
+        raise imaplib.IMAP4.error(f"IDLE terminado con error: {linea!r}")
+    return nuevos
+
+
+class EscuchaIdle:
+    """
+    Escucha en segundo plano de la carpeta IMAP: mantiene una única conexión
+    autenticada, sincroniza lo pendiente al conectar y después espera con IDLE a que
+    lleguen correos, que se ingieren al momento con la misma conexión (sin login ni
+    búsqueda completa en cada consulta). El IDLE se renueva cada `idle_timeout`
+    segundos para no superar el límite del servidor. Si la conexión falla, se
+    reconecta con espera exponencial (con jitter) de hasta `reconexion_max` segundos.
+    """
+
+    def __init__(
+        self,
+        conectar: Callable[[], imaplib.IMAP4] = inicio_sesion,
+        sincronizar: Callable[[imaplib.IMAP4], object] = sincronizar_carpeta,
+        idle_timeout: float = IMAP_IDLE_TIMEOUT,
+        poll_interval: float = IMAP_POLL_INTERVAL,
+        reconexion_max: float = IMAP_RECONNECT_MAX,
+        reconexion_inicial: float = 1.0,
+    ):
+        self._conectar = conectar
+        self._sincronizar = sincronizar
+        self.idle_timeout = idle_timeout
+        self.poll_interval = poll_interval
+        self.reconexion_max = reconexion_max
+        self.reconexion_inicial = reconexion_inicial
+        self._parar = threading.Event()
+        self._hilo = None
+        self.conexiones = 0
+        self.sincronizaciones = 0
+
+    def iniciar(self):
+        if self._hilo and self._hilo.is_alive():
+            return
+        self._parar.clear()
+        self._hilo = threading.Thread(target=self._bucle, name="imap-idle", daemon=True)
+        self._hilo.start()
+
+    def detener(self, timeout: float | None = 5.0):
+        self._parar.set()
+        if self._hilo:
+            self._hilo.join(timeout)
+
+    def _bucle(self):
+        espera = self.reconexion_inicial
+        while not self._parar.is_set():
+            mail = None
+            try:
+                mail = self._conectar()
+                self.conexiones += 1
+                self._sincronizar(mail)  # Lo que llegó mientras no había conexión
+                self.sincronizaciones += 1
+                espera = self.reconexion_inicial
+                self._escuchar(mail)
+            except Exception as e:
+                if self._parar.is_set():
+                    break
+                # Jitter para no reconectar a la vez que otros clientes del servidor
+                pausa = espera * random.uniform(0.5, 1.0)
+                logger.warning(
+                    f"Escucha IMAP interrumpida ({e}); reconectando en {pausa:.1f}s"
+                )
+                self._parar.wait(pausa)
+                espera = min(self.reconexion_max, espera * 2)
+            finally:
+                if mail is not None:
+                    self._cerrar(mail)
+
+    def _escuchar(self, mail: imaplib.IMAP4):
+        admite_idle = "IDLE" in mail.capabilities
+        if not admite_idle:
+            logger.warning(
+                "El servidor IMAP no admite IDLE; se consultará cada "
+                f"{self.poll_interval:g}s"
+            )
+        while not self._parar.is_set():
+            if admite_idle:
+                nuevos = esperar_idle(mail, self.idle_timeout, self._parar)
+            else:
+                nuevos = not self._parar.wait(self.poll_interval)
+            if nuevos:
+                self._sincronizar(mail)
+                self.sincronizaciones += 1
+
+    @staticmethod
+    def _cerrar(mail: imaplib.IMAP4):
+        try:
+            mail.logout()
+        except Exception:
+            try:
+                mail.shutdown()
+            except Exception:
+                pass
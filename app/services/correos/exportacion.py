@@ -0,0 +1,141 @@
+import json
+import zlib
+from collections.abc import Iterator
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import and_, or_, select
+
+from app.core.compresion import descomprimir
+from app.core.config import EXPORT_BATCH_SIZE
+from app.core.cursores import crear_cursor
+from app.core.database import SessionLocal
+from app.core.metricas import BD_SEGUNDOS
+from app.models.newsletter import (
+    Newsletter,
+    NewsletterBody,
+    Sender,
+    newsletter_dia_rel,
+)
+from app.services.correos.newsletter_db import normalizar_email
+
+
+def _consulta(
+    desde: date | None,
+    hasta: date | None,
+    sender_id: int | None,
+    sender: str | None,
+    cuerpos: bool,
+    resumenes: bool,
+    despues_de: tuple[datetime, int] | None,
+):
+    columnas = [
+        Newsletter.id,
+        Newsletter.email_id,
+        newsletter_dia_rel.c.dia_id.label("day_id"),
+        Newsletter.received_at,
+        Newsletter.subject,
+        Newsletter.author,
+        Newsletter.sender_id,
+        Sender.email.label("sender"),
+        Newsletter.summary_status,
+    ]
+    if resumenes:
+        columnas.append(Newsletter.summary)
+    if cuerpos:
+        columnas.append(NewsletterBody.content.label("body"))
+    stmt = (
+        select(*columnas)
+        .outerjoin(
+            newsletter_dia_rel, newsletter_dia_rel.c.newsletter_id == Newsletter.id
+        )
+        .outerjoin(Sender, Sender.id == Newsletter.sender_id)
+        # Orden por el índice de received_at: el cursor (fecha, id) permite reanudar
+        .order_by(Newsletter.received_at, Newsletter.id)
+    )
+    if cuerpos:
+        stmt = stmt.outerjoin(
+            NewsletterBody, NewsletterBody.newsletter_id == Newsletter.id
+        )
+    if desde:
+        stmt = stmt.where(Newsletter.received_at >= datetime.combine(desde, time.min))
+    if hasta:
+        stmt = stmt.where(
+            Newsletter.received_at
+            < datetime.combine(hasta + timedelta(days=1), time.min)
+        )
+    if sender_id is not None:
+        stmt = stmt.where(Newsletter.sender_id == sender_id)
+    if sender:
+        stmt = stmt.where(Sender.email == normalizar_email(sender))
+    if despues_de:
+        fecha, newsletter_id = despues_de
+        stmt = stmt.where(
+            or_(
+                Newsletter.received_at > fecha,
+                and_(Newsletter.received_at == fecha, Newsletter.id > newsletter_id),
+            )
+        )
+    return stmt
+
+
+def exportar_newsletters(
+    desde: date | None = None,
+    hasta: date | None = None,
+    sender_id: int | None = None,
+    sender: str | None = None,
+    cuerpos: bool = False,
+    resumenes: bool = False,
+    despues_de: tuple[datetime, int] | None = None,
+) -> Iterator[dict]:
+    """
+    Recorre las newsletters de la más antigua a la más reciente, filtradas por rango
+    de fechas (`desde`/`hasta`, incluidos) y remitente (`sender_id` o dirección
+    `sender`), con su cuerpo y su resumen solo si se piden. Las filas se leen de
+    EXPORT_BATCH_SIZE en EXPORT_BATCH_SIZE (yield_per), así que la memoria no
+    depende del tamaño del archivo. Cada fila lleva su `cursor`: pasarlo como
+    `despues_de` reanuda la exportación justo después.
+    """
+    db = SessionLocal()
+    try:
+        stmt = _consulta(
+            desde, hasta, sender_id, sender, cuerpos, resumenes, despues_de
+        ).execution_options(yield_per=EXPORT_BATCH_SIZE)
+        with BD_SEGUNDOS.cronometrar(operacion="exportar_consulta"):
+            filas = db.execute(stmt)
+            claves = list(filas.keys())
+        for fila in filas:
+            # Construir el dict de una vez es mucho más rápido que leer cada atributo
+            newsletter = dict(zip(claves, fila))
+            newsletter["received_at"] = fila.received_at.isoformat()
+            if cuerpos:
+                newsletter["body"] = descomprimir(fila.body) if fila.body else ""
+            newsletter["cursor"] = crear_cursor(fila.received_at, fila.id)
+            yield newsletter
+    finally:
+        db.close()
+
+
+def lineas_ndjson(
+    newsletters: Iterator[dict], gzip: bool = False, por_bloque: int = 100
+) -> Iterator[bytes]:
+    """
+    Serializa las newsletters como NDJSON (un objeto JSON por línea) en bloques de
+    `por_bloque` líneas, comprimidos en un único flujo gzip si se pide.
+    """
+    compresor = zlib.compressobj(wbits=31) if gzip else None  # 31: formato gzip
+
+    def bloque_a_bytes(lineas: list[str]) -> bytes:
+        datos = ("\n".join(lineas) + "\n").encode("utf-8")
+        return compresor.compress(datos) if compresor else datos
+
+    bloque = []
+    for newsletter in newsletters:
+        bloque.append(json.dumps(newsletter, ensure_ascii=False))
+        if len(bloque) >= por_bloque:
+            if datos := bloque_a_bytes(bloque):
+                yield datos
+            bloque = []
+    if bloque and (datos := bloque_a_bytes(bloque)):
+        yield datos
+    if compresor:
+        yield compresor.flush()
@@ -0,0 +1,156 @@
+import logging
+import re
+from email.message import Message
+from html.parser import HTMLParser
+
+from app.core.config import BODY_MAX_CHARS
+
+logger = logging.getLogger(__name__)
+
+# Etiquetas cuyo contenido nunca es texto visible
+ETIQUETAS_IGNORADAS = {
+    "style",
+    "script",
+    "head",
+    "title",
+    "noscript",
+    "template",
+    "svg",
+}
+
+# Etiquetas de bloque: separan líneas en el texto extraído
+ETIQUETAS_BLOQUE = {
+    "address", "article", "aside", "blockquote", "br", "dd", "div", "dl", "dt",
+    "fieldset", "figcaption", "figure", "footer", "form", "h1", "h2", "h3", "h4",
+    "h5", "h6", "header", "hr", "li", "main", "nav", "ol", "p", "pre", "section",
+    "table", "td", "th", "tr", "ul",
+}  # fmt: skip
+
+ESPACIOS_RE = re.compile(r"[ \t\r\f\v\u00a0]+")
+
+
+class _ExtractorTexto(HTMLParser):
+    """
+    Conversor HTML -> texto en streaming (sin construir el árbol como BeautifulSoup).
+    Descarta <style>, <script>, etc. e imágenes (incluidos los píxeles de
+    seguimiento) y deja de acumular texto al llegar a `max_chars`.
+    """
+
+    def __init__(self, max_chars: int):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.partes = []
+        self.longitud = 0
+        self._ignorando = 0
+
+    @property
+    def lleno(self) -> bool:
+        return self.longitud >= self.max_chars
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ETIQUETAS_IGNORADAS:
+            self._ignorando += 1
+        elif tag in ETIQUETAS_BLOQUE:
+            self.partes.append("\n")
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in ETIQUETAS_BLOQUE:
+            self.partes.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in ETIQUETAS_IGNORADAS:
+            self._ignorando = max(0, self._ignorando - 1)
+        elif tag in ETIQUETAS_BLOQUE:
+            self.partes.append("\n")
+
+    def handle_data(self, data):
+        if self._ignorando or self.lleno:
+            return
+        self.partes.append(data)
+        self.longitud += len(data)
+
+    def texto(self) -> str:
+        return "".join(self.partes)
+
+
+def normalizar_texto(texto: str, max_chars: int = BODY_MAX_CHARS) -> str:
+    """
+    Colapsa espacios, elimina líneas vacías y recorta a `max_chars` caracteres
+    (equivalente a get_text(separator="\\n", strip=True)).
+    """
+    lineas = (ESPACIOS_RE.sub(" ", linea).strip() for linea in texto.splitlines())
+    return "\n".join(linea for linea in lineas if linea)[:max_chars]
+
+
+def html_a_texto(html: str, max_chars: int = BODY_MAX_CHARS) -> str:
+    """
+    Extrae el texto visible de un HTML. La entrada se procesa por bloques y se deja de
+    leer en cuanto se ha reunido suficiente texto.
+    """
+    extractor = _ExtractorTexto(max_chars)
+    bloque = 64 * 1024
+    for inicio in range(0, len(html), bloque):
+        extractor.feed(html[inicio : inicio + bloque])
+        if extractor.lleno:
+            break
+    extractor.close()
+    return normalizar_texto(extractor.texto(), max_chars)
+
+
+def _decodificar(part: Message) -> str:
+    payload = part.get_payload(decode=True)
+    if not payload:
+        return ""
+    try:
+        return payload.decode(part.get_content_charset() or "utf-8", errors="replace")
+    except LookupError:
+        # Charset desconocido declarado en la cabecera
+        return payload.decode("utf-8", errors="replace")
+
+
+def _es_adjunto(part: Message) -> bool:
+    return "attachment" in str(part.get("Content-Disposition", "")).lower()
+
+
+def extraer_cuerpo(msg: Message, max_chars: int = BODY_MAX_CHARS) -> str:
+    """
+    Devuelve el texto del cuerpo de un correo, priorizando text/plain sobre text/html
+    aunque la parte HTML aparezca antes (multipart/alternative en cualquier orden).
+    Solo se decodifican las partes elegidas; los adjuntos nunca se decodifican.
+    El resultado se limita a `max_chars` caracteres.
+    """
+    if not msg.is_multipart():
+        try:
+            contenido = _decodificar(msg)
+        except Exception as ex:
+            logger.error(f"Error decodificando payload: {ex}")
+            return ""
+        if msg.get_content_type() == "text/html" or "<html" in contenido[:4096].lower():
+            return html_a_texto(contenido, max_chars)
+        return contenido[:max_chars].strip()
+
+    plano = html = None
+    for part in msg.walk():
+        if part.is_multipart() or _es_adjunto(part):
+            continue
+        content_type = part.get_content_type()
+        if content_type == "text/plain" and plano is None:
+            plano = part
+        elif content_type == "text/html" and html is None:
+            html = part
+        if plano is not None and html is not None:
+            break
+
+    if plano is not None:
+        try:
+            texto = _decodificar(plano)[:max_chars].strip()
+            if texto:
+                return texto
+        except Exception as ex:
+            logger.error(f"Error decodificando texto plano: {ex}")
+    if html is not None:
+        try:
+            return html_a_texto(_decodificar(html), max_chars)
+        except Exception as ex:
+            logger.error(f"Error decodificando HTML: {ex}")
+    return ""
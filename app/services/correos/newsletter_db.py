@@ -1,9 +1,26 @@
-from datetime import datetime, time
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from email.utils import parseaddr
 
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from app.core.config import SUMMARY_MAX_ATTEMPTS, SUMMARY_RETRY_BASE, SUMMARY_RETRY_MAX
 from app.core.database import SessionLocal
-from app.models.newsletter import Newsletter, NewsletterDia
+from app.core.metricas import BD_SEGUNDOS
+from app.core.version_datos import incrementar_version
+from app.models.imap import ImapCheckpoint
+from app.models.newsletter import Newsletter, NewsletterDia, Sender, newsletter_dia_rel
+from app.services.ai.resumen_newsletter import ERROR_RESUMEN
+from app.services.correos.busqueda_fts import (
+    actualizar_resumen_fts,
+    indexar_newsletters,
+)
+from app.services.correos.similitud import firma_cuerpo, indexar_firmas
 
 
+@BD_SEGUNDOS.cronometrar(operacion="save_newsletter_to_db")
 def save_newsletter_to_db(
     email_id: str,
     subject: str,
@@ -11,9 +28,12 @@ def save_newsletter_to_db(
     received_at: datetime,
     summary: str,
     author: str,
+    sender_email: str | None = None,
+    sender_name: str | None = None,
 ) -> Newsletter:
     """
     Guarda la newsletter en la tabla 'newsletters'. Si ya existe, devuelve el registro existente.
+    Si se indica el remitente, se actualiza su registro en 'senders' en la misma transacción.
     """
     db = SessionLocal()
     existing = db.query(Newsletter).filter(Newsletter.email_id == email_id).first()
@@ -26,16 +46,172 @@ def save_newsletter_to_db(
         subject=subject,
         body=body,
         received_at=received_at,
-        summary=summary,
         author=author,
+        sender_id=upsert_sender(db, sender_email, sender_name, received_at),
+        **columnas_resumen(summary),
+        minhash=firma_cuerpo(body, sender_email),
     )
     db.add(new_newsletter)
+    db.flush()
+    indexar_newsletters(db, [new_newsletter.id])
+    indexar_firmas(db, {new_newsletter.id: new_newsletter.minhash})
+    incrementar_version(db)
     db.commit()
     db.refresh(new_newsletter)
     db.close()
     return new_newsletter
 
 
+def espera_reintento(intentos: int) -> timedelta:
+    """
+    Espera exponencial antes de reintentar un resumen que ha fallado `intentos` veces:
+    SUMMARY_RETRY_BASE, el doble, el cuádruple... hasta SUMMARY_RETRY_MAX segundos.
+    """
+    return timedelta(
+        seconds=min(SUMMARY_RETRY_BASE * 2 ** max(0, intentos - 1), SUMMARY_RETRY_MAX)
+    )
+
+
+def columnas_resumen(
+    summary: str | None,
+    error: str | None = None,
+    intentos_previos: int = 0,
+    ahora: datetime | None = None,
+) -> dict:
+    """
+    Columnas del resumen de una newsletter tras un intento (`summary`) o sin él
+    (None, p. ej. si la ingesta no espera al modelo). Un resumen fallido
+    (ERROR_RESUMEN o `error`) no se guarda como texto: queda "failed" con su próximo
+    reintento, o sin reintento si se han agotado los SUMMARY_MAX_ATTEMPTS intentos.
+    """
+    if summary is None and error is None:
+        return {
+            "summary": None,
+            "summary_status": "pending",
+            "summary_attempts": intentos_previos,
+            "summary_next_retry": None,
+            "summary_error": None,
+        }
+    intentos = intentos_previos + 1
+    if summary is not None and summary != ERROR_RESUMEN:
+        return {
+            "summary": summary,
+            "summary_status": "done",
+            "summary_attempts": intentos,
+            "summary_next_retry": None,
+            "summary_error": None,
+        }
+    ahora = ahora or datetime.utcnow()
+    return {
+        "summary": None,
+        "summary_status": "failed",
+        "summary_attempts": intentos,
+        "summary_next_retry": (
+            ahora + espera_reintento(intentos)
+            if intentos < SUMMARY_MAX_ATTEMPTS
+            else None
+        ),
+        "summary_error": error or summary,
+    }
+
+
+def normalizar_email(email: str | None) -> str | None:
+    """
+    Normaliza la dirección (minúsculas, sin espacios). Devuelve None si no es válida.
+    """
+    email = (email or "").strip().lower()
+    return email if "@" in email else None
+
+
+def upsert_sender(
+    db: Session,
+    email: str | None,
+    name: str | None,
+    received_at: datetime,
+    count: int = 1,
+    first_seen: datetime | None = None,
+) -> int | None:
+    """
+    Crea o actualiza el remitente con una única sentencia (INSERT ... ON CONFLICT ...
+    RETURNING), sin consulta previa: suma `count` mensajes, guarda el último nombre
+    visible y amplía el intervalo first_seen/last_seen. Devuelve su id.
+    """
+    email = normalizar_email(email)
+    if not email:
+        return None
+    first_seen = first_seen or received_at
+    stmt = insert(Sender).values(
+        email=email,
+        name=name or None,
+        message_count=count,
+        first_seen=first_seen,
+        last_seen=received_at,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Sender.email],
+        set_={
+            "name": func.coalesce(stmt.excluded.name, Sender.name),
+            "message_count": Sender.message_count + stmt.excluded.message_count,
+            "first_seen": func.min(
+                func.coalesce(Sender.first_seen, stmt.excluded.first_seen),
+                stmt.excluded.first_seen,
+            ),
+            "last_seen": func.max(
+                func.coalesce(Sender.last_seen, stmt.excluded.last_seen),
+                stmt.excluded.last_seen,
+            ),
+        },
+    ).returning(Sender.id)
+    return db.execute(stmt).scalar_one()
+
+
+@BD_SEGUNDOS.cronometrar(operacion="rellenar_remitentes")
+def rellenar_remitentes() -> int:
+    """
+    Crea los remitentes a partir del campo 'author' de las newsletters que aún no
+    tienen sender_id (BD anteriores a la tabla 'senders'). Devuelve cuántas se asignan.
+    """
+    db = SessionLocal()
+    try:
+        pendientes = (
+            db.query(Newsletter.id, Newsletter.author, Newsletter.received_at)
+            .filter(Newsletter.sender_id.is_(None), Newsletter.author.isnot(None))
+            .order_by(Newsletter.received_at)
+            .all()
+        )
+        por_email = defaultdict(list)
+        for newsletter_id, author, received_at in pendientes:
+            name, email = parseaddr(author)
+            email = normalizar_email(email)
+            if email:
+                por_email[email].append((newsletter_id, name, received_at))
+
+        asignadas = 0
+        for email, filas in por_email.items():
+            sender_id = upsert_sender(
+                db,
+                email,
+                filas[-1][1],
+                filas[-1][2],
+                count=len(filas),
+                first_seen=filas[0][2],
+            )
+            db.query(Newsletter).filter(
+                Newsletter.id.in_([fila[0] for fila in filas])
+            ).update({"sender_id": sender_id}, synchronize_session=False)
+            asignadas += len(filas)
+        if asignadas:
+            incrementar_version(db)
+        db.commit()
+        return asignadas
+    except Exception as e:
+        db.rollback()
+        raise e
+    finally:
+        db.close()
+
+
+@BD_SEGUNDOS.cronometrar(operacion="update_newsletter_summary")
 def update_newsletter_summary(email_id: str, summary: str):
     """
     Actualiza el campo 'resumen' de la newsletter identificada por email_id.
@@ -46,7 +222,11 @@ def update_newsletter_summary(email_id: str, summary: str):
             db.query(Newsletter).filter(Newsletter.email_id == email_id).first()
         )
         if newsletter:
+            actualizar_resumen_fts(db, newsletter.id, newsletter.summary, summary)
             newsletter.summary = summary
+            newsletter.summary_status = "done"
+            newsletter.summary_next_retry = None
+            incrementar_version(db)
             db.commit()
     except Exception as e:
         db.rollback()
@@ -55,27 +235,202 @@ def update_newsletter_summary(email_id: str, summary: str):
         db.close()
 
 
+@BD_SEGUNDOS.cronometrar(operacion="add_newsletter_to_day")
 def add_newsletter_to_day(newsletter_obj: Newsletter, received_at: datetime):
     """
     Agrega la newsletter al registro del día correspondiente en la tabla 'newsletters_dias'.
     Si no existe un registro para ese día, lo crea.
     """
     db = SessionLocal()
-    # Definir el inicio del día (medianoche) a partir de la fecha del email
-    day_start = datetime.combine(received_at.date(), time.min)
+    try:
+        # Definir el inicio del día (medianoche) a partir de la fecha del email
+        day_start = inicio_del_dia(received_at)
+        # Buscar (o crear) el registro de día con esa fecha
+        day_id = asegurar_dias(db, {day_start})[day_start]
 
-    # Buscar si ya existe un registro de día con esa fecha
-    day_record = (
-        db.query(NewsletterDia).filter(NewsletterDia.fecha == day_start).first()
+        # Agregar la newsletter a la relación many-to-many, si aún no está asociada
+        nueva = db.execute(
+            insert(newsletter_dia_rel)
+            .values(newsletter_id=newsletter_obj.id, dia_id=day_id)
+            .on_conflict_do_nothing()
+        ).rowcount
+        if nueva:
+            marcar_dias_pendientes(db, [day_id])
+        incrementar_version(db)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise e
+    finally:
+        db.close()
+
+
+def asegurar_dias(db: Session, fechas: set[datetime]) -> dict[datetime, int]:
+    """
+    Devuelve el id del NewsletterDia de cada fecha, creando los que falten. La
+    creación es INSERT ... ON CONFLICT DO NOTHING sobre el índice único de 'fecha',
+    así que dos escritores concurrentes nunca crean el mismo día dos veces.
+    """
+    if not fechas:
+        return {}
+    db.execute(
+        insert(NewsletterDia).on_conflict_do_nothing(
+            index_elements=[NewsletterDia.fecha]
+        ),
+        [{"fecha": fecha, "summary": None} for fecha in fechas],
+    )
+    return dict(
+        db.query(NewsletterDia.fecha, NewsletterDia.id).filter(
+            NewsletterDia.fecha.in_(list(fechas))
+        )
     )
-    if not day_record:
-        day_record = NewsletterDia(fecha=day_start, summary=None)
-        db.add(day_record)
+
+
+def marcar_dias_pendientes(db: Session, day_ids: list[int]):
+    """
+    Marca los días que ya tienen resumen y reciben newsletters nuevas para que
+    RefrescoDias los actualice (summary_dirty).
+    """
+    db.query(NewsletterDia).filter(
+        NewsletterDia.id.in_(day_ids), NewsletterDia.summary.isnot(None)
+    ).update({"summary_dirty": True}, synchronize_session=False)
+
+
+def inicio_del_dia(received_at: datetime) -> datetime:
+    """
+    Medianoche del día del email: la clave de NewsletterDia.fecha.
+    """
+    return datetime.combine(received_at.date(), time.min)
+
+
+@BD_SEGUNDOS.cronometrar(operacion="save_newsletters_bulk")
+def save_newsletters_bulk(correos: list[tuple[dict, str | None]]) -> list[str]:
+    """
+    Guarda un lote de correos parseados (con su resumen) en una única sesión y una
+    única transacción: una consulta IN para descartar los email_id ya guardados, otra
+    para resolver los NewsletterDia del lote (ver asegurar_dias), un upsert por
+    remitente distinto y las inserciones de newsletters, índices FTS y LSH y
+    relaciones. Los correos sin resumen o cuyo resumen ha fallado quedan en la cola
+    de resúmenes (ver columnas_resumen y ColaResumenes).
+    Devuelve los email_id insertados (los duplicados se ignoran).
+    """
+    if not correos:
+        return []
+    db = SessionLocal()
+    try:
+        email_ids = [correo["email_id"] for correo, _ in correos]
+        existentes = {
+            email_id
+            for (email_id,) in db.query(Newsletter.email_id).filter(
+                Newsletter.email_id.in_(email_ids)
+            )
+        }
+        nuevos = []
+        for correo, summary in correos:
+            if correo["email_id"] in existentes:
+                continue
+            existentes.add(correo["email_id"])  # Duplicados dentro del propio lote
+            nuevos.append((correo, summary))
+        if not nuevos:
+            return []
+
+        dias = asegurar_dias(
+            db, {inicio_del_dia(correo["received_at"]) for correo, _ in nuevos}
+        )
+
+        # Remitentes: un upsert por dirección distinta con los totales del lote
+        por_email = defaultdict(list)
+        for correo, _ in nuevos:
+            email = normalizar_email(correo.get("sender_email"))
+            if email:
+                por_email[email].append(correo)
+        sender_ids = {}
+        for email, del_remitente in por_email.items():
+            del_remitente.sort(key=lambda correo: correo["received_at"])
+            sender_ids[email] = upsert_sender(
+                db,
+                email,
+                del_remitente[-1].get("sender_name"),
+                del_remitente[-1]["received_at"],
+                count=len(del_remitente),
+                first_seen=del_remitente[0]["received_at"],
+            )
+
+        newsletters = [
+            Newsletter(
+                email_id=correo["email_id"],
+                subject=correo["subject"],
+                body=correo["body"],
+                received_at=correo["received_at"],
+                author=correo["author"],
+                sender_id=sender_ids.get(normalizar_email(correo.get("sender_email"))),
+                # La ingesta ya la calcula al buscar casi duplicados
+                minhash=correo.get("minhash")
+                or firma_cuerpo(correo["body"], correo.get("sender_email")),
+                **columnas_resumen(summary, correo.get("summary_error")),
+            )
+            for correo, summary in nuevos
+        ]
+        db.add_all(newsletters)
+        db.flush()
+
+        indexar_newsletters(db, [n.id for n in newsletters])
+        indexar_firmas(db, {n.id: n.minhash for n in newsletters})
+        db.execute(
+            newsletter_dia_rel.insert(),
+            [
+                {
+                    "newsletter_id": n.id,
+                    "dia_id": dias[inicio_del_dia(correo["received_at"])],
+                }
+                for n, (correo, _) in zip(newsletters, nuevos)
+            ],
+        )
+        marcar_dias_pendientes(db, list(dias.values()))
+        incrementar_version(db)
         db.commit()
-        db.refresh(day_record)
+        return [n.email_id for n in newsletters]
+    except Exception as e:
+        db.rollback()
+        raise e
+    finally:
+        db.close()
+
+
+@BD_SEGUNDOS.cronometrar(operacion="get_imap_checkpoint")
+def get_imap_checkpoint(folder: str) -> ImapCheckpoint | None:
+    """
+    Devuelve el punto de control (UIDVALIDITY + último UID) de la carpeta, si existe.
+    """
+    db = SessionLocal()
+    try:
+        return db.query(ImapCheckpoint).filter(ImapCheckpoint.folder == folder).first()
+    finally:
+        db.close()
+
 
-    # Agregar la newsletter a la relación many-to-many, si aún no está asociada
-    if newsletter_obj not in day_record.newsletters:
-        day_record.newsletters.append(newsletter_obj)
+@BD_SEGUNDOS.cronometrar(operacion="save_imap_checkpoint")
+def save_imap_checkpoint(folder: str, uidvalidity: int, last_uid: int):
+    """
+    Guarda el punto de control de la carpeta. Si la UIDVALIDITY cambia, el último UID
+    se reinicia; si no, solo avanza (nunca retrocede).
+    """
+    db = SessionLocal()
+    try:
+        checkpoint = (
+            db.query(ImapCheckpoint).filter(ImapCheckpoint.folder == folder).first()
+        )
+        if not checkpoint:
+            checkpoint = ImapCheckpoint(folder=folder, uidvalidity=uidvalidity)
+            db.add(checkpoint)
+        elif checkpoint.uidvalidity != uidvalidity:
+            checkpoint.uidvalidity = uidvalidity
+            checkpoint.last_uid = 0
+        checkpoint.last_uid = max(checkpoint.last_uid or 0, last_uid)
+        checkpoint.updated_at = datetime.utcnow()
         db.commit()
-    db.close()
+    except Exception as e:
+        db.rollback()
+        raise e
+    finally:
+        db.close()
@@ -1,179 +1,290 @@
 import email
 import imaplib
 import logging
+import re
+import threading
 from datetime import datetime
 from email.header import decode_header
 from email.utils import parseaddr, parsedate_to_datetime
+from functools import partial
+from typing import Callable
 from zoneinfo import ZoneInfo
 
-from bs4 import BeautifulSoup
 from fastapi import HTTPException
 
-from app.core.config import FOLDER
+from app.core.config import FOLDER, IMAP_FETCH_BATCH, SUMMARY_QUEUE_ON_INGEST
+from app.core.metricas import BYTES, ERRORES, ETAPA_SEGUNDOS
 from app.core.sesion import inicio_sesion
-from app.services.ai.resumen_newsletter import summarize_newsletter
+from app.services.ai.backends import obtener_backend
+from app.services.ai.preprocesado import preparar_correo
+from app.services.ai.resumen_newsletter import (
+    resumen_de_casi_duplicado,
+    summarize_newsletter,
+    summarize_newsletters,
+)
+from app.services.correos.extraccion import extraer_cuerpo
 from app.services.correos.newsletter_db import (
-    add_newsletter_to_day,
-    save_newsletter_to_db,
+    get_imap_checkpoint,
+    save_imap_checkpoint,
 )
+from app.services.correos.pipeline import PipelineIngesta
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def newsletter_no_leidas():
+UID_RE = re.compile(rb"UID (\d+)")
+
+
+def _respuesta_numerica(mail, nombre: str) -> int | None:
     """
-    Conecta a Proton Bridge mediante IMAP, procesa los correos no leídos y
-    guarda su contenido en la BD (Newsletter y NewsletterDia).
-    Luego, genera automáticamente un resumen y actualiza la BD.
-    Devuelve una lista con los correos procesados.
+    Lee una respuesta no etiquetada numérica (p. ej. UIDVALIDITY o UIDNEXT) que el
+    servidor envía al hacer SELECT, sin coste de ida y vuelta adicional.
     """
-    try:
-        mail = inicio_sesion()
-        mail.select(mailbox=FOLDER)
+    _, data = mail.response(nombre)
+    if data and data[0]:
+        try:
+            return int(data[0])
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+def _conjunto_uids(uids: list[int]) -> str:
+    """
+    Compacta una lista de UIDs en un conjunto IMAP con rangos (p. ej. "3:7,9,12:13").
+    """
+    rangos = []
+    inicio = fin = None
+    for uid in sorted(uids):
+        if inicio is None:
+            inicio = fin = uid
+        elif uid == fin + 1:
+            fin = uid
+        else:
+            rangos.append(f"{inicio}:{fin}" if inicio != fin else str(inicio))
+            inicio = fin = uid
+    if inicio is not None:
+        rangos.append(f"{inicio}:{fin}" if inicio != fin else str(inicio))
+    return ",".join(rangos)
+
+
+def _uids_pendientes(mail, checkpoint, uidvalidity: int) -> list[int]:
+    """
+    Devuelve los UIDs a sincronizar. Con un punto de control válido se piden solo los
+    UIDs posteriores al último procesado; en la primera sincronización (o si la
+    UIDVALIDITY ha cambiado) se usan los correos no leídos.
+    """
+    if checkpoint and checkpoint.uidvalidity == uidvalidity:
+        criterio = f"UID {checkpoint.last_uid + 1}:*"
+        ultimo_uid = checkpoint.last_uid
+    else:
+        criterio = "UNSEEN"
+        ultimo_uid = 0
+
+    status, data = mail.uid("SEARCH", None, criterio)
+    if status != "OK":
+        raise Exception("No se pudieron buscar los correos pendientes.")
+
+    # "n:*" siempre devuelve al menos el último mensaje, aunque su UID sea menor que n
+    return sorted(int(uid) for uid in data[0].split() if int(uid) > ultimo_uid)
+
+
+def _parsear_correo(raw_email: bytes) -> dict:
+    """
+    Extrae asunto, autor, cuerpo y fecha de un correo en formato RFC822.
+    """
+    msg = email.message_from_bytes(raw_email)
+
+    # Decodificar el asunto
+    subject_raw = msg.get("Subject", "Sin Asunto")
+    subject_tuple = decode_header(subject_raw)[0]
+    subject = subject_tuple[0]
+    encoding = subject_tuple[1]
+    if isinstance(subject, bytes):
+        subject = subject.decode(encoding or "utf-8", errors="replace")
+
+    # Extraer el remitente (autor) del email
+    sender_name, sender_email = parseaddr(msg.get("From", "Desconocido"))
+    if sender_name:
+        sender_name, sender_encoding = decode_header(sender_name)[0]
+        if isinstance(sender_name, bytes):
+            sender_name = sender_name.decode(
+                sender_encoding or "utf-8", errors="replace"
+            )
+
+    author = f"{sender_name} <{sender_email}>" if sender_email else "Desconocido"
+
+    # Extraer el cuerpo del correo (priorizando texto plano sobre HTML)
+    with ETAPA_SEGUNDOS.cronometrar(etapa="extraccion_cuerpo"):
+        body = extraer_cuerpo(msg)
+    BYTES.inc(len(body), tipo="cuerpo")
 
-        status, ids = mail.search(None, "UNSEEN")
+    # Obtener la fecha a partir del header "Date" y convertir a hora local de Madrid
+    date_header = msg.get("Date")
+    if date_header:
+        try:
+            received_at = parsedate_to_datetime(date_header)
+            received_at = received_at.astimezone(ZoneInfo("Europe/Madrid"))
+        except Exception as ex:
+            logger.error(f"Error parseando fecha del email: {ex}")
+            received_at = (
+                datetime.utcnow()
+                .replace(tzinfo=ZoneInfo("UTC"))
+                .astimezone(ZoneInfo("Europe/Madrid"))
+            )
+    else:
+        received_at = (
+            datetime.utcnow()
+            .replace(tzinfo=ZoneInfo("UTC"))
+            .astimezone(ZoneInfo("Europe/Madrid"))
+        )
+
+    return {
+        "subject": subject,
+        "author": author,
+        "sender_email": sender_email or None,
+        "sender_name": sender_name or None,
+        "body": body,
+        "received_at": received_at,
+    }
+
+
+# Una sola sincronización a la vez en el proceso (jobs manuales y escucha IDLE)
+_lock_sincronizacion = threading.Lock()
+
+
+@ETAPA_SEGUNDOS.cronometrar(etapa="sincronizacion")
+def sincronizar_carpeta(
+    mail: imaplib.IMAP4,
+    progreso: Callable[[dict], None] | None = None,
+    summarizer: Callable[[str], str] | None = None,
+) -> list[dict]:
+    """
+    Sincroniza de forma incremental los correos nuevos de la carpeta usando una
+    conexión IMAP ya autenticada (no inicia ni cierra sesión), guardando su contenido
+    en la BD (Newsletter y NewsletterDia).
+    Los correos se piden por UID en lotes de IMAP_FETCH_BATCH y el punto de control
+    (UIDVALIDITY + último UID) se guarda tras cada lote.
+    Antes de resumirlo, cada cuerpo se preprocesa (ver preparar_contenido) y, si es
+    casi duplicado de una newsletter guardada, se reutiliza su resumen (ver
+    resumen_de_casi_duplicado). Los resúmenes se generan en paralelo mientras se
+    descargan los siguientes lotes (ver PipelineIngesta) y se guardan en la BD a
+    medida que terminan, con el backend configurado y tantas newsletters por petición
+    como admita (SUMMARY_BATCH_SIZE); un `summarizer` propio las resume de una en una.
+    Los resúmenes que fallan quedan en la cola de resúmenes (ver ColaResumenes) y,
+    con SUMMARY_QUEUE_ON_INGEST, todos se dejan a la cola y la ingesta no espera al
+    modelo.
+    Devuelve una lista con los correos procesados.
+    """
+    with _lock_sincronizacion:
+        status, _ = mail.select(mailbox=FOLDER)
         if status != "OK":
-            raise Exception("No se pudieron buscar los correos no leídos.")
-
-        newsletter_ids = ids[0].split()
-        total_correos = len(newsletter_ids)
-        logger.info(f"Total de correos no leídos: {total_correos}")
-
-        newsletters_list = []
-        for msg_id in newsletter_ids:
-            status, msg_data = mail.fetch(msg_id, "(RFC822)")
-            if status != "OK":
-                logger.warning(
-                    f"No se pudo obtener el correo con ID {msg_id.decode()}."
-                )
-                continue
-
-            for response_part in msg_data:
-                if not isinstance(response_part, tuple):
-                    continue
-
-                msg = email.message_from_bytes(response_part[1])
-
-                # Decodificar el asunto
-                subject_raw = msg.get("Subject", "Sin Asunto")
-                subject_tuple = decode_header(subject_raw)[0]
-                subject = subject_tuple[0]
-                encoding = subject_tuple[1]
-                if isinstance(subject, bytes):
-                    subject = subject.decode(encoding or "utf-8", errors="replace")
-
-                # Extraer el remitente (autor) del email
-                sender_name, sender_email = parseaddr(msg.get("From", "Desconocido"))
-                if sender_name:
-                    sender_name, sender_encoding = decode_header(sender_name)[0]
-                    if isinstance(sender_name, bytes):
-                        sender_name = sender_name.decode(
-                            sender_encoding or "utf-8", errors="replace"
-                        )
-
-                author = (
-                    f"{sender_name} <{sender_email}>" if sender_email else "Desconocido"
-                )
+            raise Exception(f"No se pudo seleccionar la carpeta {FOLDER}.")
+
+        uidvalidity = _respuesta_numerica(mail, "UIDVALIDITY") or 0
+        uidnext = _respuesta_numerica(mail, "UIDNEXT")
 
-                # Extraer el cuerpo del correo (priorizando texto plano sobre HTML)
-                body = ""
-                if msg.is_multipart():
-                    for part in msg.walk():
-                        content_type = part.get_content_type()
-                        content_disposition = str(part.get("Content-Disposition"))
-                        if "attachment" in content_disposition:
-                            continue
-                        if content_type == "text/plain":
-                            try:
-                                body = part.get_payload(decode=True).decode(
-                                    part.get_content_charset() or "utf-8",
-                                    errors="replace",
-                                )
-                            except Exception as ex:
-                                logger.error(f"Error decodificando texto plano: {ex}")
-                            break
-                        elif content_type == "text/html":
-                            try:
-                                html_content = part.get_payload(decode=True).decode(
-                                    part.get_content_charset() or "utf-8",
-                                    errors="replace",
-                                )
-                            except Exception as ex:
-                                logger.error(f"Error decodificando HTML: {ex}")
-                                html_content = ""
-                            soup = BeautifulSoup(html_content, "html.parser")
-                            body = soup.get_text(separator="\n", strip=True)
-                            break
-                else:
-                    try:
-                        body = msg.get_payload(decode=True).decode(
-                            msg.get_content_charset() or "utf-8", errors="replace"
-                        )
-                    except Exception as ex:
-                        logger.error(f"Error decodificando payload: {ex}")
-                        body = ""
-                    if "<html" in body.lower():
-                        soup = BeautifulSoup(body, "html.parser")
-                        body = soup.get_text(separator="\n", strip=True)
-
-                # Obtener la fecha a partir del header "Date" y convertir a hora local de Madrid
-                date_header = msg.get("Date")
-                if date_header:
-                    try:
-                        received_at = parsedate_to_datetime(date_header)
-                        received_at = received_at.astimezone(ZoneInfo("Europe/Madrid"))
-                    except Exception as ex:
-                        logger.error(f"Error parseando fecha del email: {ex}")
-                        received_at = (
-                            datetime.utcnow()
-                            .replace(tzinfo=ZoneInfo("UTC"))
-                            .astimezone(ZoneInfo("Europe/Madrid"))
-                        )
-                else:
-                    received_at = (
-                        datetime.utcnow()
-                        .replace(tzinfo=ZoneInfo("UTC"))
-                        .astimezone(ZoneInfo("Europe/Madrid"))
+        checkpoint = get_imap_checkpoint(FOLDER)
+        uids = _uids_pendientes(mail, checkpoint, uidvalidity)
+        logger.info(f"Total de correos pendientes: {len(uids)}")
+
+        if summarizer is None and SUMMARY_QUEUE_ON_INGEST:
+            # Sin esperar al modelo: ColaResumenes los resume después
+            pipeline = PipelineIngesta(
+                None,
+                progreso=progreso,
+                preprocesar=preparar_correo,
+                reutilizar=resumen_de_casi_duplicado,
+            )
+        elif summarizer is None:
+            pipeline = PipelineIngesta(
+                summarize_newsletter,
+                progreso=progreso,
+                summarizer_lote=summarize_newsletters,
+                batch_size=obtener_backend().max_lote,
+                preprocesar=preparar_correo,
+                reutilizar=resumen_de_casi_duplicado,
+            )
+        else:
+            pipeline = PipelineIngesta(
+                summarizer,
+                progreso=progreso,
+                preprocesar=preparar_correo,
+                reutilizar=resumen_de_casi_duplicado,
+            )
+        try:
+            for inicio in range(0, len(uids), IMAP_FETCH_BATCH):
+                lote = uids[inicio : inicio + IMAP_FETCH_BATCH]
+                with ETAPA_SEGUNDOS.cronometrar(etapa="imap_fetch"):
+                    status, msg_data = mail.uid(
+                        "FETCH", _conjunto_uids(lote), "(UID RFC822)"
+                    )
+                if status != "OK":
+                    ERRORES.inc(etapa="imap_fetch")
+                    # El punto de control no avanza: se reintenta en la próxima sync
+                    raise Exception(
+                        f"No se pudo obtener el lote de UIDs {lote[0]}-{lote[-1]}."
                     )
+                pipeline.contar(
+                    "fetched", sum(isinstance(parte, tuple) for parte in msg_data)
+                )
 
-                email_id = msg_id.decode()
+                for response_part in msg_data:
+                    if not isinstance(response_part, tuple):
+                        continue
 
-                # Generar el resumen usando la función que recibe el contenido como parámetro
-                summary_text = summarize_newsletter(body)
+                    uid_match = UID_RE.search(response_part[0])
+                    if not uid_match:
+                        continue
+                    uid = int(uid_match.group(1))
 
-                # Guardar la newsletter en la BD
-                newsletter_obj = save_newsletter_to_db(
-                    email_id, subject, body, received_at, summary_text, author
+                    BYTES.inc(len(response_part[1]), tipo="raw")
+                    with ETAPA_SEGUNDOS.cronometrar(etapa="parseo"):
+                        correo = _parsear_correo(response_part[1])
+                    # UID estable entre sesiones (no el número de secuencia)
+                    correo["email_id"] = f"{FOLDER}:{uidvalidity}:{uid}"
+                    pipeline.enviar(correo)
+
+                # El punto de control solo avanza cuando el lote completo está guardado
+                pipeline.al_completar(
+                    partial(save_imap_checkpoint, FOLDER, uidvalidity, lote[-1])
                 )
+        finally:
+            # Lo ya enviado se termina de resumir y guardar aunque falle un lote
+            newsletters_list = pipeline.cerrar()
 
-                # Agregar la newsletter al registro diario (NewsletterDia)
-                add_newsletter_to_day(newsletter_obj, received_at)
+        # Aunque no haya correos nuevos, el punto de control avanza hasta el final
+        # de la carpeta para que la próxima sincronización empiece desde ahí.
+        if uidnext:
+            save_imap_checkpoint(FOLDER, uidvalidity, uidnext - 1)
+        return newsletters_list
 
-                logger.info(
-                    f"Resumen generado para el email {email_id}: {summary_text}"
-                )
 
-                newsletters_list.append(
-                    {
-                        "id": email_id,
-                        "subject": subject,
-                        "body": body.strip(),
-                        "received_at": received_at.isoformat(),
-                        "summary": summary_text,
-                        "author": author,  # Incluimos el autor en la respuesta
-                    }
-                )
+def newsletter_no_leidas(progreso: Callable[[dict], None] | None = None):
+    """
+    Conecta a Proton Bridge mediante IMAP, sincroniza los correos nuevos de la
+    carpeta (ver sincronizar_carpeta) y cierra la sesión.
+    Devuelve una lista con los correos procesados.
 
+    :param progreso: Callback opcional que recibe los contadores de progreso
+        (fetched, parsed, summarized, failed, persisted).
+    """
+    try:
+        with ETAPA_SEGUNDOS.cronometrar(etapa="imap_login"):
+            mail = inicio_sesion()
+        newsletters_list = sincronizar_carpeta(mail, progreso)
         mail.logout()
         logger.info("Desconectado del servidor IMAP.")
         return newsletters_list
 
     except imaplib.IMAP4.error as e:
+        ERRORES.inc(etapa="imap")
         logger.error(f"Error de IMAP: {e}")
         raise HTTPException(
             status_code=500, detail="Error al conectar con el servidor IMAP."
         )
     except Exception as e:
+        ERRORES.inc(etapa="sincronizacion")
         logger.error(f"Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,279 @@
+import logging
+import queue
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from app.core.config import (
+    PERSIST_BATCH_SIZE,
+    SUMMARY_BATCH_SIZE,
+    SUMMARY_CONCURRENCY,
+    SUMMARY_RPM,
+)
+from app.core.metricas import CORREOS, ERRORES, ETAPA_SEGUNDOS
+from app.services.ai.limitador import LimitadorTasa
+from app.services.correos.newsletter_db import save_newsletters_bulk
+
+logger = logging.getLogger(__name__)
+
+
+def persistir_en_bd(lote: list[tuple[dict, str | None]]):
+    """
+    Etapa de persistencia por defecto: guarda el lote de newsletters (con sus días y
+    remitentes) en una sola transacción.
+    """
+    save_newsletters_bulk(lote)
+
+
+class PipelineIngesta:
+    """
+    Etapas de resumen y persistencia de la ingesta.
+
+    Los correos ya descargados y parseados se envían con `enviar`; los resúmenes se
+    generan en un pool de `concurrency` hilos, limitado a `rpm` peticiones por minuto,
+    y un único hilo persiste los resultados (SQLite solo admite un escritor) en lotes de
+    hasta `persist_batch` correos por transacción con lo que haya listo en la cola.
+    El número de correos en vuelo está acotado para no acumular cuerpos en memoria.
+    Si se indica `progreso`, se llama con una copia de los contadores en cada cambio.
+
+    Con `preprocesar`, el texto que recibe el summarizer es el que devuelve para
+    cada correo (p. ej. preparar_correo) en lugar del cuerpo; el cuerpo guardado no
+    cambia. Con `reutilizar`, que recibe el correo y ese texto, los correos para los
+    que devuelve un resumen (p. ej. el de un casi duplicado ya guardado, ver
+    resumen_de_casi_duplicado) no pasan por el summarizer ni por el límite de
+    peticiones. Sin `summarizer` (None) no se llama al modelo: los correos que
+    `reutilizar` no resuelve se guardan sin resumen, pendientes de ColaResumenes.
+
+    Con `summarizer_lote` los correos se agrupan de `batch_size` en `batch_size` y
+    cada grupo se resume con una sola llamada (y un solo token del límite de
+    peticiones); los grupos incompletos se envían en `al_completar` y `cerrar`.
+    """
+
+    def __init__(
+        self,
+        summarizer: Callable[[str], str] | None,
+        concurrency: int = SUMMARY_CONCURRENCY,
+        rpm: float = SUMMARY_RPM,
+        persistir: Callable[[list[tuple[dict, str | None]]], None] = persistir_en_bd,
+        progreso: Callable[[dict], None] | None = None,
+        persist_batch: int = PERSIST_BATCH_SIZE,
+        summarizer_lote: Callable[[list[str]], list[str]] | None = None,
+        batch_size: int = SUMMARY_BATCH_SIZE,
+        preprocesar: Callable[[dict], str] | None = None,
+        reutilizar: Callable[[dict, str], str | None] | None = None,
+    ):
+        concurrency = max(1, concurrency)
+        self._persist_batch = max(1, persist_batch)
+        self._summarizer = summarizer
+        self._summarizer_lote = summarizer_lote
+        self._preprocesar = preprocesar
+        self._reutilizar = reutilizar
+        self._batch = max(1, batch_size) if summarizer_lote else 1
+        self._pendientes = []
+        self._persistir = persistir
+        self._progreso = progreso
+        self._limitador = LimitadorTasa(rpm, capacidad=concurrency) if rpm else None
+        self._huecos = threading.BoundedSemaphore(concurrency * 2 * self._batch)
+        self._executor = ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="resumen"
+        )
+        self._cola = queue.Queue()
+        self._enviados = 0
+        self._error = None
+        self._lock = threading.Lock()
+        self.contadores = Counter()
+        self.resultados = []
+        self._persistidor = threading.Thread(
+            target=self._bucle_persistencia, name="persistencia", daemon=True
+        )
+        self._persistidor.start()
+
+    def enviar(self, correo: dict):
+        """
+        Encola un correo parseado para resumirlo. Bloquea si hay demasiados en vuelo.
+        """
+        self._huecos.acquire()
+        seq = self._enviados
+        self._enviados += 1
+        self.contar("parsed")
+        if self._batch == 1:
+            self._executor.submit(self._resumir, seq, correo)
+            return
+        self._pendientes.append((seq, correo))
+        if len(self._pendientes) >= self._batch:
+            self._despachar()
+
+    def _despachar(self):
+        """
+        Envía a resumir el grupo de correos pendiente, aunque esté incompleto.
+        """
+        if self._pendientes:
+            self._executor.submit(self._resumir_lote, self._pendientes)
+            self._pendientes = []
+
+    def al_completar(self, callback: Callable[[], None]):
+        """
+        Ejecuta `callback` en el hilo de persistencia cuando todos los correos enviados
+        hasta ahora estén guardados (p. ej. para avanzar el punto de control IMAP).
+        No se ejecuta si alguna persistencia anterior ha fallado.
+        """
+        self._despachar()
+        self._cola.put(("marca", self._enviados, callback))
+
+    def cerrar(self) -> list[dict]:
+        """
+        Espera a que terminen todas las etapas y devuelve los correos procesados.
+        """
+        self._despachar()
+        self._executor.shutdown(wait=True)
+        self._cola.put(None)
+        self._persistidor.join()
+        if self._error:
+            raise self._error
+        return self.resultados
+
+    def contar(self, clave: str, n: int = 1):
+        """
+        Incrementa un contador de progreso y notifica el estado al callback `progreso`.
+        """
+        CORREOS.inc(n, estado=clave)
+        with self._lock:
+            self.contadores[clave] += n
+            estado = dict(self.contadores)
+        if self._progreso:
+            self._progreso(estado)
+
+    def _texto(self, correo: dict) -> str:
+        if self._preprocesar is None:
+            return correo["body"]
+        with ETAPA_SEGUNDOS.cronometrar(etapa="preprocesado"):
+            return self._preprocesar(correo)
+
+    def _reutilizado(self, correo: dict, texto: str) -> str | None:
+        if self._reutilizar is None:
+            return None
+        with ETAPA_SEGUNDOS.cronometrar(etapa="casi_duplicados"):
+            return self._reutilizar(correo, texto)
+
+    def _resumir(self, seq: int, correo: dict):
+        summary = None
+        try:
+            texto = self._texto(correo)
+            summary = self._reutilizado(correo, texto)
+            if summary is None and self._summarizer is not None:
+                if self._limitador:
+                    self._limitador.adquirir()
+                with ETAPA_SEGUNDOS.cronometrar(etapa="resumen_newsletter"):
+                    summary = self._summarizer(texto)
+            if summary is not None:
+                self.contar("summarized")
+        except Exception as e:
+            ERRORES.inc(etapa="resumen_newsletter")
+            self.contar("failed")
+            correo["summary_error"] = str(e)
+            logger.error(f"Error resumiendo el email {correo['email_id']}: {e}")
+        finally:
+            self._huecos.release()
+            self._cola.put(("correo", seq, correo, summary))
+
+    def _resumir_lote(self, items: list[tuple[int, dict]]):
+        summaries = [None] * len(items)
+        try:
+            textos = [self._texto(correo) for _, correo in items]
+            resumenes = [
+                self._reutilizado(correo, texto)
+                for (_, correo), texto in zip(items, textos)
+            ]
+            faltan = [i for i, summary in enumerate(resumenes) if summary is None]
+            if faltan:
+                if self._limitador:
+                    self._limitador.adquirir()
+                with ETAPA_SEGUNDOS.cronometrar(etapa="resumen_lote"):
+                    nuevos = self._summarizer_lote([textos[i] for i in faltan])
+                if len(nuevos) != len(faltan):
+                    raise ValueError(
+                        f"Se esperaban {len(faltan)} resúmenes y llegaron {len(nuevos)}."
+                    )
+                for i, summary in zip(faltan, nuevos):
+                    resumenes[i] = summary
+            summaries = resumenes
+            self.contar("summarized", len(items))
+        except Exception as e:
+            ERRORES.inc(etapa="resumen_lote")
+            self.contar("failed", len(items))
+            for _, correo in items:
+                correo["summary_error"] = str(e)
+            logger.error(f"Error resumiendo un lote de {len(items)} emails: {e}")
+        finally:
+            for (seq, correo), summary in zip(items, summaries):
+                self._huecos.release()
+                self._cola.put(("correo", seq, correo, summary))
+
+    def _siguientes_items(self) -> list:
+        """
+        Espera al siguiente elemento de la cola y añade los que ya estén disponibles,
+        hasta completar un lote de persistencia.
+        """
+        items = [self._cola.get()]
+        correos = 1 if items[0] and items[0][0] == "correo" else 0
+        while items[-1] is not None and correos < self._persist_batch:
+            try:
+                item = self._cola.get_nowait()
+            except queue.Empty:
+                break
+            items.append(item)
+            if item and item[0] == "correo":
+                correos += 1
+        return items
+
+    def _bucle_persistencia(self):
+        completados = set()
+        siguiente = 0  # Todos los correos con seq < siguiente están guardados
+        marcas = []
+        terminar = False
+        while not terminar:
+            lote = []
+            for item in self._siguientes_items():
+                if item is None:
+                    terminar = True
+                elif item[0] == "correo":
+                    lote.append(item[1:])
+                else:
+                    marcas.append(item[1:])
+
+            if lote and not self._error:
+                try:
+                    with ETAPA_SEGUNDOS.cronometrar(etapa="persistencia"):
+                        self._persistir(
+                            [(correo, summary) for _, correo, summary in lote]
+                        )
+                except Exception as e:
+                    ERRORES.inc(etapa="persistencia")
+                    logger.error(f"Error guardando un lote de {len(lote)} emails: {e}")
+                    self._error = e
+                else:
+                    self.contar("persisted", len(lote))
+                    for seq, correo, summary in lote:
+                        self.resultados.append(
+                            {
+                                "id": correo["email_id"],
+                                "subject": correo["subject"],
+                                "body": correo["body"].strip(),
+                                "received_at": correo["received_at"].isoformat(),
+                                "summary": summary,
+                                "author": correo["author"],
+                            }
+                        )
+                        completados.add(seq)
+                    while siguiente in completados:
+                        completados.remove(siguiente)
+                        siguiente += 1
+
+            while marcas and marcas[0][0] <= siguiente and not self._error:
+                _, callback = marcas.pop(0)
+                try:
+                    callback()
+                except Exception as e:
+                    logger.error(f"Error en la etapa de persistencia: {e}")
+                    self._error = e
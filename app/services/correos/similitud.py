@@ -0,0 +1,218 @@
+import hashlib
+import random
+import re
+from array import array
+from email.utils import parseaddr
+
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from app.core.compresion import descomprimir
+from app.core.database import SessionLocal
+from app.models.newsletter import Newsletter, NewsletterBody, NewsletterLsh
+from app.services.ai.preprocesado import colapsar_urls, quitar_boilerplate
+
+# Firma MinHash: NUM_HASHES mínimos de 32 bits sobre los shingles (SHINGLE palabras
+# consecutivas) del texto. Cada "permutación" es un XOR con una máscara fija: la
+# semilla no puede cambiar o las firmas guardadas dejan de ser comparables.
+NUM_HASHES = 64
+SHINGLE = 5
+_MASCARAS = [random.Random(20250101 + i).getrandbits(32) for i in range(NUM_HASHES)]
+
+# LSH: la firma se parte en BANDAS bandas de FILAS valores y cada banda se guarda
+# como un cubo (newsletter_lsh). Dos newsletters con similitud s comparten algún cubo
+# con probabilidad 1 - (1 - s^FILAS)^BANDAS: ~1 para s >= 0.8 y ~0.12 para s = 0.3,
+# así que una búsqueda solo compara la firma con unos pocos candidatos.
+BANDAS = 16
+FILAS = NUM_HASHES // BANDAS
+
+PALABRA_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _shingles(texto: str) -> set[str]:
+    palabras = PALABRA_RE.findall(texto.lower())
+    if len(palabras) < SHINGLE:
+        return {" ".join(palabras)} if palabras else set()
+    return {
+        " ".join(palabras[i : i + SHINGLE]) for i in range(len(palabras) - SHINGLE + 1)
+    }
+
+
+def firma_minhash(texto: str) -> bytes | None:
+    """
+    Firma MinHash del texto (NUM_HASHES enteros de 32 bits, 256 bytes), o None si el
+    texto no tiene palabras. Las newsletters se firman con firma_cuerpo.
+    """
+    shingles = _shingles(texto)
+    if not shingles:
+        return None
+    hashes = [
+        int.from_bytes(
+            hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "big"
+        )
+        for s in shingles
+    ]
+    # map con un método de int recorre los hashes en C: ~1 ms por newsletter
+    return array("I", [min(map(m.__xor__, hashes)) for m in _MASCARAS]).tobytes()
+
+
+def firma_cuerpo(
+    body: str, remitente: str | None, excluir_id: int | None = None
+) -> bytes | None:
+    """
+    Firma canónica de una newsletter, la misma en la ingesta, al guardar y en
+    calcular_firmas_pendientes: su cuerpo con las URLs colapsadas (los enlaces de
+    seguimiento cambian en cada envío) y sin el boilerplate aprendido del remitente
+    (`excluir_id`: la propia newsletter, si ya está guardada), de modo que dos
+    ediciones con la misma cabecera y el mismo pie no parezcan casi duplicados. No se
+    recorta al presupuesto de tokens: el recorte depende de la configuración.
+    """
+    return firma_minhash(quitar_boilerplate(colapsar_urls(body), remitente, excluir_id))
+
+
+def _valores(firma: bytes) -> array:
+    valores = array("I")
+    valores.frombytes(firma)
+    return valores
+
+
+def similitud(a: bytes, b: bytes) -> float:
+    """
+    Similitud de Jaccard estimada entre dos firmas (fracción de mínimos iguales).
+    """
+    return sum(x == y for x, y in zip(_valores(a), _valores(b))) / NUM_HASHES
+
+
+def cubos_lsh(firma: bytes) -> list[int]:
+    """
+    Un cubo por banda: hash de 63 bits de (banda, valores de la banda), de modo que
+    el índice sobre la columna 'bucket' sirve para todas las bandas.
+    """
+    cubos = []
+    for banda in range(BANDAS):
+        trozo = firma[banda * FILAS * 4 : (banda + 1) * FILAS * 4]
+        digest = hashlib.blake2b(bytes([banda]) + trozo, digest_size=8).digest()
+        cubos.append(int.from_bytes(digest, "big") >> 1)
+    return cubos
+
+
+def indexar_firmas(db: Session, firmas: dict[int, bytes | None]):
+    """
+    Inserta los cubos LSH de cada newsletter (id -> firma) en 'newsletter_lsh',
+    dentro de la transacción de `db`. La firma se guarda en Newsletter.minhash.
+    """
+    filas = [
+        {"bucket": cubo, "newsletter_id": newsletter_id}
+        for newsletter_id, firma in firmas.items()
+        if firma
+        for cubo in cubos_lsh(firma)
+    ]
+    if filas:
+        db.execute(insert(NewsletterLsh).on_conflict_do_nothing(), filas)
+
+
+def buscar_similares(
+    db: Session,
+    firma: bytes,
+    umbral: float,
+    con_resumen: bool = False,
+    excluir_id: int | None = None,
+) -> list[tuple[int, float]]:
+    """
+    Newsletters guardadas con similitud estimada >= `umbral`, de más a menos
+    parecida. Solo se comparan las que comparten algún cubo LSH con la firma (una
+    consulta indexada), así que el coste no crece con el tamaño del archivo.
+    Con `con_resumen`, solo las que ya tienen resumen.
+    """
+    candidatas = (
+        db.query(Newsletter.id, Newsletter.minhash)
+        .join(NewsletterLsh, NewsletterLsh.newsletter_id == Newsletter.id)
+        .filter(NewsletterLsh.bucket.in_(cubos_lsh(firma)))
+        .distinct()
+    )
+    if con_resumen:
+        candidatas = candidatas.filter(Newsletter.summary.isnot(None))
+    if excluir_id is not None:
+        candidatas = candidatas.filter(Newsletter.id != excluir_id)
+    similares = [
+        (newsletter_id, similitud(firma, otra))
+        for newsletter_id, otra in candidatas
+        if otra
+    ]
+    return sorted(
+        [(i, s) for i, s in similares if s >= umbral], key=lambda par: -par[1]
+    )
+
+
+def agrupar_similares(
+    newsletters: list[Newsletter], umbral: float
+) -> list[list[Newsletter]]:
+    """
+    Agrupa newsletters (p. ej. las de un día) cuya similitud estimada es >= `umbral`,
+    de forma transitiva, conservando el orden de la primera de cada grupo. Las que no
+    tienen firma quedan solas.
+    """
+    padres = list(range(len(newsletters)))
+
+    def raiz(i: int) -> int:
+        while padres[i] != i:
+            padres[i] = padres[padres[i]]
+            i = padres[i]
+        return i
+
+    if umbral > 0:
+        firmas = [
+            (i, _valores(n.minhash)) for i, n in enumerate(newsletters) if n.minhash
+        ]
+        minimo = umbral * NUM_HASHES
+        for k, (i, a) in enumerate(firmas):
+            for j, b in firmas[k + 1 :]:
+                if sum(x == y for x, y in zip(a, b)) >= minimo:
+                    padres[raiz(j)] = raiz(i)
+    grupos = {}
+    for i, newsletter in enumerate(newsletters):
+        grupos.setdefault(raiz(i), []).append(newsletter)
+    return list(grupos.values())
+
+
+def calcular_firmas_pendientes(lote: int = 500) -> int:
+    """
+    Calcula e indexa la firma de las newsletters guardadas que no la tienen (BD
+    anteriores a la detección de casi duplicados), en transacciones de `lote`
+    newsletters. Devuelve cuántas se procesan.
+    """
+    db = SessionLocal()
+    total = 0
+    ultimo = 0
+    try:
+        while True:
+            pendientes = (
+                db.query(Newsletter.id, Newsletter.author, NewsletterBody.content)
+                .join(NewsletterBody, NewsletterBody.newsletter_id == Newsletter.id)
+                .filter(Newsletter.minhash.is_(None), Newsletter.id > ultimo)
+                .order_by(Newsletter.id)
+                .limit(lote)
+                .all()
+            )
+            if not pendientes:
+                return total
+            firmas = {
+                newsletter_id: firma_cuerpo(
+                    descomprimir(content), parseaddr(author or "")[1], newsletter_id
+                )
+                for newsletter_id, author, content in pendientes
+            }
+            for newsletter_id, firma in firmas.items():
+                if firma:
+                    db.query(Newsletter).filter(Newsletter.id == newsletter_id).update(
+                        {"minhash": firma}, synchronize_session=False
+                    )
+            indexar_firmas(db, firmas)
+            db.commit()
+            total += len(pendientes)
+            ultimo = pendientes[-1][0]
+    except Exception as e:
+        db.rollback()
+        raise e
+    finally:
+        db.close()
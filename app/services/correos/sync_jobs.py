@@ -0,0 +1,149 @@
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from fastapi import HTTPException
+
+from app.core.database import SessionLocal
+from app.models.job import SyncJob
+from app.services.correos.newsletter_mail import newsletter_no_leidas
+
+logger = logging.getLogger(__name__)
+
+ESTADOS_ACTIVOS = ("pending", "running")
+CONTADORES = ("fetched", "parsed", "summarized", "failed", "persisted")
+
+# Evita que dos peticiones simultáneas creen dos jobs en este proceso
+_lock_encolar = threading.Lock()
+
+
+def job_to_dict(job: SyncJob) -> dict:
+    return {
+        "id": job.id,
+        "status": job.status,
+        "created_at": job.created_at.isoformat(),
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "error": job.error,
+        "progress": {clave: getattr(job, clave) or 0 for clave in CONTADORES},
+    }
+
+
+def encolar_sync() -> dict:
+    """
+    Encola una sincronización IMAP en segundo plano y devuelve el job.
+    Si ya hay una en curso, devuelve ese job en lugar de abrir otra sesión IMAP.
+    """
+    with _lock_encolar:
+        db = SessionLocal()
+        try:
+            activo = (
+                db.query(SyncJob)
+                .filter(SyncJob.status.in_(ESTADOS_ACTIVOS))
+                .order_by(SyncJob.created_at.desc())
+                .first()
+            )
+            if activo:
+                return job_to_dict(activo)
+
+            job = SyncJob(
+                id=uuid.uuid4().hex, status="pending", created_at=datetime.utcnow()
+            )
+            db.add(job)
+            db.commit()
+            db.refresh(job)
+            respuesta = job_to_dict(job)
+        except Exception as e:
+            db.rollback()
+            raise e
+        finally:
+            db.close()
+
+    threading.Thread(
+        target=ejecutar_sync, args=(respuesta["id"],), name="sync-job", daemon=True
+    ).start()
+    return respuesta
+
+
+def _actualizar_job(job_id: str, **campos):
+    db = SessionLocal()
+    try:
+        db.query(SyncJob).filter(SyncJob.id == job_id).update(campos)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error actualizando el job {job_id}: {e}")
+    finally:
+        db.close()
+
+
+class _ProgresoJob:
+    """
+    Guarda los contadores del job en la BD como mucho una vez por `intervalo` segundos,
+    para no añadir un commit por cada correo procesado.
+    """
+
+    def __init__(self, job_id: str, intervalo: float = 1.0):
+        self.job_id = job_id
+        self.intervalo = intervalo
+        self._ultimo = 0.0
+        self._estado = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, contadores: dict):
+        with self._lock:
+            self._estado = contadores
+            ahora = time.monotonic()
+            if ahora - self._ultimo < self.intervalo:
+                return
+            self._ultimo = ahora
+        self.guardar()
+
+    def guardar(self, **campos):
+        with self._lock:
+            estado = {
+                clave: self._estado.get(clave, 0)
+                for clave in CONTADORES
+                if clave in self._estado
+            }
+        _actualizar_job(self.job_id, **estado, **campos)
+
+
+def ejecutar_sync(job_id: str):
+    """
+    Ejecuta la sincronización de un job y registra su resultado en la BD.
+    """
+    _actualizar_job(job_id, status="running", started_at=datetime.utcnow())
+    progreso = _ProgresoJob(job_id)
+    try:
+        newsletter_no_leidas(progreso=progreso)
+        progreso.guardar(status="done", finished_at=datetime.utcnow())
+    except Exception as e:
+        error = e.detail if isinstance(e, HTTPException) else str(e)
+        logger.error(f"Job de sincronización {job_id} fallido: {error}")
+        progreso.guardar(status="failed", error=error, finished_at=datetime.utcnow())
+
+
+def recuperar_jobs_interrumpidos():
+    """
+    Marca como fallidos los jobs que quedaron activos tras un reinicio del proceso.
+    El punto de control IMAP permite que la siguiente sincronización continúe.
+    """
+    db = SessionLocal()
+    try:
+        db.query(SyncJob).filter(SyncJob.status.in_(ESTADOS_ACTIVOS)).update(
+            {
+                "status": "failed",
+                "error": "Interrumpido por un reinicio del servidor.",
+                "finished_at": datetime.utcnow(),
+            },
+            synchronize_session=False,
+        )
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise e
+    finally:
+        db.close()
@@ -6,6 +6,7 @@ const API_URL = import.meta.env.VITE_API_URL;
 
 function DaysList() {
   const [days, setDays] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [theme, setTheme] = useState("dark");
@@ -19,6 +20,7 @@ function DaysList() {
       }
       const data = await res.json();
       setDays(data);
+      setNextCursor(res.headers.get("X-Next-Cursor"));
       setLoading(false);
     } catch (err) {
       setError(err.message);
@@ -26,33 +28,104 @@ function DaysList() {
     }
   };
 
-  // Refrescar newsletters llamando al endpoint GET /api/v1/newsletter/
-  const refreshNewsletters = async () => {
+  // Cargar la siguiente página de días (paginación por cursor)
+  const loadMoreDays = async () => {
     try {
-      const res = await fetch(`${API_URL}/api/v1/newsletter/`);
-      if (!res.ok) throw new Error("Error al refrescar newsletters");
-      await res.json();
-      fetchDays();
+      const res = await fetch(
+        `${API_URL}/api/v1/days?cursor=${encodeURIComponent(nextCursor)}`,
+      );
+      if (!res.ok) {
+        throw new Error("Error al obtener los días");
+      }
+      const data = await res.json();
+      setDays((prevDays) => [...prevDays, ...data]);
+      setNextCursor(res.headers.get("X-Next-Cursor"));
     } catch (err) {
       alert("Error: " + err.message);
     }
   };
 
-  // Generar resumen general del día
-  const regenerateDaySummary = async (dayId) => {
+  // Refrescar la primera página sin perder los días ya cargados con "Cargar días
+  // anteriores": los días que vuelven se sustituyen y los nuevos van delante
+  const refreshFirstPage = async () => {
+    const res = await fetch(`${API_URL}/api/v1/days`);
+    if (!res.ok) {
+      throw new Error("Error al obtener los días");
+    }
+    const data = await res.json();
+    const ids = new Set(data.map((day) => day.id));
+    setDays((prevDays) => [
+      ...data,
+      ...prevDays.filter((day) => !ids.has(day.id)),
+    ]);
+  };
+
+  // Refrescar newsletters: encola la sincronización y consulta su estado hasta que termine
+  const refreshNewsletters = async () => {
     try {
-      const res = await fetch(`${API_URL}/api/v1/days/${dayId}/summarize`, {
+      const res = await fetch(`${API_URL}/api/v1/newsletter/sync`, {
         method: "POST",
       });
-      if (!res.ok)
-        throw new Error("Error al generar el resumen general del día");
-      const updatedDay = await res.json();
+      if (!res.ok) throw new Error("Error al refrescar newsletters");
+      let job = await res.json();
+      while (job.status === "pending" || job.status === "running") {
+        await new Promise((resolve) => setTimeout(resolve, 2000));
+        const statusRes = await fetch(
+          `${API_URL}/api/v1/newsletter/sync/${job.id}`,
+        );
+        if (!statusRes.ok) throw new Error("Error al consultar la sincronización");
+        job = await statusRes.json();
+        await refreshFirstPage();
+      }
+      if (job.status === "failed") throw new Error(job.error);
+      await refreshFirstPage();
+    } catch (err) {
+      alert("Error: " + err.message);
+    }
+  };
+
+  // Generar resumen general del día (en streaming: el texto aparece según se genera)
+  const regenerateDaySummary = async (dayId) => {
+    const setSummary = (summary, extra = {}) =>
       setDays((prevDays) =>
         prevDays.map((day) =>
-          day.id === dayId ? { ...day, summary: updatedDay.summary } : day,
+          day.id === dayId ? { ...day, ...extra, summary } : day,
         ),
       );
+    const previousSummary = days.find((day) => day.id === dayId)?.summary;
+    try {
+      const res = await fetch(
+        `${API_URL}/api/v1/days/${dayId}/summarize/stream`,
+        { method: "POST" },
+      );
+      if (!res.ok || !res.body)
+        throw new Error("Error al generar el resumen general del día");
+      const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+      let buffer = "";
+      let text = "";
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += value;
+        // Los eventos SSE terminan con una línea en blanco
+        const events = buffer.split("\n\n");
+        buffer = events.pop();
+        for (const raw of events) {
+          const event = raw.match(/^event: (.*)$/m)?.[1];
+          const data = JSON.parse(raw.match(/^data: (.*)$/m)?.[1] ?? "{}");
+          if (event === "chunk") {
+            text += data.text;
+            setSummary(text);
+          } else if (event === "done") {
+            setSummary(data.summary, { summary_dirty: data.summary_dirty });
+          } else if (event === "error") {
+            throw new Error(data.detail);
+          }
+        }
+      }
     } catch (err) {
+      // El resumen guardado no cambia si el stream falla
+      setSummary(previousSummary);
       alert("Error: " + err.message);
     }
   };
@@ -96,7 +169,10 @@ function DaysList() {
 
           {/* Resumen general del día con la lista de newsletters recibidas */}
           <details className="day-summary">
-            <summary>📅 Resumen general del día</summary>
+            <summary>
+              📅 Resumen general del día
+              {day.summary_dirty && " (hay newsletters nuevas)"}
+            </summary>
             <div className="summary-content">
               <ReactMarkdown>
                 {day.summary ? day.summary : "No generado"}
@@ -138,7 +214,9 @@ function DaysList() {
                     <ReactMarkdown>
                       {newsletter.summary
                         ? newsletter.summary
-                        : "No disponible"}
+                        : newsletter.summary_status === "done"
+                          ? "No disponible"
+                          : "En cola: se generará en segundo plano"}
                     </ReactMarkdown>
                   </div>
                   <p>
@@ -153,6 +231,12 @@ function DaysList() {
           </details>
         </div>
       ))}
+
+      {nextCursor && (
+        <button className="refresh" onClick={loadMoreDays}>
+          Cargar días anteriores
+        </button>
+      )}
     </div>
   );
 }